@@ -0,0 +1,225 @@
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+from os.path import join
+
+import argparse
+import numpy as np
+
+from benchmarks.synthetic import SyntheticService
+from core.service_spreadsheet import SpreadsheetService
+from issue87_4_evaluation import do_eval
+from presets.dicom_filters import DicomFilters
+from presets.issue87.llm_matching_batch import batch_parse_llm_responses
+from presets.issue87.llm_matching_tree import do_pattern_tree_matching, pattern_tree_cache_clear
+from presets.issue87.llm_matching_while import do_while_not_true
+from presets.issue87.schemas.utils import manual_terms_split, manual_terms_cache_clear
+from presets.issue87.schemas.v21 import OntologyV21
+from presets.issue87.utils import merge_dicom_data, DICOM_default_params, DICOM_relevant_params
+from utils import DATA_DIR
+from utils_dicom_handlers import DICOM_META2CAT_DICT
+
+
+BASELINES_DIR = join(DATA_DIR, "benchmarks")
+
+LLM_PARSING_METHODS = {
+    "pattern_tree": do_pattern_tree_matching,
+    "while_not_true": do_while_not_true,
+}
+
+
+def iter_llm_params(ontology, method_name):
+    for field_name, parsing_methods in ontology.iter_ontology_parsers(parser_type="llm"):
+        if method_name in parsing_methods:
+            yield field_name, parsing_methods[method_name]
+
+
+def parse_llm_line(line, ontology):
+    """ Per-line parsing of the LLM responses, as performed by `handle_line` of the LLM classification.
+    """
+    processed = {}
+    for field_name, parsing_methods in ontology.iter_ontology_parsers(parser_type="llm"):
+        for method_name, params in parsing_methods.items():
+            result = LLM_PARSING_METHODS[method_name](line[field_name].lower(), params, None)
+            processed[field_name] = result if result is not None else ontology.UNKN_VALUE
+    return processed
+
+
+def eval_quiet(gold_results, predict_results, entries_total, ontology):
+    with contextlib.redirect_stdout(io.StringIO()):
+        do_eval(gold_results=gold_results, predict_results=predict_results, entries_total=entries_total,
+                ontology=ontology, show_amount=False, show_amount_p=False)
+
+
+def create_benchmarks(ontology, rows, lengths, series, slices, seed, tmp_dir):
+    """ Returns the ordered dictionary of the benchmarks: name -> (amount of items, function).
+    """
+    rng = np.random.default_rng(seed)
+    fields = [f for f, _ in ontology.iter_ontology_parsers(parser_type="llm")]
+    categories = set(DICOM_default_params) | set(DICOM_relevant_params)
+    cat_cast = {"Sequence-Name": lambda v: str(v), "Sequence-Variant": lambda v: list(v)}
+
+    benchmarks = OrderedDict()
+
+    # Parsing of the LLM responses.
+    for length in lengths:
+        lines = SyntheticService.llm_responses(fields, n=rows, length=length, rng=rng)
+        for method_name in LLM_PARSING_METHODS:
+            params_list = list(iter_llm_params(ontology, method_name))
+            benchmarks[f"llm:{method_name}[len={length}]"] = (
+                rows * len(params_list),
+                lambda lines=lines, params_list=params_list, f=LLM_PARSING_METHODS[method_name]:
+                    [f(line[field].lower(), params, None) for field, params in params_list for line in lines])
+        benchmarks[f"llm:batch[len={length}]"] = (
+            rows, lambda lines=lines: batch_parse_llm_responses(lines, ontology=ontology))
+
+    # Splitting of the series descriptions.
+    descriptions = SyntheticService.series_descriptions(rows, rng=rng)
+    benchmarks["manual_terms_split"] = (
+        len(descriptions), lambda: [manual_terms_split(d.lower()) for d in descriptions])
+
+    # Reading of the DICOM files.
+    series_dirs = SyntheticService.dicom_series(tmp_dir, series=series, slices=slices, rng=rng)
+    filepaths = [join(d, f) for d in series_dirs for f in sorted(os.listdir(d))]
+    benchmarks["dicom:filter_categorized"] = (
+        len(filepaths),
+        lambda: [DicomFilters.filter_categorized(filepath=fp, categories=categories,
+                                                 categories_map=DICOM_META2CAT_DICT, cat_cast=cat_cast,
+                                                 header_only=True) for fp in filepaths])
+
+    # Manual classification of the series.
+    dicom_params = [merge_dicom_data(d) for d in series_dirs]
+    compiled = ontology.get_manual_parsers_compiled()
+    benchmarks["manual:classify"] = (
+        len(dicom_params), lambda: [compiled.classify(p) for p in dicom_params])
+
+    # Evaluation.
+    gold_results = {}
+    predict_results = {}
+    for k in ontology.iter_ontology_keys():
+        labels = ontology.get_ontology_labels(key=k, keep_unknown=True)
+        if labels is not None:
+            gold_results[k] = [labels[i] for i in rng.integers(len(labels), size=rows)]
+            predict_results[k] = [labels[i] for i in rng.integers(len(labels), size=rows)]
+    benchmarks["do_eval"] = (
+        rows, lambda: eval_quiet(gold_results, predict_results, entries_total=rows, ontology=ontology))
+
+    # End-to-end: DICOM reading and manual classification, parsing of the responses and evaluation.
+    e2e_lines = SyntheticService.llm_responses(fields, n=len(series_dirs), length=lengths[0], rng=rng)
+
+    def e2e():
+        gold = {}
+        predict = {}
+        for series_dir, line in zip(series_dirs, e2e_lines):
+            manual = compiled.classify(merge_dicom_data(series_dir))
+            llm = parse_llm_line(line, ontology)
+            for k in llm:
+                if manual.get(k, None) not in [None, ontology.UNKN_VALUE]:
+                    gold.setdefault(k, []).append(manual[k])
+                    predict.setdefault(k, []).append(llm[k])
+        eval_quiet(gold, predict, entries_total=len(series_dirs), ontology=ontology)
+
+    benchmarks["e2e"] = (len(series_dirs), e2e)
+
+    return benchmarks
+
+
+def clear_caches():
+    """ Memoized terms and compiled matchers would otherwise turn the repeated runs into the cache hits.
+    """
+    manual_terms_cache_clear()
+    pattern_tree_cache_clear()
+
+
+def measure(func, repeat):
+    """ Best time out of the given amount of the cold runs.
+    """
+    best = None
+    for _ in range(repeat):
+        clear_caches()
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def compare(results, baseline, threshold):
+    """ Returns the rows of the comparison and the names of the regressed benchmarks.
+    """
+    rows = []
+    regressed = []
+    for name, r in results.items():
+        b = baseline["results"].get(name, None)
+        if b is None:
+            rows.append([name, "%.1f" % r["throughput"], "-", "-", "NEW"])
+            continue
+        ratio = r["throughput"] / b["throughput"] if b["throughput"] > 0 else float("inf")
+        status = "REGRESSION" if ratio < 1 - threshold else ("IMPROVED" if ratio > 1 + threshold else "OK")
+        if status == "REGRESSION":
+            regressed.append(name)
+        rows.append([name, "%.1f" % r["throughput"], "%.1f" % b["throughput"], "%.2fx" % ratio, status])
+    return rows, regressed
+
+
+if __name__ == '__main__':
+    """ Benchmark of the parsing and evaluation hot paths on the synthetic data (offline, CPU-only).
+    """
+
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('--rows', dest='rows', type=int, default=2000,
+                        help="Amount of the synthetic LLM responses, descriptions and evaluation labels.")
+    parser.add_argument('--lengths', dest='lengths', type=int, nargs="+", default=[32, 256, 2048],
+                        help="Approximate lengths (in characters) of the LLM responses.")
+    parser.add_argument('--series', dest='series', type=int, default=50)
+    parser.add_argument('--slices', dest='slices', type=int, default=8)
+    parser.add_argument('--repeat', dest='repeat', type=int, default=3)
+    parser.add_argument('--seed', dest='seed', type=int, default=0)
+    parser.add_argument('--only', dest='only', type=str, nargs="*", default=None,
+                        help="Prefixes of the benchmarks to be launched.")
+    parser.add_argument('--save', dest='save', type=str, default=None, help="Name of the baseline to be saved.")
+    parser.add_argument('--compare', dest='compare', type=str, default=None, help="Name of the baseline to compare.")
+    parser.add_argument('--threshold', dest='threshold', type=float, default=0.1,
+                        help="Relative throughput drop, considered as regression.")
+    parser.add_argument('--baselines-dir', dest='baselines_dir', type=str, default=BASELINES_DIR)
+
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+
+        benchmarks = create_benchmarks(ontology=OntologyV21(), rows=args.rows, lengths=args.lengths,
+                                       series=args.series, slices=args.slices, seed=args.seed, tmp_dir=tmp_dir)
+
+        results = OrderedDict()
+        for name, (items, func) in benchmarks.items():
+            if args.only is not None and not any(name.startswith(p) for p in args.only):
+                continue
+            seconds = measure(func, repeat=args.repeat)
+            results[name] = {"items": items, "seconds": seconds, "throughput": items / seconds}
+            print(SpreadsheetService.format_line([name, items, "%.4f s" % seconds, "%.1f items/s" % (items / seconds)]))
+
+    if args.save is not None:
+        os.makedirs(args.baselines_dir, exist_ok=True)
+        with open(join(args.baselines_dir, f"{args.save}.json"), "w") as f:
+            json.dump({"meta": {"platform": platform.platform(), "python": platform.python_version(),
+                                "numpy": np.__version__, "args": vars(args)},
+                       "results": results}, f, indent=2)
+
+    if args.compare is not None:
+        with open(join(args.baselines_dir, f"{args.compare}.json"), "r") as f:
+            baseline = json.load(f)
+
+        rows, regressed = compare(results, baseline, threshold=args.threshold)
+        print("-------")
+        for row in [["benchmark", "current", "baseline", "ratio", "status"]] + rows:
+            print(SpreadsheetService.format_line(row))
+
+        if len(regressed) > 0:
+            sys.exit(1)
@@ -0,0 +1,133 @@
+import os
+from os.path import join
+
+import numpy as np
+from pydicom.dataset import Dataset, FileMetaDataset
+from pydicom.uid import ExplicitVRLittleEndian, MRImageStorage, generate_uid
+
+
+# Answers in the style of the LLM responses per field, which are then surrounded by the filler text.
+LLM_ANSWERS = {
+    "weight_t": ["It is **T1** weighted", "t2-weighted", "The series is T2", "T1 with fat saturation", "unclear"],
+    "is_fs": ["yes", "no", "fat suppression is applied", "not mentioned"],
+    "is_contrast_agent": ["yes", "no", "contrast agent was administered", "no contrast"],
+    "contrast_time": ["pre-contrast", "arterial phase", "portal venous", "delayed phase", "not applicable"],
+    "aquisition_echo": ["spin-echo sequence", "gradient echo", "fast spin echo", "unknown"],
+    "plane_type": ["axial", "coronal", "sagittal", "the plane is axial", "oblique"],
+    "phase_type": ["in-phase", "out of phase", "this represents both", "not applicable"],
+    "weight_is_dwi": ["yes", "no"],
+    "weight_is_adc": ["yes", "no"],
+}
+
+FILLER_WORDS = ["the", "series", "image", "sequence", "based", "on", "description", "likely", "which", "indicates",
+                "protocol", "acquisition", "typically", "used", "for", "liver", "imaging", "with", "and", "of"]
+
+# Tokens of the series descriptions (see `manual_terms_split`).
+DESCRIPTION_TOKENS = ["AX", "COR", "SAG", "T1", "T2", "FS", "FAT", "SAT", "PRE", "POST", "ART", "PORTAL", "DELAY",
+                      "5", "MIN", "3D", "VIBE", "HASTE", "SSFSE", "FSE", "GRE", "DWI", "ADC", "b50", "b800",
+                      "IN", "OUT", "PHASE", "LAVA", "FLEX", "BH", "+C", "DYN", "(ORIG)", "MRCP", "TRUFI"]
+DESCRIPTION_SEPARATORS = [" ", "_", "/", " ", ", "]
+
+SEQUENCE_NAMES = ["*fl3d1", "*tse2_15", "*h2d1_320", "*fl2d2", "*ep_b50t", "ssfse", "fgre3d"]
+SEQUENCE_VARIANTS = [["SK", "SP"], ["SP", "OSP"], ["SK", "SS"], ["NONE"], ["SK", "MTC", "SP"]]
+
+
+class SyntheticService(object):
+    """ Deterministic generators of the synthetic inputs (for the given random generator).
+    """
+
+    @staticmethod
+    def llm_response(rng, answer, length):
+        """ Answer surrounded by the filler words, so that the response is approximately of the given length.
+        """
+        words = []
+        size = len(answer)
+        while size < length:
+            words.append(FILLER_WORDS[rng.integers(len(FILLER_WORDS))])
+            size += len(words[-1]) + 1
+        pos = rng.integers(len(words) + 1)
+        return " ".join(words[:pos] + [answer] + words[pos:])
+
+    @staticmethod
+    def llm_responses(fields, n, length, rng):
+        """ Lines (dictionaries) of the LLM responses per field.
+        """
+        lines = []
+        for _ in range(n):
+            line = {}
+            for f in fields:
+                answers = LLM_ANSWERS.get(f, ["yes", "no"])
+                line[f] = SyntheticService.llm_response(rng, answer=answers[rng.integers(len(answers))], length=length)
+            lines.append(line)
+        return lines
+
+    @staticmethod
+    def series_description(rng, tokens=(2, 7)):
+        amount = rng.integers(tokens[0], tokens[1] + 1)
+        text = ""
+        for i in range(amount):
+            if i > 0:
+                text += DESCRIPTION_SEPARATORS[rng.integers(len(DESCRIPTION_SEPARATORS))]
+            text += DESCRIPTION_TOKENS[rng.integers(len(DESCRIPTION_TOKENS))]
+        return text
+
+    @staticmethod
+    def series_descriptions(n, rng):
+        return [SyntheticService.series_description(rng) for _ in range(n)]
+
+    @staticmethod
+    def dicom_dataset(rng, patient_id, series_uid, description, size=16):
+        """ Small MR image with the elements that are utilized for the series classification.
+        """
+        file_meta = FileMetaDataset()
+        file_meta.MediaStorageSOPClassUID = MRImageStorage
+        file_meta.MediaStorageSOPInstanceUID = generate_uid()
+        file_meta.TransferSyntaxUID = ExplicitVRLittleEndian
+
+        ds = Dataset()
+        ds.file_meta = file_meta
+        ds.SOPClassUID = MRImageStorage
+        ds.SOPInstanceUID = file_meta.MediaStorageSOPInstanceUID
+        ds.SeriesInstanceUID = series_uid
+        ds.PatientID = patient_id
+        ds.PatientSex = ["M", "F"][rng.integers(2)]
+        ds.PatientAge = "%03dY" % rng.integers(20, 90)
+        ds.PatientWeight = str(rng.integers(50, 120))
+        ds.Modality = "MR"
+        ds.SeriesDescription = description
+        ds.ProtocolName = description
+        ds.SequenceName = SEQUENCE_NAMES[rng.integers(len(SEQUENCE_NAMES))]
+        ds.SequenceVariant = SEQUENCE_VARIANTS[rng.integers(len(SEQUENCE_VARIANTS))]
+        ds.RepetitionTime = str(round(float(rng.uniform(3, 5000)), 2))
+        ds.EchoTime = str(round(float(rng.uniform(1, 120)), 2))
+        ds.FlipAngle = str(rng.integers(5, 180))
+        ds.EchoNumbers = str(rng.integers(1, 3))
+        if rng.integers(2) == 1:
+            ds.ContrastBolusAgent = "GADOLINIUM"
+        ds.PhotometricInterpretation = "MONOCHROME2"
+        ds.SamplesPerPixel = 1
+        ds.Rows = size
+        ds.Columns = size
+        ds.BitsAllocated = 16
+        ds.BitsStored = 16
+        ds.HighBit = 15
+        ds.PixelRepresentation = 0
+        ds.PixelData = rng.integers(0, 4096, size=(size, size), dtype=np.uint16).tobytes()
+        return ds
+
+    @staticmethod
+    def dicom_series(target_dir, series, slices, rng):
+        """ Writes the synthetic DICOM series (one directory per series) and returns the list of their directories.
+        """
+        series_dirs = []
+        for s in range(series):
+            series_dir = join(target_dir, f"series-{s}")
+            os.makedirs(series_dir, exist_ok=True)
+            description = SyntheticService.series_description(rng)
+            series_uid = generate_uid()
+            for i in range(slices):
+                ds = SyntheticService.dicom_dataset(rng, patient_id=f"P-{s // 4}", series_uid=series_uid,
+                                                    description=description)
+                ds.save_as(join(series_dir, f"{i}.dcm"), write_like_original=False)
+            series_dirs.append(series_dir)
+        return series_dirs
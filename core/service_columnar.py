@@ -0,0 +1,133 @@
+import json
+import os
+from os.path import join
+
+import numpy as np
+
+
+NULL_CODE = -1
+
+
+class ColumnarWriter(object):
+    """ Streaming writer of the categorical columnar format:
+        every column is a raw file of int32 codes (-1 for the absent values), appended by row groups,
+        while vocabularies of the columns are kept in `meta.json`, which is written on close.
+    """
+
+    def __init__(self, target_dir, columns, row_group_size=4096):
+        assert (isinstance(columns, list))
+        assert (isinstance(row_group_size, int) and row_group_size > 0)
+        self.__target_dir = target_dir
+        self.__columns = columns
+        self.__row_group_size = row_group_size
+        self.__vocab = {c: {} for c in columns}
+        self.__buffer = []
+        self.__rows = 0
+        self.__row_groups = 0
+
+        os.makedirs(target_dir, exist_ok=True)
+        # Start from the empty files.
+        for i in range(len(columns)):
+            open(self.__column_path(i), "wb").close()
+
+    def __column_path(self, i):
+        return join(self.__target_dir, f"{i}.i32")
+
+    @staticmethod
+    def __key(v):
+        """ Vocabulary key of the value normalized to the primitive type,
+            values are distinguished by type, since True, 1 and 1.0 are equal as dictionary keys.
+        """
+        if v is None:
+            return None, None
+        # NOTE: bool is a subclass of int, hence it is checked first.
+        for t in (bool, int, float, str):
+            if isinstance(v, t):
+                return t, t(v)
+        # Non-primitive values (e.g. DICOM specific types) are kept as strings.
+        return str, str(v)
+
+    def __flush(self):
+        if len(self.__buffer) == 0:
+            return
+        for i, c in enumerate(self.__columns):
+            vocab = self.__vocab[c]
+            codes = np.fromiter((vocab.setdefault(self.__key(row[c]), len(vocab)) if c in row else NULL_CODE
+                                 for row in self.__buffer), dtype=np.int32, count=len(self.__buffer))
+            with open(self.__column_path(i), "ab") as f:
+                f.write(codes.tobytes())
+        self.__rows += len(self.__buffer)
+        self.__row_groups += 1
+        self.__buffer = []
+
+    def write(self, row):
+        assert (isinstance(row, dict))
+        self.__buffer.append(row)
+        if len(self.__buffer) >= self.__row_group_size:
+            self.__flush()
+
+    def tee(self, rows_it):
+        """ Passes the rows through, while writing them.
+        """
+        for row in rows_it:
+            self.write(row)
+            yield row
+
+    def close(self):
+        self.__flush()
+        meta = {
+            "rows": self.__rows,
+            "row_groups": self.__row_groups,
+            "columns": [{"name": c, "file": os.path.basename(self.__column_path(i)),
+                         "vocab": [v for _, v in self.__vocab[c]]}
+                        for i, c in enumerate(self.__columns)]
+        }
+        with open(join(self.__target_dir, "meta.json"), "w") as f:
+            json.dump(meta, f)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class ColumnarReader(object):
+    """ Reader of the columns written by `ColumnarWriter`, codes are memory-mapped (zero-copy).
+    """
+
+    def __init__(self, target_dir):
+        self.__target_dir = target_dir
+        with open(join(target_dir, "meta.json"), "r") as f:
+            meta = json.load(f)
+        self.rows = meta["rows"]
+        self.__columns = {c["name"]: c for c in meta["columns"]}
+
+    def columns(self):
+        return list(self.__columns.keys())
+
+    def vocab(self, name):
+        return self.__columns[name]["vocab"]
+
+    def codes(self, name):
+        if self.rows == 0:
+            return np.zeros(0, dtype=np.int32)
+        return np.memmap(join(self.__target_dir, self.__columns[name]["file"]), dtype=np.int32, mode="r",
+                         shape=(self.rows,))
+
+    def values(self, name):
+        """ Decoded values of the column, None for the absent ones.
+        """
+        lookup = np.array(self.vocab(name) + [None], dtype=object)
+        # NULL_CODE refers to the last element of the lookup.
+        return lookup[self.codes(name)]
+
+
+class ColumnarService(object):
+
+    @staticmethod
+    def target_dir(csv_filepath):
+        """ Columnar output is placed alongside with the CSV one.
+        """
+        return csv_filepath[:-len(".csv")] + ".columns" if csv_filepath.endswith(".csv") \
+            else csv_filepath + ".columns"
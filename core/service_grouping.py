@@ -0,0 +1,102 @@
+import heapq
+import os
+import pickle
+import tempfile
+
+
+class GroupingService(object):
+    """ Grouping of the sequence of dictionaries by the value of the column.
+        All the methods yield groups (lists) in order of the first appearance of their keys.
+    """
+
+    @staticmethod
+    def is_clustered(keys_it):
+        """ Checks that every key forms a single contiguous run.
+        """
+        closed = set()
+        prev = None
+        for i, key in enumerate(keys_it):
+            if i > 0 and key == prev:
+                continue
+            if key in closed:
+                return False
+            if i > 0:
+                closed.add(prev)
+            prev = key
+        return True
+
+    @staticmethod
+    def iter_clustered(dict_it, col_id):
+        """ Streaming grouping for the input that is clustered by `col_id`,
+            so that only the current group is kept in memory.
+        """
+        closed = set()
+        group = []
+        for dict_data in dict_it:
+            key = dict_data[col_id]
+            if len(group) > 0 and group[0][col_id] != key:
+                closed.add(group[0][col_id])
+                yield group
+                group = []
+            if key in closed:
+                raise Exception(f"Input is not clustered by `{col_id}`: `{key}` appears again.")
+            group.append(dict_data)
+
+        if len(group) > 0:
+            yield group
+
+    @staticmethod
+    def __dump_run(items, tmp_dir):
+        items.sort(key=lambda item: item[0])
+        fd, filepath = tempfile.mkstemp(dir=tmp_dir, suffix=".run")
+        with os.fdopen(fd, "wb") as f:
+            for item in items:
+                pickle.dump(item, f, protocol=pickle.HIGHEST_PROTOCOL)
+        return filepath
+
+    @staticmethod
+    def __iter_run(filepath):
+        with open(filepath, "rb") as f:
+            while True:
+                try:
+                    yield pickle.load(f)
+                except EOFError:
+                    break
+
+    @staticmethod
+    def iter_external(dict_it, col_id, buffer_size=10000, tmp_dir=None):
+        """ External sort based grouping for the arbitrary ordered input:
+            at most `buffer_size` dictionaries are kept in memory, the rest is spilled into the sorted runs on disk,
+            which are then merged. Only the order index of the keys is kept in memory.
+        """
+        assert (isinstance(buffer_size, int) and buffer_size > 0)
+
+        if tmp_dir is not None:
+            os.makedirs(tmp_dir, exist_ok=True)
+
+        with tempfile.TemporaryDirectory(dir=tmp_dir) as runs_dir:
+
+            key_order = {}
+            buffer = []
+            runs = []
+            for i, dict_data in enumerate(dict_it):
+                order = key_order.setdefault(dict_data[col_id], len(key_order))
+                buffer.append(((order, i), dict_data))
+                if len(buffer) >= buffer_size:
+                    runs.append(GroupingService.__dump_run(buffer, runs_dir))
+                    buffer = []
+
+            # The last run remains in memory.
+            buffer.sort(key=lambda item: item[0])
+            merged_it = heapq.merge(*[GroupingService.__iter_run(r) for r in runs], buffer, key=lambda item: item[0])
+
+            group = []
+            for (order, _), dict_data in merged_it:
+                if len(group) > 0 and group_order != order:
+                    yield group
+                    group = []
+                group_order = order
+                group.append(dict_data)
+
+            if len(group) > 0:
+                yield group
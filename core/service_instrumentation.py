@@ -0,0 +1,187 @@
+import cProfile
+import json
+import os
+import threading
+import time
+from contextlib import nullcontext
+from os.path import dirname
+
+
+class _StageContext(object):
+
+    __slots__ = ["name", "nbytes", "items"]
+
+    def __init__(self, name, nbytes, items):
+        self.name = name
+        self.nbytes = nbytes
+        self.items = items
+
+    def __enter__(self):
+        InstrumentationService._push()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        InstrumentationService._pop(self.name, nbytes=self.nbytes, items=self.items)
+
+
+class InstrumentationService(object):
+    """ Registry of the per-stage statistics of the process: calls, wall time, bytes and items.
+        `seconds` is inclusive, while `self_seconds` excludes the time of the nested stages
+        (e.g. time of the CSV writing without the time of pulling the rows being written).
+        Everything is a no-op unless enabled.
+    """
+
+    enabled = False
+    __stats = {}
+    # Stack of the nested stages is kept per thread.
+    __local = threading.local()
+    __lock = threading.Lock()
+    __started = None
+    __profiler = None
+
+    @staticmethod
+    def enable(flag=True):
+        InstrumentationService.enabled = flag
+
+    @staticmethod
+    def __register(name):
+        s = InstrumentationService.__stats.get(name, None)
+        if s is None:
+            s = {"calls": 0, "seconds": 0.0, "self_seconds": 0.0, "bytes": 0, "items": 0}
+            InstrumentationService.__stats[name] = s
+        return s
+
+    @staticmethod
+    def __stack():
+        local = InstrumentationService.__local
+        if not hasattr(local, "stack"):
+            local.stack = []
+        return local.stack
+
+    @staticmethod
+    def _push():
+        # Frame: start time and the time of the nested stages.
+        InstrumentationService.__stack().append([time.perf_counter(), 0.0])
+
+    @staticmethod
+    def _pop(name, nbytes=0, items=0):
+        stack = InstrumentationService.__stack()
+        start, nested = stack.pop()
+        elapsed = time.perf_counter() - start
+        if len(stack) > 0:
+            stack[-1][1] += elapsed
+        with InstrumentationService.__lock:
+            s = InstrumentationService.__register(name)
+            s["calls"] += 1
+            s["seconds"] += elapsed
+            s["self_seconds"] += elapsed - nested
+            s["bytes"] += nbytes
+            s["items"] += items
+
+    @staticmethod
+    def stage(name, nbytes=0, items=0):
+        """ Context manager of the stage.
+        """
+        if not InstrumentationService.enabled:
+            return nullcontext()
+        return _StageContext(name, nbytes=nbytes, items=items)
+
+    @staticmethod
+    def add(name, nbytes=0, items=0):
+        """ Registers bytes and items without timing.
+        """
+        if not InstrumentationService.enabled:
+            return
+        with InstrumentationService.__lock:
+            s = InstrumentationService.__register(name)
+            s["bytes"] += nbytes
+            s["items"] += items
+
+    @staticmethod
+    def iter_stage(name, items_it):
+        """ Times pulling of the items, which is the case of the lazy stages (e.g. CSV reading).
+        """
+        if not InstrumentationService.enabled:
+            return items_it
+
+        def __it():
+            it = iter(items_it)
+            while True:
+                InstrumentationService._push()
+                items = 0
+                try:
+                    item = next(it)
+                    items = 1
+                except StopIteration:
+                    return
+                finally:
+                    # The frame is popped on any exception raised by the iterator.
+                    InstrumentationService._pop(name, items=items)
+                yield item
+
+        return __it()
+
+    @staticmethod
+    def pop():
+        """ Returns the statistics collected so far and resets them.
+            Utilized for passing the statistics from the worker processes.
+        """
+        stats = InstrumentationService.__stats
+        InstrumentationService.__stats = {}
+        return stats
+
+    @staticmethod
+    def reset():
+        """ Drops the statistics and the stack of the nested stages of the calling thread.
+            Utilized as the initializer of the worker processes, which otherwise inherit the state of the parent.
+        """
+        InstrumentationService.__stats = {}
+        InstrumentationService.__local.stack = []
+
+    @staticmethod
+    def merge(stats):
+        for name, other in stats.items():
+            s = InstrumentationService.__register(name)
+            for k, v in other.items():
+                s[k] += v
+
+    @staticmethod
+    def report():
+        return {name: dict(s) for name, s in sorted(InstrumentationService.__stats.items())}
+
+    @staticmethod
+    def start(enabled=True, profile_filepath=None):
+        """ Starts the session of the script: enables statistics and optionally the cProfile.
+        """
+        InstrumentationService.enable(enabled)
+        InstrumentationService.__started = time.perf_counter()
+        if profile_filepath is not None:
+            InstrumentationService.__profiler = cProfile.Profile()
+            InstrumentationService.__profiler.enable()
+
+    @staticmethod
+    def finish(report_filepath=None, profile_filepath=None, meta=None):
+        """ Finishes the session: saves the JSON report and the cProfile dump (see `pstats`).
+        """
+        profiler = InstrumentationService.__profiler
+        if profiler is not None:
+            profiler.disable()
+            os.makedirs(dirname(os.path.abspath(profile_filepath)), exist_ok=True)
+            profiler.dump_stats(profile_filepath)
+            InstrumentationService.__profiler = None
+
+        if report_filepath is None:
+            return
+
+        started = InstrumentationService.__started
+        report = {
+            "meta": meta if meta is not None else {},
+            "wall_seconds": time.perf_counter() - started if started is not None else None,
+            "stages": InstrumentationService.report(),
+        }
+
+        os.makedirs(dirname(os.path.abspath(report_filepath)), exist_ok=True)
+        tmp_path = f"{report_filepath}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(report, f, indent=2, default=str)
+        os.replace(tmp_path, report_filepath)
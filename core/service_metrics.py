@@ -0,0 +1,154 @@
+import numpy as np
+
+
+class ConfusionMatrix(object):
+    """ Confusion matrix over the classes (rows: true, columns: predicted),
+        from which all the metrics are derived.
+    """
+
+    def __init__(self, classes, matrix):
+        assert (isinstance(classes, list))
+        assert (matrix.shape == (len(classes), len(classes)))
+        self.classes = classes
+        self.matrix = matrix
+        self.__index = {c: i for i, c in enumerate(classes)}
+
+    @property
+    def total(self):
+        return int(self.matrix.sum())
+
+    def __codes(self, labels):
+        # Labels which were never seen are out of the matrix.
+        return [self.__index[label] for label in labels if label in self.__index]
+
+    def sub_matrix(self, labels):
+        """ Matrix restricted to the given labels (in the given order), unseen labels result in zero rows and columns.
+        """
+        result = np.zeros((len(labels), len(labels)), dtype=self.matrix.dtype)
+        ind = [i for i, label in enumerate(labels) if label in self.__index]
+        codes = self.__codes(labels)
+        result[np.ix_(ind, ind)] = self.matrix[np.ix_(codes, codes)]
+        return result
+
+    def true_count(self, label):
+        return int(self.matrix[self.__index[label], :].sum()) if label in self.__index else 0
+
+    def predicted_count(self, label):
+        return int(self.matrix[:, self.__index[label]].sum()) if label in self.__index else 0
+
+    def predicted_rate(self, label):
+        """ Fraction of the predictions with the given label (e.g. the missing rate for the unknown value).
+        """
+        return self.predicted_count(label) / self.total if self.total > 0 else 0.0
+
+    def accuracy(self):
+        return float(np.trace(self.matrix)) / self.total if self.total > 0 else 0.0
+
+    @staticmethod
+    def __scores(matrix, codes):
+        """ Precision, recall and F1 of the classes with the given codes for the (batch of) matrices.
+            NOTE: zero is used in the case of zero division.
+        """
+        tp = matrix[..., codes, codes]
+        pred = matrix[..., :, codes].sum(axis=-2)
+        true = matrix[..., codes, :].sum(axis=-1)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            precision = np.where(pred > 0, tp / np.maximum(pred, 1), 0.0)
+            recall = np.where(true > 0, tp / np.maximum(true, 1), 0.0)
+            f1 = np.where(pred + true > 0, 2 * tp / np.maximum(pred + true, 1), 0.0)
+
+        return precision, recall, f1
+
+    def per_class(self, labels):
+        """ Returns precision, recall and F1 arrays for the given labels (zeros for the unseen labels).
+        """
+        ind = [i for i, label in enumerate(labels) if label in self.__index]
+        scores = self.__scores(self.matrix, self.__codes(labels))
+
+        results = []
+        for values in scores:
+            result = np.zeros(len(labels))
+            result[ind] = values
+            results.append(result)
+
+        return tuple(results)
+
+    def macro_f1(self, labels):
+        """ Macro-averaged F1 over the given labels (equivalent to sklearn with `zero_division=0`).
+        """
+        if len(labels) == 0:
+            return 0.0
+        _, _, f1 = self.per_class(labels)
+        return float(np.mean(f1))
+
+    def bootstrap(self, labels, metric, resamples=1000, rng=None, alpha=0.05):
+        """ Bootstrap confidence interval of the metric ("f1" or "acc").
+            Resampling of the pairs with replacement is equivalent to drawing the cells counts
+            from the multinomial distribution, so all the resamples are processed at once.
+        """
+        assert (metric in ["f1", "acc"])
+
+        if self.total == 0:
+            return 0.0, 0.0
+
+        rng = np.random.default_rng() if rng is None else rng
+
+        k = len(self.classes)
+        probs = self.matrix.ravel() / self.total
+        matrices = rng.multinomial(self.total, probs, size=resamples).reshape(resamples, k, k)
+
+        if metric == "acc":
+            values = np.trace(matrices, axis1=1, axis2=2) / self.total
+        else:
+            _, _, f1 = self.__scores(matrices, self.__codes(labels))
+            # Unseen labels contribute with zeros.
+            values = f1.sum(axis=-1) / max(len(labels), 1)
+
+        low, high = np.quantile(values, [alpha / 2, 1 - alpha / 2])
+        return float(low), float(high)
+
+
+class MetricsService(object):
+
+    @staticmethod
+    def encode(values, index):
+        """ Encodes values into integer codes, the new values are appended into the `index` dictionary.
+        """
+        assert (isinstance(index, dict))
+        return np.fromiter((index.setdefault(v, len(index)) for v in values), dtype=np.int64, count=len(values))
+
+    @staticmethod
+    def confusion(true_list, predict_list, classes_list=None):
+        """ Builds the confusion matrix within a single pass.
+            classes_list: optional list of the classes, which defines the order of the first rows / columns;
+                          labels that are not mentioned in the list are placed after them in order of appearance.
+        """
+        assert (len(true_list) == len(predict_list))
+
+        index = {c: i for i, c in enumerate(classes_list)} if classes_list is not None else {}
+        y_true = MetricsService.encode(true_list, index)
+        y_pred = MetricsService.encode(predict_list, index)
+
+        k = len(index)
+        matrix = np.bincount(y_true * k + y_pred, minlength=k * k).reshape(k, k)
+
+        return ConfusionMatrix(classes=list(index.keys()), matrix=matrix)
+
+    @staticmethod
+    def confusion_codes(true_codes, true_classes, predict_codes, predict_classes):
+        """ Builds the confusion matrix from the already encoded labels (e.g. memory-mapped arrays) without decoding.
+            Predicted codes are remapped onto the true classes, the rest of predicted classes are placed after them.
+        """
+        assert (len(true_codes) == len(predict_codes))
+
+        index = {c: i for i, c in enumerate(true_classes)}
+        remap = np.fromiter((index.setdefault(c, len(index)) for c in predict_classes), dtype=np.int64,
+                            count=len(predict_classes))
+
+        k = len(index)
+        y_true = np.asarray(true_codes, dtype=np.int64)
+        y_pred = remap[np.asarray(predict_codes, dtype=np.int64)]
+        matrix = np.bincount(y_true * k + y_pred, minlength=k * k).reshape(k, k)
+
+        return ConfusionMatrix(classes=list(index.keys()), matrix=matrix)
@@ -0,0 +1,15 @@
+from multiprocessing import Pool
+
+
+class ParallelService(object):
+
+    @staticmethod
+    def imap_ordered(func, items_it, workers, chunksize=1, initializer=None):
+        """ Lazily maps items with the pool of processes, results are provided in the order of the input items.
+            initializer: called once in every worker process before handling items.
+            NOTE: `func` and items should be picklable.
+        """
+        assert (isinstance(workers, int) and workers > 0)
+        with Pool(processes=workers, initializer=initializer) as pool:
+            for result in pool.imap(func, items_it, chunksize=chunksize):
+                yield result
@@ -0,0 +1,118 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+class ByteBudget(object):
+    """ Budget of the in-flight bytes, which is granted to the items strictly in their order:
+        the consumer releases bytes in the same order, so the head item always gets its budget (no deadlocks).
+        The item that exceeds the budget alone is granted once nothing else is in flight.
+    """
+
+    def __init__(self, max_bytes):
+        assert (isinstance(max_bytes, int) and max_bytes > 0)
+        self.__max_bytes = max_bytes
+        self.__in_use = 0
+        self.__next_order = 0
+        self.__closed = False
+        self.__cond = threading.Condition()
+
+    @property
+    def in_use(self):
+        return self.__in_use
+
+    def acquire(self, order, nbytes):
+        with self.__cond:
+            self.__cond.wait_for(lambda: self.__closed or (
+                    order == self.__next_order and
+                    (self.__in_use == 0 or self.__in_use + nbytes <= self.__max_bytes)))
+            if self.__closed:
+                return False
+            self.__in_use += nbytes
+            self.__next_order += 1
+            self.__cond.notify_all()
+            return True
+
+    def release(self, nbytes):
+        with self.__cond:
+            self.__in_use -= nbytes
+            self.__cond.notify_all()
+
+    def close(self):
+        """ Wakes up all the waiting items, which are then not granted.
+        """
+        with self.__cond:
+            self.__closed = True
+            self.__cond.notify_all()
+
+
+class PrefetchService(object):
+
+    @staticmethod
+    def iter_prefetched(items_it, fetch_func, ahead=8, workers=4, max_bytes=None, size_func=None,
+                        prepare_func=None):
+        """ Yields (item, result) pairs in order of the items, while the results of up to `ahead` next items
+            are fetched by the pool of threads (utilized for the latency-bound I/O, e.g. network file systems).
+            prepare_func: optional, called in the worker first, its result is passed to `size_func` and
+                          `fetch_func` instead of the item (e.g. listing shared by sizing and fetching).
+            size_func: bytes to be read for the item, called in the worker before fetching.
+            max_bytes: bound of the in-flight bytes, i.e. of the items that are being fetched or
+                       fetched but not yet consumed.
+        """
+        assert (callable(fetch_func))
+        assert (isinstance(ahead, int) and ahead > 0)
+        assert (isinstance(workers, int) and workers > 0)
+        assert (max_bytes is None or size_func is not None)
+
+        budget = ByteBudget(max_bytes) if max_bytes is not None else None
+
+        def __task(order, item):
+            nbytes = 0
+            if budget is not None:
+                try:
+                    item = prepare_func(item) if prepare_func is not None else item
+                    nbytes = size_func(item)
+                finally:
+                    # The order has to be granted even in the case of the failure.
+                    granted = budget.acquire(order, nbytes)
+                if not granted:
+                    return None, 0
+            elif prepare_func is not None:
+                item = prepare_func(item)
+            return fetch_func(item), nbytes
+
+        window = deque()
+
+        def __pop():
+            item, future = window.popleft()
+            result, nbytes = future.result()
+            if budget is not None:
+                budget.release(nbytes)
+            return item, result
+
+        executor = ThreadPoolExecutor(max_workers=workers)
+        try:
+            for order, item in enumerate(items_it):
+                window.append((item, executor.submit(__task, order, item)))
+                if len(window) > ahead:
+                    yield __pop()
+            while len(window) > 0:
+                yield __pop()
+        finally:
+            if budget is not None:
+                budget.close()
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    @staticmethod
+    def with_latency(func, latency):
+        """ Injects the delay before every call (for testing against the local directories).
+        """
+        if latency is None or latency <= 0:
+            return func
+
+        def __delayed(*args, **kwargs):
+            time.sleep(latency)
+            return func(*args, **kwargs)
+
+        return __delayed
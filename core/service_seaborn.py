@@ -1,7 +1,8 @@
 import numpy as np
 import seaborn as sns
 import matplotlib.pyplot as plt
-from sklearn.metrics import confusion_matrix
+
+from core.service_metrics import ConfusionMatrix, MetricsService
 
 
 class SeabornService(object):
@@ -14,38 +15,47 @@ class SeabornService(object):
                 transform=ax.transAxes, fontsize=20, color='red')
 
     @staticmethod
-    def confusion_heatmap_2d(true_list, predict_list, save_png_path, classes_list=None,
-                             classes_list_visual=None, do_normalize=False,
-                             title=None, x_caption=None, y_caption=None, figsize=(12, 6),
-                             handle_visual_func=None):
+    def confusion_heatmap_2d(true_list, predict_list, save_png_path, classes_list=None, **kwargs):
         assert (isinstance(true_list, list))
         assert (isinstance(predict_list, list))
         assert (isinstance(classes_list, list) or classes_list is None)
+        assert (len(true_list) == len(predict_list))
+
+        confusion = MetricsService.confusion(true_list=true_list, predict_list=predict_list, classes_list=classes_list)
+
+        SeabornService.confusion_matrix_heatmap(
+            confusion=confusion, save_png_path=save_png_path,
+            # By default we consider the complete set of classes.
+            classes_list=classes_list if classes_list is not None else confusion.classes,
+            **kwargs)
+
+    @staticmethod
+    def confusion_matrix_heatmap(confusion, save_png_path, classes_list, classes_list_visual=None, do_normalize=False,
+                                 title=None, x_caption=None, y_caption=None, figsize=(12, 6),
+                                 handle_visual_func=None):
+        """ Visualization of the precomputed confusion matrix.
+            classes_list: classes that form the matrix (the other ones are not considered).
+            classes_list_visual: classes to be displayed.
+        """
+        assert (isinstance(confusion, ConfusionMatrix))
+        assert (isinstance(classes_list, list))
         assert (isinstance(classes_list_visual, list) or classes_list_visual is None)
         assert (callable(handle_visual_func) or handle_visual_func is None)
-        assert (len(true_list) == len(predict_list))
 
         fig, ax = plt.subplots(figsize=figsize)
 
-        if len(true_list) == 0:
+        if confusion.total == 0:
             SeabornService.__show_no_data(ax)
             plt.close()
             return
 
-        if classes_list is None:
-            # Extract the complete set of classes automatically.
-            classes_list = list(set(true_list).union(predict_list))
-
-        def __map_2_classes(answers):
-            # Limitation O(N^2)
-            return [classes_list.index(a) for a in answers]
-
-        cf_matrix = confusion_matrix(y_true=__map_2_classes(true_list), y_pred=__map_2_classes(predict_list))
+        cf_matrix = confusion.sub_matrix(classes_list)
 
         # Optional normalization.
         hm_kwargs = {}
         if do_normalize:
-            cf_matrix = (cf_matrix - np.min(cf_matrix)) / (np.max(cf_matrix) - np.min(cf_matrix))
+            cf_range = np.max(cf_matrix) - np.min(cf_matrix)
+            cf_matrix = (cf_matrix - np.min(cf_matrix)) / (cf_range if cf_range > 0 else 1)
             cf_matrix = cf_matrix.round(2)
             # Setup min and max default values.
             hm_kwargs["vmin"] = 0
@@ -53,7 +63,7 @@ class SeabornService(object):
 
         classes_list_visual = classes_list if classes_list_visual is None else classes_list_visual
         if classes_list_visual != classes_list:
-            visual_classes = __map_2_classes(classes_list_visual)
+            visual_classes = [classes_list.index(c) for c in classes_list_visual]
             cf_matrix = cf_matrix[np.ix_(visual_classes, visual_classes)]
 
         # Optionally handle visual labels.
@@ -1,3 +1,6 @@
+from collections.abc import Mapping
+
+
 def iter_to_iterator(items_it, iter_item_func=None):
     for item in items_it:
         item_it = iter_item_func(item) if iter_item_func is not None else item
@@ -18,4 +21,76 @@ def seek_pattern(text, ordered_patterns, return_mode=None):
     if return_mode is None:
         return f is not None
     elif return_mode == "ind_aft":
-        return text.index(f) + len(f) if f is not None else -1
\ No newline at end of file
+        return text.index(f) + len(f) if f is not None else -1
+
+
+class Lazy(object):
+    """ Value which is computed on the first access within `LazyDict`.
+    """
+
+    def __init__(self, func):
+        assert (callable(func))
+        self.func = func
+
+
+class LazyDict(Mapping):
+    """ Dictionary which resolves `Lazy` values on the first access and keeps the result.
+    """
+
+    def __init__(self, data):
+        assert (isinstance(data, dict))
+        self.__data = data
+
+    def __getitem__(self, key):
+        value = self.__data[key]
+        if isinstance(value, Lazy):
+            value = value.func()
+            self.__data[key] = value
+        return value
+
+    def __contains__(self, key):
+        # Checking the key presence without resolving the value.
+        return key in self.__data
+
+    def __iter__(self):
+        return iter(self.__data)
+
+    def __len__(self):
+        return len(self.__data)
+
+
+def iter_join_by_key(left_it, right_it, key, build=None, unmatched=None):
+    """ Hash join of the two sequences of dictionaries by the value of `key`, yields (left, right) pairs.
+        build: side ("left" or "right") for building the hash index (expected to be the smaller one),
+               while the other side is streamed and determines the output order.
+               By default, the smaller side is selected for the sized sequences and the left side otherwise.
+        unmatched: optional dictionary, which receives keys of the unmatched entries per side.
+    """
+    assert (build in ["left", "right", None])
+    assert (isinstance(unmatched, dict) or unmatched is None)
+
+    if build is None:
+        sized = hasattr(left_it, "__len__") and hasattr(right_it, "__len__")
+        build = "right" if sized and len(right_it) < len(left_it) else "left"
+
+    build_it, probe_it = (left_it, right_it) if build == "left" else (right_it, left_it)
+    probe_side = "right" if build == "left" else "left"
+
+    index = {}
+    for item in build_it:
+        index.setdefault(item[key], []).append(item)
+
+    matched = set()
+    probe_unmatched = []
+    for item in probe_it:
+        k = item[key]
+        if k not in index:
+            probe_unmatched.append(k)
+            continue
+        matched.add(k)
+        for build_item in index[k]:
+            yield (build_item, item) if build == "left" else (item, build_item)
+
+    if unmatched is not None:
+        unmatched[probe_side] = probe_unmatched
+        unmatched[build] = [k for k, items in index.items() if k not in matched for _ in items]
@@ -0,0 +1,47 @@
+from os.path import join
+
+import argparse
+from source_iter.service_csv import CsvService
+from tqdm import tqdm
+
+from presets.dicom_sampling import SeriesSampling
+from presets.issue87.utils import DICOM_CACHE, DICOM_ROOTS, DICOM_SAMPLING, DICOM_SAMPLING_N, get_dicom_data, \
+    merge_dicom_data
+from utils import LOCAL_TCIA_NARRATIVES_COLLECTION
+
+
+def iter_series_dirs(metadata):
+    for line in CsvService.read(src=metadata, skip_header=True, as_dict=True, delimiter=","):
+        yield join(DICOM_ROOTS[line["Collection"]], line["File Location"])
+
+
+if __name__ == '__main__':
+    """ Prewarming the persistent DICOM cache for all the series of the collection,
+        so that the classification and evaluation scripts could avoid parsing DICOM files.
+    """
+
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('--metadata', dest='metadata', type=str, nargs="?", default=LOCAL_TCIA_NARRATIVES_COLLECTION)
+    parser.add_argument('--sampling', dest='sampling', type=str, choices=SeriesSampling.MODES, default=DICOM_SAMPLING)
+    parser.add_argument('--sampling-n', dest='sampling_n', type=int, default=DICOM_SAMPLING_N)
+    parser.add_argument('--check-consistency', dest='check_consistency', action='store_true', default=False,
+                        help="Report slices which series-level values disagree (bypasses the cache).")
+
+    args = parser.parse_args()
+
+    inconsistent = []
+
+    for series_dir in tqdm(iter_series_dirs(args.metadata)):
+        if args.check_consistency:
+            merge_dicom_data(series_dir, sampling=args.sampling, sampling_n=args.sampling_n,
+                             handle=lambda msg: inconsistent.append(msg))
+        else:
+            get_dicom_data(series_dir, sampling=args.sampling, sampling_n=args.sampling_n)
+
+    if args.check_consistency:
+        for msg in inconsistent:
+            print(msg)
+        print(f"Inconsistent slices: {len(inconsistent)}")
+    else:
+        print(f"Cached: {DICOM_CACHE.hits}, Computed: {DICOM_CACHE.misses}")
@@ -0,0 +1,73 @@
+from os.path import relpath
+
+import argparse
+from mmi_kit.service_os import OsService
+from source_iter.service_csv import CsvService
+from tqdm import tqdm
+
+from core.service_parallel import ParallelService
+from presets.issue87.utils import DICOM_INDEX, get_dicom_data, get_line_series_dir
+from utils import LOCAL_TCIA_NARRATIVES_COLLECTION
+
+
+def index_line(line):
+    """ Index entry of the series of the collection line.
+    """
+    series_dir = get_line_series_dir(line)
+    return {
+        "uid": line["Series UID"],
+        "collection": line["Collection"],
+        "series_dir": series_dir,
+        "files": sorted(relpath(fp, series_dir) for fp in OsService.iter_dir_filepaths(series_dir)),
+        # Relying on the persistent cache, so that the prewarmed series are not parsed again.
+        "data": get_dicom_data(series_dir),
+    }
+
+
+def iter_entries(lines, workers=None, chunksize=16):
+    if workers is None:
+        return map(index_line, lines)
+    return ParallelService.imap_ordered(func=index_line, items_it=lines, workers=workers, chunksize=chunksize)
+
+
+if __name__ == '__main__':
+    """ Building the index of the DICOM data of all the series of the collection (see `DICOM_INDEX`),
+        so that the classification scripts perform lookups by Series UID instead of walking the series directories.
+        Building is resumable: the already indexed series are skipped, entries are committed in batches.
+    """
+
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('--metadata', dest='metadata', type=str, nargs="?", default=LOCAL_TCIA_NARRATIVES_COLLECTION)
+    parser.add_argument('--workers', dest='workers', type=int, default=None)
+    parser.add_argument('--chunksize', dest='chunksize', type=int, default=16)
+    parser.add_argument('--batch-size', dest='batch_size', type=int, default=256,
+                        help="Amount of the entries committed at once.")
+    parser.add_argument('--rebuild', dest='rebuild', action='store_true', default=False,
+                        help="Drop the existed entries (e.g. after updating the DICOM files).")
+
+    args = parser.parse_args()
+
+    if args.rebuild:
+        DICOM_INDEX.clear()
+
+    indexed = DICOM_INDEX.keys()
+    lines = list(CsvService.read(src=args.metadata, skip_header=True, as_dict=True, delimiter=","))
+    pending = [line for line in lines if line["Series UID"] not in indexed]
+
+    batch = []
+    mismatched = 0
+    for entry, line in zip(tqdm(iter_entries(pending, workers=args.workers, chunksize=args.chunksize),
+                                total=len(pending)), pending):
+        # Manifest declares the amount of images of the series.
+        if line.get("Number of Images", "").isdigit() and int(line["Number of Images"]) != len(entry["files"]):
+            mismatched += 1
+        batch.append(entry)
+        if len(batch) >= args.batch_size:
+            DICOM_INDEX.put_many(batch)
+            batch = []
+
+    DICOM_INDEX.put_many(batch)
+
+    print(f"Indexed: {len(pending)}, Skipped: {len(lines) - len(pending)}")
+    print(f"Series with the amount of files that differs from the manifest: {mismatched}")
@@ -1,29 +1,50 @@
-from os.path import join
+import hashlib
+import json
+import os
+import pickle
+from functools import partial
+from os.path import join, basename, dirname
 
+import argparse
+import numpy as np
 from collections import Counter
 
 from mmi_kit.service_os import OsService
 from source_iter.service_csv import CsvService
 from tqdm import tqdm
 
+from core.service_columnar import ColumnarWriter, ColumnarService
+from core.service_instrumentation import InstrumentationService
+from core.service_parallel import ParallelService
 from core.utils import iter_to_iterator
 
+from presets.issue87.llm_matching_batch import batch_parse_llm_responses
 from presets.issue87.llm_matching_while import do_while_not_true
 from presets.issue87.llm_matching_tree import do_pattern_tree_matching
 from presets.issue87.schemas.base import BaseOntology
-from presets.issue87.utils import iter_dicom_data, FIELD_LOG_HANDLERS, MODEL_INPUT_FUNC, create_series_header, \
-    MODEL_TO_TEST, MODEL_ONTOLOGY_FUNC, DICOM_ROOTS, ISSUE_87_DIR
+from presets.issue87.utils import get_line_dicom_data, iter_prefetched_dicom, FIELD_LOG_HANDLERS, MODEL_INPUT_FUNC, \
+    create_series_header, MODEL_TO_TEST, MODEL_ONTOLOGY_FUNC, ISSUE_87_DIR, DICOM_CACHE, DICOM_SAMPLING, DICOM_SAMPLING_N
+from utils import CACHE_DIR
 
 
-def handle_line(line, ctr_errors, ctr_total, ontology, register_dicom=True, force_params_dict=None, **kwargs):
+def needs_dicom(ontology, register_dicom):
+    """ Whether the DICOM data is required by the parsers or the output.
+    """
+    return register_dicom or len(ontology.get_dicom_categories(parser_type="llm")) > 0
+
+
+def handle_line(line, ctr_errors, ctr_total, ontology, register_dicom=True, force_params_dict=None, dicom_params=None,
+                **kwargs):
+    """ dicom_params: optional DICOM data of the series, which has been already fetched (e.g. prefetched).
+    """
     assert (isinstance(ontology, BaseOntology))
     assert (isinstance(force_params_dict, dict) or force_params_dict is None)
 
-    # Provide DICOM data.
-    dicom_params = {}
-    series_dir = join(DICOM_ROOTS[line["Collection"]], line["File Location"])
-    for data in iter_dicom_data(series_dir):
-        dicom_params.update(data)
+    # Provide DICOM data only when it is required by the parsers or the output.
+    if not needs_dicom(ontology, register_dicom):
+        dicom_params = {}
+    elif dicom_params is None:
+        dicom_params = get_line_dicom_data(line)
 
     # Initialize output dictionary.
     if force_params_dict is not None:
@@ -45,10 +66,11 @@ def handle_line(line, ctr_errors, ctr_total, ontology, register_dicom=True, forc
             "while_not_true": do_while_not_true,
         }
 
-        for method_name, params in parsing_methods.items():
-            field_logger = FIELD_LOG_HANDLERS[field_name] if field_name in FIELD_LOG_HANDLERS else None
-            result = parsing_method_collection[method_name](text_to_parse, params, field_logger)
-            processed[field_name] = result if result is not None else ontology.UNKN_VALUE
+        with InstrumentationService.stage(f"parse:{field_name}", nbytes=len(text_to_parse), items=1):
+            for method_name, params in parsing_methods.items():
+                field_logger = FIELD_LOG_HANDLERS[field_name] if field_name in FIELD_LOG_HANDLERS else None
+                result = parsing_method_collection[method_name](text_to_parse, params, field_logger)
+                processed[field_name] = result if result is not None else ontology.UNKN_VALUE
 
         if field_name in processed and processed[field_name] == ontology.UNKN_VALUE:
             ctr_errors[field_name] += 1
@@ -61,13 +83,167 @@ def handle_line(line, ctr_errors, ctr_total, ontology, register_dicom=True, forc
     return processed
 
 
-def do_handle_llm_responses(filepath, **handler_args):
-    llm_responses = CsvService.read(src=filepath, skip_header=True, as_dict=True, delimiter=",")
-    return map(lambda line: handle_line(line=line, **handler_args), llm_responses)
+def handle_line_isolated(line, handler_args, instrument=False):
+    """ Handling line with the own counters, which are then returned alongside with the result.
+        Utilized for the parallel processing, in which counters could not be shared.
+        instrument: whether to collect the stages statistics (see `InstrumentationService`), which are also returned.
+    """
+    InstrumentationService.enable(instrument)
+    ctr_errors = Counter()
+    ctr_total = Counter()
+    processed = handle_line(line=line, ctr_errors=ctr_errors, ctr_total=ctr_total, **handler_args)
+    return processed, ctr_errors, ctr_total, InstrumentationService.pop()
+
+
+def do_handle_llm_responses(filepath, workers=None, chunksize=16, **handler_args):
+    """ workers: int or None
+            amount of processes for handling lines in parallel (output order is kept).
+    """
+    InstrumentationService.add("csv:read", nbytes=os.path.getsize(filepath))
+    llm_responses = InstrumentationService.iter_stage(
+        "csv:read", CsvService.read(src=filepath, skip_header=True, as_dict=True, delimiter=","))
+    return do_handle_llm_lines(lines_it=llm_responses, workers=workers, chunksize=chunksize, **handler_args)
+
+
+def do_handle_llm_lines(lines_it, workers=None, chunksize=16, prefetch=None, **handler_args):
+    """ prefetch: int or None
+            amount of lines, which DICOM data is fetched ahead in background threads (sequential handling only).
+    """
+    assert (prefetch is None or workers is None), "Prefetching is supported for the sequential handling only."
+
+    if prefetch is not None and needs_dicom(handler_args["ontology"], handler_args.get("register_dicom", True)):
+        return map(lambda pair: handle_line(line=pair[0], dicom_params=pair[1], **handler_args),
+                   iter_prefetched_dicom(lines_it, ahead=prefetch))
+
+    if workers is None:
+        return map(lambda line: handle_line(line=line, **handler_args), lines_it)
+
+    ctr_errors = handler_args.pop("ctr_errors")
+    ctr_total = handler_args.pop("ctr_total")
+
+    def __merge(result):
+        processed, errors, total, stats = result
+        ctr_errors.update(errors)
+        ctr_total.update(total)
+        InstrumentationService.merge(stats)
+        return processed
+
+    results_it = ParallelService.imap_ordered(func=partial(handle_line_isolated, handler_args=handler_args,
+                                                           instrument=InstrumentationService.enabled),
+                                              items_it=lines_it, workers=workers, chunksize=chunksize,
+                                              initializer=InstrumentationService.reset)
+
+    return map(__merge, results_it)
+
+
+def register_counters(processed, ontology, ctr_errors, ctr_total):
+    """ Counters of the already processed line (see `handle_line`).
+    """
+    for field_name, _ in ontology.iter_ontology_parsers(parser_type="llm"):
+        if field_name not in processed:
+            continue
+        if processed[field_name] == ontology.UNKN_VALUE:
+            ctr_errors[field_name] += 1
+        ctr_total[field_name] += 1
+
+
+def __line_hash(line):
+    return hashlib.sha1(json.dumps(line, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def do_handle_llm_incremental(filepath, ontology, ctr_errors, ctr_total, state_filepath=None, register_dicom=True,
+                              force_params_dict=None, **handler_args):
+    """ Incremental handling of the LLM responses: the processed lines are kept in the state file
+        alongside with the hash of their content, so that only new or changed lines are handled.
+        The state is dropped once the ontology parsers or the handling parameters were changed.
+    """
+    state_filepath = join(CACHE_DIR, "llm-incremental", f"{ontology.Name}-{basename(filepath)}.pkl") \
+        if state_filepath is None else state_filepath
+
+    fingerprint = repr([ontology.parsers_fingerprint(parser_type="llm"), register_dicom, force_params_dict,
+                        DICOM_CACHE.version, DICOM_SAMPLING, DICOM_SAMPLING_N])
+
+    state = {}
+    if os.path.exists(state_filepath):
+        with open(state_filepath, "rb") as f:
+            stored = pickle.load(f)
+        if stored["fingerprint"] == fingerprint:
+            state = stored["rows"]
+
+    InstrumentationService.add("csv:read", nbytes=os.path.getsize(filepath))
+    llm_responses = list(InstrumentationService.iter_stage(
+        "csv:read", CsvService.read(src=filepath, skip_header=True, as_dict=True, delimiter=",")))
+
+    keys = [line.get("Series UID", str(i)) for i, line in enumerate(llm_responses)]
+    hashes = [__line_hash(line) for line in llm_responses]
+    changed = [i for i, (k, h) in enumerate(zip(keys, hashes)) if k not in state or state[k]["hash"] != h]
+
+    # Counters are registered below in order of the lines.
+    processed_it = do_handle_llm_lines(lines_it=[llm_responses[i] for i in changed], ctr_errors=Counter(),
+                                       ctr_total=Counter(), ontology=ontology, register_dicom=register_dicom,
+                                       force_params_dict=force_params_dict, **handler_args)
+    for i, processed in zip(changed, tqdm(processed_it, total=len(changed), desc="Changed lines")):
+        state[keys[i]] = {"hash": hashes[i], "processed": processed}
+
+    print(f"Incremental: {len(changed)} of {len(llm_responses)} lines were handled")
+
+    # Keep only the actual lines.
+    state = {k: state[k] for k in keys}
+
+    os.makedirs(dirname(state_filepath), exist_ok=True)
+    tmp_path = f"{state_filepath}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump({"fingerprint": fingerprint, "rows": state}, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, state_filepath)
+
+    for k in keys:
+        processed = state[k]["processed"]
+        register_counters(processed, ontology=ontology, ctr_errors=ctr_errors, ctr_total=ctr_total)
+        yield processed
+
+
+def do_parse_llm_columns(filepath, ontology, ctr_errors=None, ctr_total=None, force_params_dict=None, **kwargs):
+    """ Batch parsing of the LLM responses column by column (no DICOM data involved).
+        Returns the dictionary of the labels arrays per ontology field, in the order of the lines.
+        force_params_dict: optional columns of the responses to be provided as is (source name to output name).
+    """
+    assert (isinstance(force_params_dict, dict) or force_params_dict is None)
+
+    InstrumentationService.add("csv:read", nbytes=os.path.getsize(filepath))
+    llm_responses = list(InstrumentationService.iter_stage(
+        "csv:read", CsvService.read(src=filepath, skip_header=True, as_dict=True, delimiter=",")))
+    with InstrumentationService.stage("parse:batch", items=len(llm_responses)):
+        columns = batch_parse_llm_responses(lines=llm_responses, ontology=ontology, handlers=FIELD_LOG_HANDLERS,
+                                            ctr_errors=ctr_errors, ctr_total=ctr_total)
+
+    if force_params_dict is not None:
+        for k, v in force_params_dict.items():
+            columns[v] = np.array([line[k] for line in llm_responses], dtype=object)
+
+    return columns
 
 
 if __name__ == '__main__':
 
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('--workers', dest='workers', type=int, default=None)
+    parser.add_argument('--chunksize', dest='chunksize', type=int, default=16)
+    parser.add_argument('--prefetch', dest='prefetch', type=int, default=None,
+                        help="Amount of series, which DICOM data is read ahead in background threads.")
+    parser.add_argument('--columnar', dest='columnar', action='store_true', default=False,
+                        help="Additionally write the output in the columnar format (see `ColumnarWriter`).")
+    parser.add_argument('--incremental', dest='incremental', action='store_true', default=False,
+                        help="Handle only new or changed lines of the LLM responses since the previous run.")
+    parser.add_argument('--report', dest='report', type=str, default=None,
+                        help="Filepath of the JSON report with the per-stage statistics (see `InstrumentationService`).")
+    parser.add_argument('--profile', dest='profile', type=str, default=None,
+                        help="Filepath of the cProfile dump.")
+
+    args = parser.parse_args()
+
+    InstrumentationService.start(enabled=args.report is not None, profile_filepath=args.profile)
+
     # Setup error counters.
     errors = Counter()
     total = Counter()
@@ -75,10 +251,12 @@ if __name__ == '__main__':
     ontology = MODEL_ONTOLOGY_FUNC(MODEL_TO_TEST)
 
     # Dump everything into jsonl
-    items_it = [do_handle_llm_responses(**p | {"ctr_errors": errors, "ctr_total": total, "ontology": ontology})
+    handler = do_handle_llm_incremental if args.incremental else do_handle_llm_responses
+    items_it = [handler(**p | {"ctr_errors": errors, "ctr_total": total, "ontology": ontology,
+                               "workers": args.workers, "chunksize": args.chunksize, "prefetch": args.prefetch})
                 for p in MODEL_INPUT_FUNC(MODEL_TO_TEST).values()]
 
-    dict_it = iter_to_iterator(items_it=items_it)
+    dict_it = InstrumentationService.iter_stage("handle_line", iter_to_iterator(items_it=items_it))
 
     series_header = create_series_header()
 
@@ -86,13 +264,24 @@ if __name__ == '__main__':
     target_filepath = join(ISSUE_87_DIR, ontology.Name, f'{MODEL_TO_TEST}.csv')
     OsService.create_dir_if_not_exists(target_filepath, is_dir=False)
 
+    # Optional columnar output.
+    columnar_writer = ColumnarWriter(target_dir=ColumnarService.target_dir(target_filepath), columns=series_header) \
+        if args.columnar else None
+    if columnar_writer is not None:
+        dict_it = columnar_writer.tee(dict_it)
+
     # Saving in accessible format.
-    CsvService.write(
-        target=target_filepath,
-        header=create_series_header(),
-        data2col_func=lambda data: data,
-        data_it=map(lambda row: [row[c] if c in row else "None" for c in series_header],
-                    tqdm(dict_it)))
+    with InstrumentationService.stage("csv:write"):
+        CsvService.write(
+            target=target_filepath,
+            header=create_series_header(),
+            data2col_func=lambda data: data,
+            data_it=map(lambda row: [row[c] if c in row else "None" for c in series_header],
+                        tqdm(dict_it)))
+    InstrumentationService.add("csv:write", nbytes=os.path.getsize(target_filepath))
+
+    if columnar_writer is not None:
+        columnar_writer.close()
 
     print("=============")
     print("ERROR SUMMARY")
@@ -102,3 +291,6 @@ if __name__ == '__main__':
     for k, v in errors.most_common():
         print(k, ":", "%.2f" % (100*round(float(v) / total[k], 2)), "%")
     print("=============")
+
+    InstrumentationService.finish(report_filepath=args.report, profile_filepath=args.profile,
+                                  meta={"script": basename(__file__), "args": vars(args)})
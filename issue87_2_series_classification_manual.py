@@ -1,30 +1,93 @@
+import os
 from collections import Counter
-from os.path import join
+from functools import partial
+from os.path import join, basename
+
+import argparse
 
 from mmi_kit.service_dict import DictionaryService
 from mmi_kit.service_os import OsService
 from source_iter.service_csv import CsvService
 from tqdm import tqdm
 
+from core.service_columnar import ColumnarWriter, ColumnarService
+from core.service_instrumentation import InstrumentationService
+from core.service_parallel import ParallelService
 from core.service_spreadsheet import SpreadsheetService
 from core.utils import iter_to_iterator
-from presets.issue87.llm_matching_while import do_while_not_true
 from presets.issue87.schemas.base import BaseOntology
+from presets.issue87.schemas.rules import ALL_CATEGORIES
+from presets.issue87.schemas.utils import manual_terms_stats
 from presets.issue87.schemas.v21 import OntologyV21
-from presets.issue87.utils import MODEL_INPUT_FUNC, iter_dicom_data, create_series_header, FIELD_LOG_HANDLERS, \
-    DICOM_ROOTS, ISSUE_87_DIR, MODEL_TO_TEST
+from presets.issue87.gold_store import GoldStore
+from utils_dicom_handlers import MANIFEST2CAT_DICT
+from presets.issue87.utils import MODEL_INPUT_FUNC, get_line_dicom_data, iter_prefetched_dicom, create_series_header, \
+    FIELD_LOG_HANDLERS, ISSUE_87_DIR, MODEL_TO_TEST, DICOM_CACHE, DICOM_SAMPLING, DICOM_SAMPLING_N
+
+
+GOLD_STORE_KEYS = {"Series UID": "Series UID", "Collection": "Collection"}
+
+# Counter of the series handled with the DICOM data in the manifest-only mode.
+DICOM_FALLBACK_KEY = "dicom:fallback"
+
+
+def register_counters(collection_name, field_name, value, ctr_errors, ctr_total, ontology):
+
+    # Registering information in total.
+    ctr_collection_total = DictionaryService.register_path(ctr_total, path=[collection_name], value_if_not_exist=Counter())
+    ctr_collection_total[field_name] += 1
+    # Register information per field.
+    ctr_collection_total[f"{field_name}:{value}"] += 1
+
+    if value == ontology.UNKN_VALUE:
+        # Registering found errors.
+        ctr_collection_e = DictionaryService.register_path(ctr_errors, path=[collection_name], value_if_not_exist=Counter())
+        ctr_collection_e[field_name] += 1
+
+
+def needs_dicom(ontology, register_dicom):
+    """ Whether the DICOM data is required by the parsers or the output.
+    """
+    return register_dicom or len(ontology.get_dicom_categories(parser_type="manual")) > 0
+
+
+def get_manifest_params(line):
+    """ Categories of the series provided by the collection manifest line (empty values are treated as missing).
+    """
+    return {cat: line[col] for col, cat in MANIFEST2CAT_DICT.items() if line.get(col, "") != ""}
+
+
+def is_manifest_sufficient(ontology, manifest_params):
+    """ Whether all the categories required by the manual parsers are provided by the manifest.
+    """
+    required = ontology.get_dicom_categories(parser_type="manual")
+    return ALL_CATEGORIES not in required and required <= manifest_params.keys()
 
 
-def handle_line(line, ctr_errors, ctr_total, ontology, register_dicom=True, force_params_dict=None, **kwargs):
+def handle_line(line, ctr_errors, ctr_total, ontology, register_dicom=True, force_params_dict=None, dicom_params=None,
+                manifest_only=False, **kwargs):
+    """ dicom_params: optional DICOM data of the series, which has been already fetched (e.g. prefetched).
+        manifest_only: categories are derived from the manifest columns (see `MANIFEST2CAT_DICT`),
+                       while DICOM data is fetched only for the series that lack the categories required by rules.
+                       Registered output is then limited to the categories being utilized.
+    """
     assert (isinstance(ontology, BaseOntology))
     assert (isinstance(force_params_dict, dict) or force_params_dict is None)
 
-    # Provide DICOM data.
-    dicom_params = {}
     collection_name = line["Collection"]
-    series_dir = join(DICOM_ROOTS[collection_name], line["File Location"])
-    for data in iter_dicom_data(series_dir):
-        dicom_params.update(data)
+
+    if manifest_only:
+        dicom_params = get_manifest_params(line)
+        if not is_manifest_sufficient(ontology, dicom_params):
+            # Falling back onto the DICOM data.
+            dicom_params = get_line_dicom_data(line)
+            DictionaryService.register_path(ctr_total, path=[collection_name],
+                                            value_if_not_exist=Counter())[DICOM_FALLBACK_KEY] += 1
+    # Provide DICOM data only when it is required by the parsers or the output.
+    elif not needs_dicom(ontology, register_dicom):
+        dicom_params = {}
+    elif dicom_params is None:
+        dicom_params = get_line_dicom_data(line)
 
     # Initialize output dictionary.
     if force_params_dict is not None:
@@ -32,27 +95,16 @@ def handle_line(line, ctr_errors, ctr_total, ontology, register_dicom=True, forc
     else:
         processed = {}
 
-    for field_name, parsing_methods in ontology.iter_ontology_parsers(parser_type="manual"):
-
-        parsing_method_collection = {
-            "while_not_true": do_while_not_true,
-        }
+    # Classify the series by all the fields at once.
+    with InstrumentationService.stage("parse:manual", items=1):
+        results = ontology.get_manual_parsers_compiled().classify(dicom_params, handlers=FIELD_LOG_HANDLERS)
 
-        for method_name, params in parsing_methods.items():
-            field_logger = FIELD_LOG_HANDLERS[field_name] if field_name in FIELD_LOG_HANDLERS else None
-            result = parsing_method_collection[method_name](dicom_params, params, field_logger)
-            processed[field_name] = result if result is not None else ontology.UNKN_VALUE
+    for field_name, result in results.items():
 
-        # Registering information in total.
-        ctr_collection_total = DictionaryService.register_path(ctr_total, path=[collection_name], value_if_not_exist=Counter())
-        ctr_collection_total[field_name] += 1
-        # Register information per field.
-        ctr_collection_total[f"{field_name}:{processed[field_name]}"] += 1
+        processed[field_name] = result if result is not None else ontology.UNKN_VALUE
 
-        if field_name in processed and processed[field_name] == ontology.UNKN_VALUE:
-            # Registering found errors.
-            ctr_collection_e = DictionaryService.register_path(ctr_errors, path=[collection_name], value_if_not_exist=Counter())
-            ctr_collection_e[field_name] += 1
+        register_counters(collection_name=collection_name, field_name=field_name, value=processed[field_name],
+                          ctr_errors=ctr_errors, ctr_total=ctr_total, ontology=ontology)
 
     if register_dicom:
         processed = processed | dicom_params
@@ -60,24 +112,169 @@ def handle_line(line, ctr_errors, ctr_total, ontology, register_dicom=True, forc
     return processed
 
 
-def do_handle_manual(metadata, **handler_args):
-    csv_metadata = CsvService.read(src=metadata, skip_header=True, as_dict=True, delimiter=",")
-    return map(lambda line: handle_line(line=line, **handler_args), csv_metadata)
+def handle_line_isolated(line, handler_args, instrument=False):
+    """ Handling line with the own counters, which are then returned alongside with the result.
+        Utilized for the parallel processing, in which counters could not be shared.
+        instrument: whether to collect the stages statistics (see `InstrumentationService`), which are also returned.
+    """
+    InstrumentationService.enable(instrument)
+    ctr_errors = {}
+    ctr_total = {}
+    processed = handle_line(line=line, ctr_errors=ctr_errors, ctr_total=ctr_total, **handler_args)
+    return processed, ctr_errors, ctr_total, InstrumentationService.pop()
+
+
+def do_handle_manual(metadata, workers=None, chunksize=16, prefetch=None, **handler_args):
+    """ workers: int or None
+            amount of processes for handling lines in parallel (output order is kept).
+        prefetch: int or None
+            amount of lines, which DICOM data is fetched ahead in background threads (sequential handling only).
+    """
+    assert (prefetch is None or workers is None), "Prefetching is supported for the sequential handling only."
+
+    InstrumentationService.add("csv:read", nbytes=os.path.getsize(metadata))
+    csv_metadata = InstrumentationService.iter_stage(
+        "csv:read", CsvService.read(src=metadata, skip_header=True, as_dict=True, delimiter=","))
+
+    if prefetch is not None and not handler_args.get("manifest_only", False) and \
+            needs_dicom(handler_args["ontology"], handler_args.get("register_dicom", True)):
+        return map(lambda pair: handle_line(line=pair[0], dicom_params=pair[1], **handler_args),
+                   iter_prefetched_dicom(csv_metadata, ahead=prefetch))
+
+    if workers is None:
+        return map(lambda line: handle_line(line=line, **handler_args), csv_metadata)
+
+    ctr_errors = handler_args.pop("ctr_errors")
+    ctr_total = handler_args.pop("ctr_total")
+
+    def __merge(result):
+        processed, errors, total, stats = result
+        for target, source in [(ctr_errors, errors), (ctr_total, total)]:
+            for collection_name, ctr in source.items():
+                DictionaryService.register_path(target, path=[collection_name], value_if_not_exist=Counter()).update(ctr)
+        InstrumentationService.merge(stats)
+        return processed
+
+    results_it = ParallelService.imap_ordered(func=partial(handle_line_isolated, handler_args=handler_args,
+                                                           instrument=InstrumentationService.enabled),
+                                              items_it=csv_metadata, workers=workers, chunksize=chunksize,
+                                              initializer=InstrumentationService.reset)
+
+    return map(__merge, results_it)
+
+
+def get_gold_store(ontology):
+    return GoldStore(store_dir=join(ISSUE_87_DIR, ontology.Name, "gold-manual"), ontology=ontology)
+
+
+def get_gold_meta(ontology, metadata, manifest_only=False):
+    return GoldStore.meta(ontology=ontology, metadata=metadata,
+                          version=[DICOM_CACHE.version, DICOM_SAMPLING, DICOM_SAMPLING_N] +
+                                  (["manifest"] if manifest_only else []))
+
+
+def iter_materialized(lines_it, store, meta, ontology):
+    """ Passes the processed lines through and materializes their gold labels once all the lines were handled.
+        NOTE: lines are expected to provide the `GOLD_STORE_KEYS` (see `force_params_dict`).
+    """
+    uids = []
+    collections = []
+    columns = {field_name: [] for field_name in ontology.get_manual_parsers_compiled().iter_fields()}
+
+    for line in lines_it:
+        uids.append(line["Series UID"])
+        collections.append(line["Collection"])
+        for field_name, labels in columns.items():
+            labels.append(line[field_name])
+        yield line
+
+    store.save(meta=meta, uids=uids, collections=collections, columns=columns)
+
+
+def load_gold(metadata, ontology, rebuild=False, manifest_only=False, **handler_args):
+    """ Gold annotation (see `GoldAnnotation`) of the materialized store (see `get_gold_store`),
+        the store gets rebuilt in the case when it is missing or outdated (e.g. the ontology rules were changed).
+    """
+    store = get_gold_store(ontology)
+    meta = get_gold_meta(ontology=ontology, metadata=metadata, manifest_only=manifest_only)
+
+    gold = None if rebuild else store.load(meta)
+    if gold is None:
+        lines_it = do_handle_manual(metadata=metadata, ctr_errors={}, ctr_total={}, ontology=ontology,
+                                    register_dicom=False, force_params_dict=GOLD_STORE_KEYS,
+                                    manifest_only=manifest_only, **handler_args)
+        for _ in tqdm(iter_materialized(lines_it, store=store, meta=meta, ontology=ontology), desc="Gold store"):
+            pass
+        gold = store.load(meta)
+
+    return gold
+
+
+def do_handle_manual_stored(metadata, ontology, ctr_errors, ctr_total, register_dicom=False, force_params_dict=None,
+                            rebuild=False, manifest_only=False, **handler_args):
+    """ Gold annotation which is loaded from the materialized store (see `load_gold`).
+        The counters are replayed from the stored labels, so they match the ones of `do_handle_manual`.
+    """
+    assert (not register_dicom), "DICOM data is not a part of the gold annotation store."
+    assert (isinstance(force_params_dict, dict) or force_params_dict is None)
+
+    gold = load_gold(metadata=metadata, ontology=ontology, rebuild=rebuild, manifest_only=manifest_only,
+                     **handler_args)
+
+    for line in CsvService.read(src=metadata, skip_header=True, as_dict=True, delimiter=","):
+
+        collection_name, labels = gold.get(line["Series UID"])
+
+        processed = {v: line[k] for k, v in force_params_dict.items()} if force_params_dict is not None else {}
+
+        for field_name, value in labels.items():
+            processed[field_name] = value
+            register_counters(collection_name=collection_name, field_name=field_name, value=value,
+                              ctr_errors=ctr_errors, ctr_total=ctr_total, ontology=ontology)
+
+        yield processed
 
 
 if __name__ == '__main__':
 
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('--workers', dest='workers', type=int, default=None)
+    parser.add_argument('--chunksize', dest='chunksize', type=int, default=16)
+    parser.add_argument('--prefetch', dest='prefetch', type=int, default=None,
+                        help="Amount of series, which DICOM data is read ahead in background threads.")
+    parser.add_argument('--manifest-only', dest='manifest_only', action='store_true', default=False,
+                        help="Derive the categories from the collection manifest, DICOM data is read only for "
+                             "the series that lack the categories required by the rules.")
+    parser.add_argument('--columnar', dest='columnar', action='store_true', default=False,
+                        help="Additionally write the output in the columnar format (see `ColumnarWriter`).")
+    parser.add_argument('--report', dest='report', type=str, default=None,
+                        help="Filepath of the JSON report with the per-stage statistics (see `InstrumentationService`).")
+    parser.add_argument('--profile', dest='profile', type=str, default=None,
+                        help="Filepath of the cProfile dump.")
+
+    args = parser.parse_args()
+
+    InstrumentationService.start(enabled=args.report is not None, profile_filepath=args.profile)
+
     # Setup dictionaries for errors stat and total stat.
     errors = {}
     total = {}
 
     ontology = OntologyV21()
 
-    # Dump everything into jsonl
-    items_it = [do_handle_manual(**p | {"ctr_errors": errors, "ctr_total": total, "ontology": ontology})
+    # Dump everything into jsonl, while materializing the gold annotation store.
+    items_it = [iter_materialized(
+                    do_handle_manual(**p | {"ctr_errors": errors, "ctr_total": total, "ontology": ontology,
+                                            "workers": args.workers, "chunksize": args.chunksize,
+                                            "prefetch": args.prefetch, "manifest_only": args.manifest_only,
+                                            "force_params_dict": GOLD_STORE_KEYS}),
+                    store=get_gold_store(ontology),
+                    meta=get_gold_meta(ontology=ontology, metadata=p["metadata"], manifest_only=args.manifest_only),
+                    ontology=ontology)
                 for p in MODEL_INPUT_FUNC(MODEL_TO_TEST).values()]
 
-    dict_it = iter_to_iterator(items_it=items_it)
+    dict_it = InstrumentationService.iter_stage("handle_line", iter_to_iterator(items_it=items_it))
 
     series_header = create_series_header()
 
@@ -85,13 +282,24 @@ if __name__ == '__main__':
     target_filepath = join(ISSUE_87_DIR, ontology.Name, "series-results-manual.csv")
     OsService.create_dir_if_not_exists(target_filepath, is_dir=False)
 
+    # Optional columnar output.
+    columnar_writer = ColumnarWriter(target_dir=ColumnarService.target_dir(target_filepath), columns=series_header) \
+        if args.columnar else None
+    if columnar_writer is not None:
+        dict_it = columnar_writer.tee(dict_it)
+
     # Saving in accessible format.
-    CsvService.write(
-        target=target_filepath,
-        header=create_series_header(),
-        data2col_func=lambda data: data,
-        data_it=map(lambda row: [row[c] if c in row else "None" for c in series_header],
-                    tqdm(dict_it)))
+    with InstrumentationService.stage("csv:write"):
+        CsvService.write(
+            target=target_filepath,
+            header=create_series_header(),
+            data2col_func=lambda data: data,
+            data_it=map(lambda row: [row[c] if c in row else "None" for c in series_header],
+                        tqdm(dict_it)))
+    InstrumentationService.add("csv:write", nbytes=os.path.getsize(target_filepath))
+
+    if columnar_writer is not None:
+        columnar_writer.close()
 
     header = ontology.get_header()
 
@@ -118,3 +326,11 @@ if __name__ == '__main__':
                       k.split(':')[1][:3].ljust(5, " "),
                       #value,
                       f"{round(100 * value / total_per_concept, 2)}%")
+
+    if args.manifest_only:
+        print("-----------------")
+        print(f"DICOM fallback: {ds_stat_ctr[DICOM_FALLBACK_KEY]} of {ds_stat_ctr[header[0]]} series")
+
+    InstrumentationService.finish(report_filepath=args.report, profile_filepath=args.profile,
+                                  meta={"script": basename(__file__), "args": vars(args),
+                                        "terms_cache": manual_terms_stats()})
@@ -1,5 +1,7 @@
-from os.path import join
+import os
+from os.path import join, basename
 
+import argparse
 from mmi_kit.service_dict import DictionaryService
 from mmi_kit.service_os import OsService
 from tqdm import tqdm
@@ -7,8 +9,14 @@ from collections import Counter
 
 from source_iter.service_csv import CsvService
 
-from presets.issue87.utils import MODEL_INPUT_FUNC, DICOM_default_params, ISSUE_87_DIR, MODEL_ONTOLOGY_FUNC, MODEL_TO_TEST
+from presets.issue87.schemas.mapping import SeriesFilter, SeriesMappingCompiled
+from presets.issue87.utils import MODEL_INPUT_FUNC, DICOM_default_params, ISSUE_87_DIR, MODEL_ONTOLOGY_FUNC, MODEL_TO_TEST, \
+    DICOM_INDEX
+from utils import CACHE_DIR
 
+from core.service_columnar import ColumnarWriter, ColumnarService
+from core.service_grouping import GroupingService
+from core.service_instrumentation import InstrumentationService
 from core.utils import iter_to_iterator
 
 from issue87_2_series_classification_llm import do_handle_llm_responses
@@ -27,26 +35,96 @@ def group_in_memory_iter(dict_it, col_id):
         yield content
 
 
+def is_clustered_input(filepaths, col_id="Patient_ID"):
+    """ Pre-scan of the input CSV files: whether series are clustered by the grouping key.
+        The key originates from the DICOM data, hence it is looked up in the index (see `DICOM_INDEX`);
+        input with the series out of the index is considered as not clustered.
+    """
+    lines_it = iter_to_iterator(
+        [CsvService.read(src=filepath, skip_header=True, as_dict=True, delimiter=",") for filepath in filepaths])
+
+    not_indexed = []
+
+    def __iter_keys():
+        for line in lines_it:
+            entry = DICOM_INDEX.get(line["Series UID"]) if "Series UID" in line else None
+            if entry is None or col_id not in entry["data"]:
+                not_indexed.append(line)
+                return
+            yield entry["data"][col_id]
+
+    return GroupingService.is_clustered(__iter_keys()) and len(not_indexed) == 0
+
+
+def group_iter(dict_it, col_id, mode, buffer_size=10000):
+    """ mode: str
+            "memory" -- keep the whole collection in memory;
+            "clustered" -- streaming grouping for the input clustered by `col_id`;
+            "external" -- external sort grouping with at most `buffer_size` series kept in memory.
+    """
+    if mode == "memory":
+        return group_in_memory_iter(dict_it=dict_it, col_id=col_id)
+    if mode == "clustered":
+        return GroupingService.iter_clustered(dict_it=dict_it, col_id=col_id)
+    if mode == "external":
+        return GroupingService.iter_external(dict_it=dict_it, col_id=col_id, buffer_size=buffer_size,
+                                             tmp_dir=join(CACHE_DIR, "grouping"))
+    raise Exception(f"Grouping mode is not supported: `{mode}`")
+
+
 def series_to_patients(series_group_it, cols_mapping, default_cols):
 
+    # Declarative mapping is compiled for counting all the columns within a single pass over the patient series.
+    compiled = SeriesMappingCompiled(cols_mapping) \
+        if all(isinstance(h, SeriesFilter) for h in cols_mapping.values()) else None
+
     for patient_series in series_group_it:
         assert (isinstance(patient_series, list))
 
         patient_data = {}
 
-        for col, h in cols_mapping.items():
-            patient_data[col] = len(h(patient_series))
+        with InstrumentationService.stage("aggregate", items=len(patient_series)):
+
+            if compiled is not None:
+                patient_data.update(compiled.count(patient_series))
+            else:
+                for col, h in cols_mapping.items():
+                    patient_data[col] = len(h(patient_series))
 
-        # Keep default columns by fetching the value from the first row.
-        for col in default_cols:
-            if col in patient_series[0]:
-                patient_data[col] = patient_series[0][col]
+            # Keep default columns by fetching the value from the first row.
+            for col in default_cols:
+                if col in patient_series[0]:
+                    patient_data[col] = patient_series[0][col]
 
         yield patient_data
 
 
 if __name__ == '__main__':
 
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('--workers', dest='workers', type=int, default=None)
+    parser.add_argument('--chunksize', dest='chunksize', type=int, default=16)
+    parser.add_argument('--columnar', dest='columnar', action='store_true', default=False,
+                        help="Additionally write the output in the columnar format (see `ColumnarWriter`).")
+    parser.add_argument('--grouping', dest='grouping', type=str, default="auto",
+                        choices=["auto", "memory", "clustered", "external"],
+                        help="Grouping of the series by patients; `auto` pre-scans the input CSV files and selects "
+                             "streaming grouping for the input clustered by Patient_ID and external sort grouping "
+                             "otherwise. NOTE: Patient_ID is looked up in the DICOM index (issue87_1_dicom_index.py), "
+                             "so without the index (or with the series out of it) `auto` always selects "
+                             "external sort grouping; use `clustered` for the input known to be clustered.")
+    parser.add_argument('--buffer-size', dest='buffer_size', type=int, default=10000,
+                        help="Max amount of the series kept in memory by the external sort grouping.")
+    parser.add_argument('--report', dest='report', type=str, default=None,
+                        help="Filepath of the JSON report with the per-stage statistics (see `InstrumentationService`).")
+    parser.add_argument('--profile', dest='profile', type=str, default=None,
+                        help="Filepath of the cProfile dump.")
+
+    args = parser.parse_args()
+
+    InstrumentationService.start(enabled=args.report is not None, profile_filepath=args.profile)
+
     # Setup error counters.
     errors = Counter()
     total = Counter()
@@ -54,13 +132,21 @@ if __name__ == '__main__':
     ontology = MODEL_ONTOLOGY_FUNC(MODEL_TO_TEST)
 
     # Dump everything into jsonl
-    items_it = [do_handle_llm_responses(**p | {"ctr_errors": errors, "ctr_total": total, "ontology": ontology})
+    items_it = [do_handle_llm_responses(**p | {"ctr_errors": errors, "ctr_total": total, "ontology": ontology,
+                                               "workers": args.workers, "chunksize": args.chunksize})
                 for p in MODEL_INPUT_FUNC(MODEL_TO_TEST).values()]
 
-    series_it = iter_to_iterator(items_it=items_it)
+    series_it = InstrumentationService.iter_stage("handle_line", iter_to_iterator(items_it=items_it))
+
+    grouping = args.grouping
+    if grouping == "auto":
+        filepaths = [p["filepath"] for p in MODEL_INPUT_FUNC(MODEL_TO_TEST).values()]
+        grouping = "clustered" if is_clustered_input(filepaths) else "external"
 
     aligned_patients_it = series_to_patients(
-        series_group_it=group_in_memory_iter(dict_it=tqdm(series_it), col_id="Patient_ID"),
+        series_group_it=InstrumentationService.iter_stage(
+            "group", group_iter(dict_it=tqdm(series_it), col_id="Patient_ID", mode=grouping,
+                                buffer_size=args.buffer_size)),
         cols_mapping=ontology.ontology_series_mapping(),
         default_cols=DICOM_default_params)
 
@@ -77,10 +163,24 @@ if __name__ == '__main__':
     target = join(ISSUE_87_DIR, ontology.Name, f"patient-ontology-{MODEL_TO_TEST}.csv")
     OsService.create_dir_if_not_exists(target, is_dir=False)
 
+    # Optional columnar output.
+    columnar_writer = ColumnarWriter(target_dir=ColumnarService.target_dir(target), columns=header) \
+        if args.columnar else None
+    if columnar_writer is not None:
+        aligned_patients_it = columnar_writer.tee(aligned_patients_it)
+
     # Saving in accessible format.
-    CsvService.write(
-        target=target,
-        header=header,
-        data2col_func=lambda data: data,
-        data_it=map(lambda row: [row[c] if c in row else "None" for c in header],
-                    aligned_patients_it))
+    with InstrumentationService.stage("csv:write"):
+        CsvService.write(
+            target=target,
+            header=header,
+            data2col_func=lambda data: data,
+            data_it=map(lambda row: [row[c] if c in row else "None" for c in header],
+                        aligned_patients_it))
+    InstrumentationService.add("csv:write", nbytes=os.path.getsize(target))
+
+    if columnar_writer is not None:
+        columnar_writer.close()
+
+    InstrumentationService.finish(report_filepath=args.report, profile_filepath=args.profile,
+                                  meta={"script": basename(__file__), "args": vars(args)})
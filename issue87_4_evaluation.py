@@ -1,17 +1,20 @@
 from collections import Counter
-from os.path import join
+from os.path import join, basename
 
 import argparse
+import numpy as np
 from mmi_kit.service_dict import DictionaryService
 from mmi_kit.service_os import OsService
-from sklearn.metrics import f1_score
 from tqdm import tqdm
 
+from core.service_instrumentation import InstrumentationService
+from core.service_metrics import MetricsService
 from core.service_seaborn import SeabornService
 from core.service_spreadsheet import SpreadsheetService
-from core.utils import iter_to_iterator
+from core.utils import iter_to_iterator, iter_join_by_key
 from issue87_2_series_classification_llm import do_handle_llm_responses
-from issue87_2_series_classification_manual import do_handle_manual
+from issue87_2_series_classification_manual import do_handle_manual_stored
+from presets.issue87.label_store import LabelColumn
 from presets.issue87.schemas.base import BaseOntology
 from presets.issue87.utils import MODEL_INPUT_FUNC, ISSUE_87_DIR, MODEL_RESULTS, MODEL_TO_TEST
 
@@ -21,10 +24,22 @@ def show_log(total, errors):
         print(k, ":", "%.2f" % (100 * round(float(v) / total[k], 2)), "%")
 
 
-def iter_series(h, ontology, m_name):
+JOIN_KEY = "Series UID"
+JOIN_PARAMS = {JOIN_KEY: JOIN_KEY}
+
+
+def show_unmatched(unmatched, side_names=None):
+    side_names = {"left": "gold", "right": "predict"} if side_names is None else side_names
+    for side, keys in sorted(unmatched.items()):
+        if len(keys) > 0:
+            print(f"Unmatched {side_names[side]} rows: {len(keys)}")
+
+
+def iter_series(h, ontology, m_name, **handler_args):
     errors = Counter()
     total = Counter()
-    data_it = [h(**p | {"ctr_errors": errors, "ctr_total": total, "register_dicom": False, "ontology": ontology})
+    data_it = [h(**p | handler_args | {"ctr_errors": errors, "ctr_total": total, "register_dicom": False,
+                                       "ontology": ontology})
                for p in MODEL_INPUT_FUNC(m_name).values()]
     return data_it, total, errors
 
@@ -40,12 +55,24 @@ def handle_line(line, params, results):
 
 
 def do_eval(gold_results, predict_results, entries_total, ontology,
-            show_amount=True, show_amount_p=True, save_f1_visual_func=None):
+            show_amount=True, show_amount_p=True, show_per_class=False, save_f1_visual_func=None,
+            bootstrap=None, seed=None):
+    """ gold_results, predict_results: dict
+            field name to the list of labels, or to the `LabelColumn` of codes (see `LabelStore`).
+        bootstrap: int or None
+            amount of resamples for calculating the 95% confidence intervals of the results.
+        seed: int or None
+            seed of the bootstrap resampling.
+    """
     assert (isinstance(ontology, BaseOntology))
+    assert (isinstance(bootstrap, int) or bootstrap is None)
+
+    rng = np.random.default_rng(seed)
 
     amount_d = {}
     res_eval = {}
     res_missed = {}
+    res_ci = {}
     for k in ontology.iter_ontology_keys():
 
         # get labels
@@ -57,37 +84,59 @@ def do_eval(gold_results, predict_results, entries_total, ontology,
         y_true = gold_results.get(k, [])
         y_pred = predict_results.get(k, [])
 
+        # Single pass over the results, all the metrics are then derived from the matrix.
+        is_codes = isinstance(y_true, LabelColumn)
+        with InstrumentationService.stage("eval:confusion", items=len(y_true.codes) if is_codes else len(y_true)):
+            if is_codes:
+                confusion = MetricsService.confusion_codes(true_codes=y_true.codes, true_classes=y_true.classes,
+                                                           predict_codes=y_pred.codes, predict_classes=y_pred.classes)
+            else:
+                confusion = MetricsService.confusion(true_list=y_true, predict_list=y_pred,
+                                                     classes_list=labels + [ontology.UNKN_VALUE])
+
         # For debugging purposes: exploiting actual labels set.
-        actual_labels = [label for label in labels if label in y_pred or label in y_true]
+        actual_labels = [label for label in labels
+                         if confusion.true_count(label) > 0 or confusion.predicted_count(label) > 0]
 
         # This is for the case when
         if len(labels) == 1:
             # Calculating accuracy.
             r_type = 'ACC'
-            result = sum([1 for i in range(len(y_true)) if y_true[i] == y_pred[i]]) / len(y_true)
+            result = confusion.accuracy()
         else:
             # Calculating F-measure.
             r_type = "F1"
-            result = f1_score(y_true=y_true, y_pred=y_pred, average="macro", labels=labels, zero_division=0.0)
+            result = confusion.macro_f1(labels)
 
         # Logging results.
-        amount = len(y_true)
+        amount = confusion.total
 
         # Formatting evaluated output.
         res_line = "{r_type}({key}) ({actual_labels}): {value} [checked: {amount}/{entries_total}, {percentage}%]".format(
             r_type=r_type, key=k, actual_labels=actual_labels, value="%.2f" % result, amount=amount,
             entries_total=entries_total, percentage="%.2f" % (100 * float(amount) / entries_total))
 
+        if bootstrap is not None:
+            with InstrumentationService.stage("eval:bootstrap", items=bootstrap):
+                res_ci[k] = confusion.bootstrap(labels, metric="acc" if r_type == "ACC" else "f1",
+                                                resamples=bootstrap, rng=rng)
+            res_line += " [95% CI: {low}-{high}]".format(low="%.2f" % res_ci[k][0], high="%.2f" % res_ci[k][1])
+
         print(res_line)
 
+        if show_per_class:
+            precision, recall, _ = confusion.per_class(labels)
+            for i, label in enumerate(labels):
+                print(f"\t{label}: P={precision[i]:.2f} R={recall[i]:.2f}")
+
         # Register result in dictionary.
         res_eval[k] = result
 
         # Logging the percentage of the missed results.
-        res_missed[k] = sum([1 for v in y_pred if v == ontology.UNKN_VALUE]) / len(y_pred)
+        res_missed[k] = confusion.predicted_rate(ontology.UNKN_VALUE)
 
         # Register the total amount.
-        amount_d[k] = y_true
+        amount_d[k] = amount
 
         # Evaluation for confusion matrix
         if save_f1_visual_func is not None:
@@ -107,17 +156,18 @@ def do_eval(gold_results, predict_results, entries_total, ontology,
                 "plane_type": "Plane",
             }
 
-            SeabornService.confusion_heatmap_2d(true_list=y_true, predict_list=y_pred,
-                                                # We compose matrix by using all the class values including UNKN value.
-                                                classes_list=actual_labels + [ontology.UNKN_VALUE],
-                                                # We display only known values.
-                                                classes_list_visual=actual_labels,
-                                                do_normalize=True,
-                                                save_png_path=save_f1_visual_func(k),
-                                                # We pick only first 3 letters.
-                                                handle_visual_func=lambda text: text[:3].upper(),
-                                                x_caption=x_captions[k] if k in x_captions else k,
-                                                figsize=fig_size[len(actual_labels)])
+            with InstrumentationService.stage("eval:plot", items=1):
+                SeabornService.confusion_matrix_heatmap(confusion=confusion,
+                                                        # We compose matrix by using all the class values including UNKN value.
+                                                        classes_list=actual_labels + [ontology.UNKN_VALUE],
+                                                        # We display only known values.
+                                                        classes_list_visual=actual_labels,
+                                                        do_normalize=True,
+                                                        save_png_path=save_f1_visual_func(k),
+                                                        # We pick only first 3 letters.
+                                                        handle_visual_func=lambda text: text[:3].upper(),
+                                                        x_caption=x_captions[k] if k in x_captions else k,
+                                                        figsize=fig_size[len(actual_labels)])
 
     header = ontology.get_header()
 
@@ -127,9 +177,11 @@ def do_eval(gold_results, predict_results, entries_total, ontology,
 
     # Print in format accessible for pasting in Google Spreadsheet.
     if show_amount:
-        print(SpreadsheetService.format_line([str(len(amount_d.get(v, []))) for v in header]))
+        print(SpreadsheetService.format_line([str(amount_d.get(v, 0)) for v in header]))
     if show_amount_p:
-        print(SpreadsheetService.format_line(["%.1f" % (100 * float(len(amount_d.get(v, []))) / entries_total) for v in header]))
+        print(SpreadsheetService.format_line(["%.1f" % (100 * float(amount_d.get(v, 0)) / entries_total) for v in header]))
+
+    return res_eval, res_missed, res_ci
 
 
 if __name__ == '__main__':
@@ -140,18 +192,42 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser()
 
     parser.add_argument('--model', dest='model', type=str, nargs="?", default=MODEL_TO_TEST)
+    parser.add_argument('--workers', dest='workers', type=int, default=None)
+    parser.add_argument('--chunksize', dest='chunksize', type=int, default=16)
+    parser.add_argument('--rebuild-gold', dest='rebuild_gold', action='store_true', default=False,
+                        help="Recompute the gold annotation instead of loading it from the store.")
+    parser.add_argument('--bootstrap', dest='bootstrap', type=int, default=None,
+                        help="Amount of resamples for the confidence intervals.")
+    parser.add_argument('--seed', dest='seed', type=int, default=None)
+    parser.add_argument('--manifest-only', dest='manifest_only', action='store_true', default=False,
+                        help="Compute the gold annotation from the collection manifest (DICOM data as a fallback).")
+    parser.add_argument('--report', dest='report', type=str, default=None,
+                        help="Filepath of the JSON report with the per-stage statistics (see `InstrumentationService`).")
+    parser.add_argument('--profile', dest='profile', type=str, default=None,
+                        help="Filepath of the cProfile dump.")
 
     args = parser.parse_args()
 
+    InstrumentationService.start(enabled=args.report is not None, profile_filepath=args.profile)
+
     ontology = MODEL_RESULTS[args.model]["ontology"]
 
-    manual_it, manual_t, manual_e = iter_series(do_handle_manual, ontology=ontology, m_name=args.model)
-    llm_it, llm_t, llm_e = iter_series(do_handle_llm_responses, ontology=ontology, m_name=args.model)
+    manual_it, manual_t, manual_e = iter_series(do_handle_manual_stored, ontology=ontology, m_name=args.model,
+                                                workers=args.workers, chunksize=args.chunksize,
+                                                rebuild=args.rebuild_gold, manifest_only=args.manifest_only,
+                                                force_params_dict=JOIN_PARAMS)
+    llm_it, llm_t, llm_e = iter_series(do_handle_llm_responses, ontology=ontology, m_name=args.model,
+                                       workers=args.workers, chunksize=args.chunksize, force_params_dict=JOIN_PARAMS)
+
+    # Predictions are indexed, while gold annotation is streamed.
+    unmatched = {}
+    pairs_it = iter_join_by_key(left_it=iter_to_iterator(manual_it), right_it=iter_to_iterator(llm_it),
+                                key=JOIN_KEY, build="right", unmatched=unmatched)
 
     gold_results = dict()
     predict_results = dict()
     entries_total = 0
-    for gold_line, predict_line in tqdm(zip(iter_to_iterator(manual_it), iter_to_iterator(llm_it)), desc=args.model):
+    for gold_line, predict_line in tqdm(InstrumentationService.iter_stage("join", pairs_it), desc=args.model):
 
         # For such parameters which values are defined both in gold annotation and predict annotation.
         known_gold_params = [k for k in ontology.iter_ontology_keys() if gold_line[k] != ontology.UNKN_VALUE]
@@ -163,6 +239,8 @@ if __name__ == '__main__':
 
         entries_total += 1
 
+    show_unmatched(unmatched)
+
     print("=============")
     print("ERROR SUMMARY")
     print("=============")
@@ -190,5 +268,8 @@ if __name__ == '__main__':
     OsService.create_dir_if_not_exists(target_dir, is_dir=True)
 
     do_eval(gold_results=gold_results, predict_results=predict_results, entries_total=entries_total, ontology=ontology,
-            show_amount=False, show_amount_p=False,
+            show_amount=False, show_amount_p=False, bootstrap=args.bootstrap, seed=args.seed,
             save_f1_visual_func=lambda cat: join(target_dir, f"{args.model}-{cat}.png"))
+
+    InstrumentationService.finish(report_filepath=args.report, profile_filepath=args.profile,
+                                  meta={"script": basename(__file__), "args": vars(args)})
@@ -3,7 +3,7 @@ import random
 from tqdm import tqdm
 
 from core.utils import iter_to_iterator
-from issue87_2_series_classification_manual import do_handle_manual
+from issue87_2_series_classification_manual import do_handle_manual_stored
 from issue87_4_evaluation import iter_series, handle_line, do_eval
 from presets.issue87.utils import MODEL_ONTOLOGY_FUNC, MODEL_TO_TEST
 
@@ -52,6 +52,6 @@ if __name__ == '__main__':
     ontology = MODEL_ONTOLOGY_FUNC(MODEL_TO_TEST)
 
     print("Results for RANDOM w/o UNK-VALUE [Assign only known values.]")
-    manual_it, manual_t, manual_e = iter_series(h=do_handle_manual, ontology=ontology, m_name=MODEL_TO_TEST)
+    manual_it, manual_t, manual_e = iter_series(h=do_handle_manual_stored, ontology=ontology, m_name=MODEL_TO_TEST)
     g, p, e = calc(manual_it=manual_it, ontology=ontology)
     do_eval(gold_results=g, predict_results=p, entries_total=e, ontology=ontology)
@@ -0,0 +1,171 @@
+from collections import Counter
+from os.path import join
+
+import argparse
+import numpy as np
+from mmi_kit.service_os import OsService
+from source_iter.service_csv import CsvService
+from tqdm import tqdm
+
+from core.service_spreadsheet import SpreadsheetService
+from core.utils import iter_to_iterator, iter_join_by_key
+from issue87_2_series_classification_llm import do_parse_llm_columns
+from issue87_2_series_classification_manual import do_handle_manual_stored, load_gold
+from issue87_4_evaluation import iter_series, do_eval, show_log, show_unmatched, JOIN_KEY, JOIN_PARAMS
+from presets.issue87.label_store import LabelStore, LabelColumn, MISSING_CODE
+from presets.issue87.utils import MODEL_INPUT_FUNC, ISSUE_87_DIR, MODEL_RESULTS
+
+
+def get_gold(ontology, m_name, cache, rebuild=False, manifest_only=False, **handler_args):
+    """ Gold (manual) annotation is shared across all the models with the same ontology and metadata.
+        Labels are memory-mapped from the gold annotation store (see `load_gold`),
+        so that only the index of the series is kept in memory.
+    """
+    inputs = MODEL_INPUT_FUNC(m_name)
+    metadata = inputs["collection"]["metadata"]
+    key = (ontology.Name, metadata)
+
+    if key not in cache:
+        # Gold store is (re)built once it is missing or outdated, counters are replayed from it.
+        manual_it, manual_t, manual_e = iter_series(do_handle_manual_stored, ontology=ontology, m_name=m_name,
+                                                    force_params_dict=JOIN_PARAMS, rebuild=rebuild,
+                                                    manifest_only=manifest_only, **handler_args)
+        gold = load_gold(metadata=metadata, ontology=ontology, manifest_only=manifest_only)
+
+        # Gold lines are replaced by their row indices within the store.
+        uids = [{JOIN_KEY: line[JOIN_KEY], "row": gold.row(line[JOIN_KEY])}
+                for line in tqdm(iter_to_iterator(manual_it), desc=f"Gold [{ontology.Name}]")]
+        cache[key] = (gold, uids)
+
+        print("=============")
+        print(f"GOLD ERROR SUMMARY [{ontology.Name}]")
+        print("=============")
+        for k in manual_t.keys():
+            print(f"Collection: {k}")
+            show_log(total=manual_t[k], errors=manual_e.get(k, Counter()))
+
+    return cache[key]
+
+
+def iter_predict_lines(m_name, ontology, ctr_errors, ctr_total):
+    """ Predicted lines, parsed column-wise from the LLM responses.
+    """
+    for p in MODEL_INPUT_FUNC(m_name).values():
+        columns = do_parse_llm_columns(**p | {"ontology": ontology, "ctr_errors": ctr_errors, "ctr_total": ctr_total,
+                                              "force_params_dict": JOIN_PARAMS})
+        lengths = set(len(labels) for labels in columns.values())
+        assert (len(lengths) <= 1), f"Parsed columns differ in length: {lengths}"
+        rows_count = lengths.pop() if len(lengths) > 0 else 0
+        for i in range(rows_count):
+            yield {field: labels[i] for field, labels in columns.items()}
+
+
+def eval_model(m_name, gold, bootstrap=None, seed=None):
+
+    ontology = MODEL_RESULTS[m_name]["ontology"]
+    gold_annotation, gold_uids = gold
+
+    llm_e = Counter()
+    llm_t = Counter()
+
+    # Gold annotation is indexed, while predictions are streamed.
+    unmatched = {}
+    pairs_it = iter_join_by_key(left_it=gold_uids, right_it=iter_predict_lines(m_name, ontology, llm_e, llm_t),
+                                key=JOIN_KEY, build="left", unmatched=unmatched)
+
+    # Predictions are aligned with the joined rows of the gold annotation.
+    rows = []
+    predict_columns = {k: [] for k in ontology.iter_ontology_keys()}
+    for gold_uid, predict_line in pairs_it:
+        rows.append(gold_uid["row"])
+        for k, labels in predict_columns.items():
+            labels.append(predict_line.get(k, None))
+
+    rows = np.array(rows, dtype=np.int64)
+    gold_columns = gold_annotation.columns
+    predict_columns = LabelStore(store_dir=None, ontology=ontology).encode(predict_columns)
+
+    gold_results = dict()
+    predict_results = dict()
+    for k in ontology.iter_ontology_keys():
+        g = gold_columns[k]
+        p = predict_columns[k]
+        g_codes = g.codes[rows]
+        # For such parameters which values are defined both in gold annotation and predict annotation.
+        mask = (p.codes != MISSING_CODE) & (g_codes != MISSING_CODE)
+        if ontology.UNKN_VALUE in g.classes:
+            mask &= g_codes != g.classes.index(ontology.UNKN_VALUE)
+        gold_results[k] = LabelColumn(codes=g_codes[mask], classes=g.classes)
+        predict_results[k] = LabelColumn(codes=p.codes[mask], classes=p.classes)
+
+    print("=============")
+    print(f"MODEL: {m_name}")
+    print("=============")
+    show_log(total=llm_t, errors=llm_e)
+    show_unmatched(unmatched)
+    print("----------")
+
+    entries_total = len(rows)
+    res_eval, res_missed, res_ci = do_eval(gold_results=gold_results, predict_results=predict_results,
+                                           entries_total=entries_total, ontology=ontology,
+                                           show_amount=False, show_amount_p=False, bootstrap=bootstrap, seed=seed)
+
+    return res_eval, res_missed, res_ci, entries_total
+
+
+if __name__ == '__main__':
+    """ Evaluation of the multiple models within a single run,
+        in which gold annotation is calculated once per ontology and shared across models.
+    """
+
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('--models', dest='models', type=str, nargs="*", default=list(MODEL_RESULTS.keys()),
+                        choices=list(MODEL_RESULTS.keys()))
+    parser.add_argument('--workers', dest='workers', type=int, default=None)
+    parser.add_argument('--chunksize', dest='chunksize', type=int, default=16)
+    parser.add_argument('--rebuild-gold', dest='rebuild_gold', action='store_true', default=False,
+                        help="Recompute the gold annotation instead of loading it from the store.")
+    parser.add_argument('--bootstrap', dest='bootstrap', type=int, default=None,
+                        help="Amount of resamples for the confidence intervals.")
+    parser.add_argument('--seed', dest='seed', type=int, default=None)
+    parser.add_argument('--manifest-only', dest='manifest_only', action='store_true', default=False,
+                        help="Compute the gold annotation from the collection manifest (DICOM data as a fallback).")
+    parser.add_argument('--output', dest='output', type=str, default=join(ISSUE_87_DIR, "evaluation-models.csv"))
+
+    args = parser.parse_args()
+
+    gold_cache = {}
+    table = []
+    for m_name in args.models:
+        gold = get_gold(ontology=MODEL_RESULTS[m_name]["ontology"], m_name=m_name, cache=gold_cache,
+                        workers=args.workers, chunksize=args.chunksize, rebuild=args.rebuild_gold,
+                        manifest_only=args.manifest_only)
+        table.append((m_name, *eval_model(m_name=m_name, gold=gold,
+                                          bootstrap=args.bootstrap, seed=args.seed)))
+
+    # Consolidated header across ontologies of the models.
+    fields = []
+    for m_name in args.models:
+        fields += [f for f in MODEL_RESULTS[m_name]["ontology"].get_header() if f not in fields]
+
+    header = ["model", "ontology", "entries"] + fields + [f"{f}:missed" for f in fields]
+    if args.bootstrap is not None:
+        header += [f"{f}:ci" for f in fields]
+
+    rows = []
+    for m_name, res_eval, res_missed, res_ci, entries_total in table:
+        row = [m_name, MODEL_RESULTS[m_name]["ontology"].Name, entries_total] + \
+              [round(res_eval.get(f, -1), 2) for f in fields] + \
+              [round(res_missed.get(f, -1), 2) for f in fields]
+        if args.bootstrap is not None:
+            row += ["%.2f-%.2f" % res_ci[f] if f in res_ci else -1 for f in fields]
+        rows.append(row)
+
+    print("RESULTS")
+    print("-------")
+    for row in [header] + rows:
+        print(SpreadsheetService.format_line(row))
+
+    OsService.create_dir_if_not_exists(args.output, is_dir=False)
+    CsvService.write(target=args.output, header=header, data2col_func=lambda data: data, data_it=rows)
@@ -6,9 +6,10 @@ from mmi_kit.service_os import OsService
 from tqdm import tqdm
 
 from core.service_txt import TextService
-from core.utils import iter_to_iterator
+from core.utils import iter_to_iterator, iter_join_by_key
 from issue87_2_series_classification_llm import do_handle_llm_responses
-from issue87_2_series_classification_manual import do_handle_manual
+from issue87_2_series_classification_manual import do_handle_manual_stored
+from issue87_4_evaluation import show_unmatched, JOIN_KEY, JOIN_PARAMS
 from presets.issue87.utils import MODEL_INPUT_FUNC, MODEL_TO_TEST, MODEL_ONTOLOGY_FUNC, ISSUE_87_DIR
 
 
@@ -70,12 +71,17 @@ if __name__ == '__main__':
     manual_meta = ["Study Description", "Series Description"]
 
     manual_it, manual_t, manual_e = iter_series(
-        do_handle_manual, ontology=ontology,
-        force_params_dict={p: f"_{p}" for p in manual_meta})
+        do_handle_manual_stored, ontology=ontology,
+        force_params_dict={p: f"_{p}" for p in manual_meta} | JOIN_PARAMS)
 
     llm_it, llm_t, llm_e = iter_series(
         do_handle_llm_responses, ontology=ontology,
-        force_params_dict={p: f"_{p}" for p in ontology.get_header()})
+        force_params_dict={p: f"_{p}" for p in ontology.get_header()} | JOIN_PARAMS)
+
+    # Predictions are indexed, while gold annotation is streamed.
+    unmatched = {}
+    pairs_it = iter_join_by_key(left_it=iter_to_iterator(manual_it), right_it=iter_to_iterator(llm_it),
+                                key=JOIN_KEY, build="right", unmatched=unmatched)
 
     # Actual results.
     gold_results = dict()
@@ -86,7 +92,7 @@ if __name__ == '__main__':
     predict_meta = dict()
 
     entries_total = 0
-    for gold_line, predict_line in tqdm(zip(iter_to_iterator(manual_it), iter_to_iterator(llm_it)), desc=MODEL_TO_TEST):
+    for gold_line, predict_line in tqdm(pairs_it, desc=MODEL_TO_TEST):
 
         # For such parameters which values are defined both in gold annotation and predict annotation.
         known_gold_params = [k for k in ontology.iter_ontology_keys() if gold_line[k] != ontology.UNKN_VALUE]
@@ -100,6 +106,8 @@ if __name__ == '__main__':
 
         entries_total += 1
 
+    show_unmatched(unmatched)
+
     # Setup target dir.
     target_dir = join(ISSUE_87_DIR, ontology.Name)
     OsService.create_dir_if_not_exists(target_dir, is_dir=True)
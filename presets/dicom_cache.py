@@ -0,0 +1,79 @@
+import hashlib
+import os
+import pickle
+import threading
+from os.path import join, dirname, abspath, relpath
+
+from mmi_kit.service_os import OsService
+
+
+class DicomSeriesCache(object):
+    """ Persistent on-disk cache of the categorized DICOM metadata of a series, merged across its files.
+        Entries are keyed by the series directory and become invalid once any of its files
+        is added, removed or modified (by mtime/size).
+    """
+
+    def __init__(self, cache_dir, version=None):
+        self.__cache_dir = cache_dir
+        # Any data that affects the cached content (categories, casting, etc.).
+        self.__version = repr(version)
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def version(self):
+        return self.__version
+
+    def __entry_path(self, series_dir, variant):
+        key = hashlib.sha1(f"{abspath(series_dir)}:{variant!r}".encode("utf-8")).hexdigest()
+        return join(self.__cache_dir, key[:2], f"{key}.pkl")
+
+    def fingerprint(self, series_dir, filepaths=None):
+        """ filepaths: optional already listed files of the series.
+        """
+        h = hashlib.sha1(self.__version.encode("utf-8"))
+        filepaths = OsService.iter_dir_filepaths(series_dir) if filepaths is None else filepaths
+        for filepath in sorted(filepaths):
+            st = os.stat(filepath)
+            h.update(f"{relpath(filepath, series_dir)}:{st.st_mtime_ns}:{st.st_size}\n".encode("utf-8"))
+        return h.hexdigest()
+
+    @staticmethod
+    def __load(entry_path):
+        if not os.path.exists(entry_path):
+            return None
+        try:
+            with open(entry_path, "rb") as f:
+                return pickle.load(f)
+        except (pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            # Treat broken entries as missing ones.
+            return None
+
+    @staticmethod
+    def __save(entry_path, entry):
+        os.makedirs(dirname(entry_path), exist_ok=True)
+        # Write via temporary file to avoid partially written entries (also across threads).
+        tmp_path = f"{entry_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, entry_path)
+
+    def get(self, series_dir, compute_func, variant=None, filepaths=None):
+        """ Returns cached data of the series or computes (and caches) it via `compute_func(series_dir)`.
+            variant: optional parameters of the computation (e.g. sampling), each variant is cached separately.
+            filepaths: optional already listed files of the series, so that the directory is not listed again.
+        """
+        assert (callable(compute_func))
+
+        entry_path = self.__entry_path(series_dir, variant=variant)
+        fingerprint = self.fingerprint(series_dir, filepaths=filepaths)
+
+        entry = self.__load(entry_path)
+        if entry is not None and entry["fingerprint"] == fingerprint:
+            self.hits += 1
+            return entry["data"]
+
+        self.misses += 1
+        data = compute_func(series_dir)
+        self.__save(entry_path, {"series_dir": series_dir, "fingerprint": fingerprint, "data": data})
+        return data
@@ -1,5 +1,8 @@
 import math
+from functools import lru_cache
 
+import pydicom
+from pydicom.datadict import DicomDictionary
 from mmi_kit.service_dict import DictionaryService
 from mmi_kit.service_pydicom import PyDicomService
 
@@ -7,12 +10,40 @@ from mmi_kit.service_pydicom import PyDicomService
 class DicomFilters(object):
 
     @staticmethod
-    def filter_categorized(filepath, categories=None, categories_map=None, **kwargs):
+    @lru_cache(maxsize=None)
+    def __name2tag():
+        # Element name (as provided in metadata dictionaries) to tag.
+        return {entry[2]: tag for tag, entry in DicomDictionary.items()}
+
+    @staticmethod
+    def __get_header_dict(filepath, names):
+        """ Reading only the header part of the DICOM file (everything before pixel data)
+            and decoding only those elements which names are allowed.
+        """
+        name2tag = DicomFilters.__name2tag()
+        specific_tags = [name2tag[n] for n in names if n in name2tag]
+        ds = pydicom.dcmread(filepath, stop_before_pixels=True, defer_size="1 KB", specific_tags=specific_tags)
+        return {elem.name: elem.value for elem in ds if elem.name in names}
+
+    @staticmethod
+    def filter_categorized(filepath, categories=None, categories_map=None, header_only=False, **kwargs):
+        """ header_only: bool
+                reads the file up to the pixel data and decodes only elements that
+                are related to the requested categories.
+        """
         assert (isinstance(categories, set) or categories is None)
         assert (isinstance(categories_map, dict) or categories_map is None)
+        assert (not header_only or categories_map is not None or categories is not None)
+
+        if header_only:
+            # Allow-list of the element names to be decoded.
+            names = frozenset(k for k, cat in categories_map.items() if categories is None or cat in categories) \
+                if categories_map is not None else frozenset(categories)
+            m_data_dict = DicomFilters.__get_header_dict(filepath, names=names)
+        else:
+            m_data_dict = PyDicomService.get_metadata_dict(filepath, **kwargs)
 
         patient_data = {}
-        m_data_dict = PyDicomService.get_metadata_dict(filepath, **kwargs)
         for k, v in m_data_dict.items():
 
             if categories_map is not None and k not in categories_map:
@@ -30,4 +61,3 @@ class DicomFilters(object):
             patient_data[cat] = type_casting(v)
 
         return patient_data
-
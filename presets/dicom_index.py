@@ -0,0 +1,87 @@
+import json
+import os
+import pickle
+import sqlite3
+import threading
+from os.path import dirname, abspath
+
+
+class DicomSeriesIndex(object):
+    """ SQLite index of the series: Series UID to the resolved directory, list of files and the categorized
+        DICOM data, so that series are looked up by key instead of walking their directories.
+        Entries are valid for the particular version (categories, sampling, etc.).
+        NOTE: changes of DICOM files are not tracked, the index has to be rebuilt explicitly after updating them.
+    """
+
+    def __init__(self, filepath, version=None):
+        self.__filepath = filepath
+        self.__version = repr(version)
+        self.__local = threading.local()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def filepath(self):
+        return self.__filepath
+
+    @property
+    def version(self):
+        return self.__version
+
+    def exists(self):
+        return os.path.exists(self.__filepath)
+
+    def __connection(self):
+        # Connections could not be shared across threads and processes.
+        local = self.__local
+        if getattr(local, "pid", None) != os.getpid():
+            os.makedirs(dirname(abspath(self.__filepath)), exist_ok=True)
+            local.connection = sqlite3.connect(self.__filepath)
+            local.connection.execute("PRAGMA journal_mode=WAL")
+            local.connection.execute("CREATE TABLE IF NOT EXISTS series (uid TEXT PRIMARY KEY, version TEXT, "
+                                     "collection TEXT, series_dir TEXT, files TEXT, data BLOB)")
+            local.pid = os.getpid()
+        return local.connection
+
+    def keys(self):
+        """ Series UIDs which are indexed for the actual version.
+        """
+        rows = self.__connection().execute("SELECT uid FROM series WHERE version = ?", (self.__version,))
+        return set(uid for uid, in rows)
+
+    def put_many(self, entries):
+        """ entries: list of dict
+                with the `uid`, `collection`, `series_dir`, `files` and `data` of the series.
+        """
+        connection = self.__connection()
+        with connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO series (uid, version, collection, series_dir, files, data) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(e["uid"], self.__version, e["collection"], e["series_dir"], json.dumps(e["files"]),
+                  pickle.dumps(e["data"], protocol=pickle.HIGHEST_PROTOCOL)) for e in entries])
+
+    def clear(self):
+        connection = self.__connection()
+        with connection:
+            connection.execute("DELETE FROM series")
+
+    def get(self, uid):
+        """ Returns the entry of the series or None if it is not indexed for the actual version.
+        """
+        if not self.exists():
+            self.misses += 1
+            return None
+
+        row = self.__connection().execute(
+            "SELECT collection, series_dir, files, data FROM series WHERE uid = ? AND version = ?",
+            (uid, self.__version)).fetchone()
+
+        if row is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        collection, series_dir, files, data = row
+        return {"uid": uid, "collection": collection, "series_dir": series_dir, "files": json.loads(files),
+                "data": pickle.loads(data)}
@@ -0,0 +1,39 @@
+class SeriesSampling(object):
+    """ Strategies for picking the representative slices (files) of the series.
+    """
+
+    # Every file of the series (in the order of the directory listing).
+    ALL = "all"
+    FIRST = "first"
+    LAST = "last"
+    # N evenly spaced files, including the first and the last one.
+    EVEN = "even"
+    # Files are visited one by one until every series-level category is populated.
+    COMPLETE = "complete"
+
+    MODES = [ALL, FIRST, LAST, EVEN, COMPLETE]
+
+    @staticmethod
+    def select(filepaths_it, mode, n=3):
+        assert (mode in SeriesSampling.MODES)
+        assert (isinstance(n, int) and n > 0)
+
+        if mode == SeriesSampling.ALL:
+            return filepaths_it
+
+        # Rely on the file names for the slices order.
+        filepaths = sorted(filepaths_it)
+
+        if mode == SeriesSampling.FIRST:
+            return filepaths[:1]
+        if mode == SeriesSampling.LAST:
+            return filepaths[-1:]
+        if mode == SeriesSampling.EVEN:
+            if len(filepaths) <= n:
+                return filepaths
+            if n == 1:
+                return [filepaths[len(filepaths) // 2]]
+            step = (len(filepaths) - 1) / (n - 1)
+            return [filepaths[round(i * step)] for i in range(n)]
+
+        return filepaths
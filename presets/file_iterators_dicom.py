@@ -1,3 +1,7 @@
+import json
+import os
+from os.path import abspath, exists, dirname
+
 from mmi_kit.service_os import OsService
 
 
@@ -8,10 +12,45 @@ class ServiceBase(object):
 class TCGA_LIHC_Service(ServiceBase):
 
     @staticmethod
-    def metadata_search(dir_path, template="metadata.csv"):
+    def __read_index(index_filepath):
+        if not exists(index_filepath):
+            return {}
+        with open(index_filepath) as f:
+            return json.load(f)
+
+    @staticmethod
+    def __write_index(index_filepath, index):
+        os.makedirs(dirname(index_filepath), exist_ok=True)
+        tmp_filepath = f"{index_filepath}.{os.getpid()}.tmp"
+        with open(tmp_filepath, "w") as f:
+            json.dump(index, f, indent=2)
+        os.replace(tmp_filepath, index_filepath)
+
+    @staticmethod
+    def metadata_search(dir_path, template="metadata.csv", index_filepath=None):
+        """ index_filepath: str or None
+                optional JSON file that persists the found files, so that the dataset tree
+                is not walked again as long as the found file exists.
+        """
+        key = f"{abspath(dir_path)}:{template}"
+
+        if index_filepath is not None:
+            filepath = TCGA_LIHC_Service.__read_index(index_filepath).get(key, None)
+            if filepath is not None and exists(filepath):
+                return filepath
+
         data_it = OsService.iter_dir_filepaths(
             dir_path, filter_full_path=lambda filepath: template in filepath)
-        filepath = next(data_it)
+        filepath = next(data_it, None)
+
+        if filepath is None:
+            raise FileNotFoundError(f"`{template}` was not found in `{dir_path}`")
+
+        if index_filepath is not None:
+            index = TCGA_LIHC_Service.__read_index(index_filepath)
+            index[key] = filepath
+            TCGA_LIHC_Service.__write_index(index_filepath, index)
+
         return filepath
 
 
@@ -19,4 +58,4 @@ class CPTAC_CCRCC_Service(TCGA_LIHC_Service):
     """ This iterator aimed at grouped iteration of the
         patients-related series iterations.
     """
-    pass
\ No newline at end of file
+    pass
@@ -0,0 +1,87 @@
+import os
+from os.path import abspath
+
+from presets.issue87.label_store import LabelStore, MISSING_CODE
+
+
+class GoldAnnotation(object):
+    """ Gold labels of the collection series keyed by Series UID.
+    """
+
+    def __init__(self, uids, collections, columns):
+        """ columns: dict
+                field name to the `LabelColumn` of the rows.
+        """
+        assert (isinstance(columns, dict))
+        self.uids = uids
+        self.collections = collections
+        self.columns = columns
+        self.__index = {uid: i for i, uid in enumerate(uids)}
+
+    def __len__(self):
+        return len(self.uids)
+
+    def __contains__(self, series_uid):
+        return series_uid in self.__index
+
+    def row(self, series_uid):
+        return self.__index[series_uid]
+
+    def get(self, series_uid):
+        """ Returns collection name and the labels of all the fields of the series.
+        """
+        i = self.__index[series_uid]
+        labels = {}
+        for field, column in self.columns.items():
+            code = column.codes[i]
+            labels[field] = column.classes[code] if code != MISSING_CODE else None
+        return self.collections[i], labels
+
+
+class GoldStore(object):
+    """ Materialized gold (manual) annotation, which is kept in the `LabelStore`:
+        per field we keep the memory-mapped codes of the rows, rows are keyed by Series UID.
+        The stored annotation is valid for the particular meta (see `meta`), i.e. ontology name,
+        fingerprint of its manual rules and the collection metadata file.
+        NOTE: changes of DICOM files are not tracked, the store has to be rebuilt explicitly after updating them.
+    """
+
+    VERSION = 2
+
+    ENTRY = "manual"
+
+    def __init__(self, store_dir, ontology):
+        self.__store = LabelStore(store_dir=store_dir, ontology=ontology)
+
+    @staticmethod
+    def meta(ontology, metadata, version=None):
+        """ version: any data that affects the DICOM parameters (categories, sampling, etc.).
+        """
+        st = os.stat(metadata)
+        return {
+            "format": GoldStore.VERSION,
+            "ontology": ontology.Name,
+            "rules": ontology.get_manual_parsers_compiled().fingerprint(),
+            "metadata": f"{abspath(metadata)}:{st.st_mtime_ns}:{st.st_size}",
+            "version": repr(version),
+        }
+
+    def save(self, meta, uids, collections, columns):
+        """ columns: dict
+                field name to the list of labels of the rows.
+        """
+        assert (isinstance(meta, dict))
+        assert (all(len(labels) == len(uids) for labels in columns.values()))
+        assert (len(collections) == len(uids))
+        self.__store.save(self.ENTRY, columns=columns, version=meta,
+                          attrs={"uids": list(uids), "collections": list(collections)})
+
+    def load(self, meta):
+        """ Returns `GoldAnnotation` or None in the case of the missing or outdated store.
+        """
+        if not self.__store.contains(self.ENTRY, version=meta):
+            return None
+
+        attrs = self.__store.load_attrs(self.ENTRY)
+        return GoldAnnotation(uids=attrs["uids"], collections=attrs["collections"],
+                              columns=self.__store.load(self.ENTRY))
@@ -0,0 +1,116 @@
+import json
+import os
+import shutil
+import threading
+from collections import namedtuple
+from os.path import join, exists
+
+import numpy as np
+
+from presets.issue87.schemas.base import BaseOntology
+
+
+# Code of the absent label (e.g. the field is not presented in response or the row is unmatched).
+MISSING_CODE = 255
+
+# Codes of the field alongside with the classes they refer to.
+LabelColumn = namedtuple("LabelColumn", ["codes", "classes"])
+
+
+class LabelStore(object):
+    """ Compact storage of the ontology fields labels: every field is a memory-mapped array of uint8 codes
+        against the field labels `get_ontology_labels(keep_unknown=True)` followed by the unexpected ones.
+        Entries are read-only mapped, so that the pages are shared across processes.
+    """
+
+    def __init__(self, store_dir, ontology):
+        assert (isinstance(ontology, BaseOntology))
+        self.__store_dir = store_dir
+        self.__ontology = ontology
+
+    def __entry_dir(self, name):
+        return join(self.__store_dir, name)
+
+    def __base_classes(self, field):
+        labels = self.__ontology.get_ontology_labels(key=field, keep_unknown=True)
+        return labels if labels is not None else []
+
+    def __read_meta(self, name):
+        with open(join(self.__entry_dir(name), "meta.json"), "r") as f:
+            return json.load(f)
+
+    def contains(self, name, version=None):
+        """ Whether the entry exists and it was saved for the given version.
+        """
+        if not exists(join(self.__entry_dir(name), "meta.json")):
+            return False
+        return version is None or self.__read_meta(name)["version"] == version
+
+    def encode(self, columns):
+        """ Encodes labels into the in-memory `LabelColumn` per field.
+            columns: dict
+                field name to the sequence of labels, None for the absent ones.
+        """
+        assert (isinstance(columns, dict))
+
+        rows = None
+        encoded = {}
+        for field, labels in columns.items():
+            index = {c: j for j, c in enumerate(self.__base_classes(field))}
+            codes = np.fromiter((index.setdefault(v, len(index)) if v is not None else MISSING_CODE for v in labels),
+                                dtype=np.int64)
+            assert (len(index) < MISSING_CODE), f"Too many labels for `{field}`"
+            assert (rows is None or rows == len(codes))
+            rows = len(codes)
+            encoded[field] = LabelColumn(codes=codes.astype(np.uint8), classes=list(index.keys()))
+
+        return encoded
+
+    def save(self, name, columns, version=None, attrs=None):
+        """ columns: dict
+                field name to the sequence of labels, None for the absent ones.
+            version: JSON-serializable data the entry is valid for (see `contains`).
+            attrs: JSON-serializable data kept alongside with the entry (see `load_attrs`).
+        """
+        encoded = self.encode(columns)
+
+        fields = {}
+        rows = 0
+        # Entry is written into the temporary directory and then swapped,
+        # so that the processes that have the previous files mapped are not affected.
+        entry_dir = self.__entry_dir(name)
+        tmp_dir = f"{entry_dir}.{os.getpid()}.{threading.get_ident()}.tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        for i, (field, column) in enumerate(encoded.items()):
+            column.codes.tofile(join(tmp_dir, f"{i}.u8"))
+            fields[field] = {"file": f"{i}.u8", "classes": column.classes}
+            rows = len(column.codes)
+
+        with open(join(tmp_dir, "meta.json"), "w") as f:
+            json.dump({"rows": rows, "fields": fields, "version": version, "attrs": attrs}, f)
+
+        old_dir = None
+        if exists(entry_dir):
+            old_dir = f"{tmp_dir}.old"
+            os.replace(entry_dir, old_dir)
+        os.replace(tmp_dir, entry_dir)
+        if old_dir is not None:
+            shutil.rmtree(old_dir, ignore_errors=True)
+
+    def load_attrs(self, name):
+        return self.__read_meta(name)["attrs"]
+
+    def load(self, name):
+        """ Returns dictionary of the `LabelColumn` per field.
+        """
+        entry_dir = self.__entry_dir(name)
+        meta = self.__read_meta(name)
+
+        columns = {}
+        for field, info in meta["fields"].items():
+            codes = np.memmap(join(entry_dir, info["file"]), dtype=np.uint8, mode="r", shape=(meta["rows"],)) \
+                if meta["rows"] > 0 else np.zeros(0, dtype=np.uint8)
+            columns[field] = LabelColumn(codes=codes, classes=info["classes"])
+
+        return columns
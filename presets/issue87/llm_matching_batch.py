@@ -0,0 +1,162 @@
+import numpy as np
+
+from presets.issue87.llm_matching_tree import do_pattern_tree_matching
+from presets.issue87.schemas.rules import ResponseContains
+
+
+def __seek_pattern(texts, ordered_patterns, text_from):
+    """ Column-wise analogue of the `seek_pattern` with `ind_aft` mode for the texts parts starting from `text_from`.
+    """
+    starts = text_from.tolist()
+    ind_aft = [-1] * len(texts)
+    pending = range(len(texts))
+    for p in ordered_patterns:
+        # Only the rows without the earlier pattern are searched further.
+        rest = []
+        for i in pending:
+            pos = texts[i].find(p, starts[i])
+            if pos >= 0:
+                ind_aft[i] = pos - starts[i] + len(p)
+            else:
+                rest.append(i)
+        pending = rest
+    return np.array(ind_aft, dtype=np.int64)
+
+
+def batch_while_not_true(texts, params, handle=None):
+    """ Column-wise `do_while_not_true` for the lowercased texts.
+        Returns the object array of labels, None for the non-terminated rows.
+    """
+    assert (isinstance(params, list))
+
+    labels = np.full(len(texts), None, dtype=object)
+    undecided = np.ones(len(texts), dtype=bool)
+    for f, r in params:
+        if isinstance(f, ResponseContains):
+            mask = np.fromiter((f.term in t for t in texts), dtype=bool, count=len(texts))
+        else:
+            mask = np.fromiter((bool(f(t)) for t in texts), dtype=bool, count=len(texts))
+        mask &= undecided
+        labels[mask] = r
+        undecided &= ~mask
+
+    if handle is not None:
+        for text in texts[undecided]:
+            handle(f"---\nNON TERMINATED STATE: \n{text}\n{params}")
+
+    return labels
+
+
+def batch_pattern_tree_matching(texts, tree, handle=None):
+    """ Column-wise `do_pattern_tree_matching` for the lowercased texts.
+        Rows are processed in groups that share the same state of the tree.
+        Returns the object array of labels, None for the non-terminated rows.
+    """
+    n = len(texts)
+    states = np.full(n, "__init__", dtype=object)
+    text_from = np.zeros(n, dtype=np.int64)
+    active = np.ones(n, dtype=bool)
+    labels = np.full(n, None, dtype=object)
+
+    while active.any():
+
+        for state in set(states[active]):
+
+            ind = np.where(active & (states == state))[0]
+
+            if state not in tree:
+                # Reached the terminal state (label).
+                labels[ind] = state
+                active[ind] = False
+                continue
+
+            params = tree[state]
+            handler_type = params[0]
+            tree_states = params[1:]
+            sub_texts = texts[ind]
+            sub_from = text_from[ind]
+
+            assert isinstance(handler_type, str), "The handler type is unknown!"
+
+            if handler_type == "if-else":
+                assert (len(tree_states) == 2)
+                if_true_patterns, if_true_state = tree_states[0]
+                ind_aft = __seek_pattern(sub_texts, if_true_patterns, sub_from)
+                found = ind_aft >= 0
+                states[ind[found]] = if_true_state
+                states[ind[~found]] = tree_states[-1]
+                text_from[ind] = sub_from + np.where(found, ind_aft, 0)
+                continue
+
+            if handler_type != "choice":
+                raise Exception(f"Handler type is not supported: `{handler_type}`")
+
+            found_count = np.zeros(len(ind), dtype=np.int64)
+            next_state = np.full(len(ind), None, dtype=object)
+            next_from = np.zeros(len(ind), dtype=np.int64)
+            for patterns_list, new_state in tree_states:
+
+                if patterns_list is None:
+                    # This is the exceptional case when we can't find anything else.
+                    ind_aft = np.where(found_count == 0, 0, -1)
+                else:
+                    ind_aft = __seek_pattern(sub_texts, patterns_list, sub_from)
+
+                found = ind_aft >= 0
+                first = found & (found_count == 0)
+                next_state[first] = new_state
+                next_from[first] = ind_aft[first]
+                found_count += found
+
+            # Non-terminated rows: either multiple choices or none of them.
+            stopped = found_count != 1
+            if handle is not None:
+                # Such rows are rare, so we rely on the per-text matching for logging.
+                for text in sub_texts[stopped]:
+                    do_pattern_tree_matching(str(text), tree, handle=handle)
+
+            active[ind[stopped]] = False
+            states[ind] = next_state
+            text_from[ind] = sub_from + next_from
+
+    return labels
+
+
+def batch_parse_llm_responses(lines, ontology, handlers=None, ctr_errors=None, ctr_total=None):
+    """ Parsing the whole columns of the LLM responses of every ontology field,
+        which results in the same labels as the per-line parsing within `handle_line`.
+        Returns the dictionary of the labels arrays per field.
+        NOTE: the API is column-shaped, however texts are still searched by `str.find` row by row:
+        numpy string operations over the fixed-width column turned out slower for the long responses.
+        The gain over the per-line parsing comes from sharing the states of the tree across the rows.
+    """
+    assert (isinstance(lines, list))
+
+    parsing_method_collection = {
+        "pattern_tree": batch_pattern_tree_matching,
+        "while_not_true": batch_while_not_true,
+    }
+
+    results = {}
+    for field_name, parsing_methods in ontology.iter_ontology_parsers(parser_type="llm"):
+
+        # Skip the fields that are not presented in the responses.
+        if len(lines) == 0 or field_name not in lines[0]:
+            continue
+
+        # Object array keeps the texts as they are: no padding to the longest one and no stripping of trailing NULs.
+        texts = np.empty(len(lines), dtype=object)
+        texts[:] = [line[field_name].lower() for line in lines]
+
+        for method_name, params in parsing_methods.items():
+            handle = handlers.get(field_name, None) if handlers is not None else None
+            labels = parsing_method_collection[method_name](texts, params, handle)
+            labels[np.equal(labels, None)] = ontology.UNKN_VALUE
+            results[field_name] = labels
+
+        if ctr_errors is not None:
+            ctr_errors[field_name] += int(np.sum(results[field_name] == ontology.UNKN_VALUE))
+        if ctr_total is not None:
+            ctr_total[field_name] += len(lines)
+
+    return results
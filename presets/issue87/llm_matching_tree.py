@@ -1,63 +1,108 @@
-from core.utils import seek_pattern
+def seek_pattern_from(text, ordered_patterns, text_from):
+    """ Analogue of the `seek_pattern` with `ind_aft` mode for the text part that starts from `text_from`,
+        which is sought within the whole text, i.e. without copying the text part.
+    """
+    for p in ordered_patterns:
+        ind = text.find(p, text_from)
+        if ind >= 0:
+            return ind - text_from + len(p)
+    return -1
 
 
-def do_pattern_tree_matching(text, tree, handle=None):
-    """ Parsing LLM responses using the tree-based pattern matching.
+class PatternTreeMatcher(object):
+    """ Tree-based pattern matching with the states of the tree prepared once per tree.
+        Every pattern is sought by a single `str.find` from the current offset, so that neither the text is sliced
+        per transition, nor the found pattern is sought twice (presence check and index).
     """
 
-    # Setup initial state.
-    state = "__init__"
+    def __init__(self, tree):
+        assert (isinstance(tree, dict))
+        self.tree = tree
+
+        # State -> (handler type, states).
+        self.__states = {state: (params[0], params[1:]) for state, params in tree.items()}
+
+    def match(self, text, handle=None):
+
+        # Setup initial state.
+        state = "__init__"
+        text_from = 0
+
+        while state in self.__states:
+
+            next_states = []
+
+            # Extracting parameters.
+            handler_type, states = self.__states[state]
+
+            assert isinstance(handler_type, str), "The handler type is unknown!"
 
-    while state in tree:
+            if handler_type == "if-else":
+                assert (len(states) == 2)
+                if_true_patterns, if_true_state = states[0]
+                ind_aft = seek_pattern_from(text, if_true_patterns, text_from)
+                next_states = [(if_true_state, ind_aft) if ind_aft >= 0 else (states[-1], 0)]
 
-        next_states = []
+            elif handler_type == "choice":
+                for patterns_list, new_state in states:
 
-        # Extracting parameters.
-        params = tree[state]
-        handler_type = params[0]
-        states = params[1:]
+                    if patterns_list is None and len(next_states) == 0:
+                        # This is the exceptional case when we can't find anything else.
+                        ind_aft = 0
+                    else:
+                        ind_aft = seek_pattern_from(text, patterns_list if patterns_list is not None else [], text_from)
 
-        assert isinstance(handler_type, str), "The handler type is unknown!"
+                    if not ind_aft >= 0:
+                        continue
+                    # Result is presented.
+                    next_states.append((new_state, ind_aft))
 
-        if handler_type == "if-else":
-            assert (len(states) == 2)
-            if_true_patterns, if_true_state = states[0]
-            ind_aft = seek_pattern(text, if_true_patterns, return_mode="ind_aft")
-            next_states = [(if_true_state, ind_aft) if ind_aft >= 0 else (states[-1], 0)]
+                    # Multiple choices terminate the matching, the rest is sought for the log only.
+                    if handle is None and len(next_states) > 1:
+                        break
+            else:
+                raise Exception(f"Handler type is not supported: `{handler_type}`")
 
-        elif handler_type == "choice":
-            for patterns_list, new_state in states:
+            if len(next_states) > 1:
+                if handle is not None:
+                    handle(f"---\nMULTIPLE CHOICES: `{next_states}`\n{text[text_from:]}")
+                state = None
+                break
 
-                if patterns_list is None and len(next_states) == 0:
-                    # This is the exceptional case when we can't find anything else.
-                    ind_aft = 0
-                else:
-                    ind_aft = seek_pattern(text, patterns_list if patterns_list is not None else [], return_mode="ind_aft")
+            if len(next_states) == 0:
+                if handle is not None:
+                    handle(f"---\nNON TERMINATED STATE: `{state}`\n{text[text_from:]}")
+                state = None
+                break
 
-                if not ind_aft >= 0:
-                    continue
-                # Result is presented.
-                next_states.append((new_state, ind_aft))
-        else:
-            raise Exception(f"Handler type is not supported: `{handler_type}`")
+            # OK, go further.
+            new_state, next_text_from = next_states[0]
+            state = new_state
 
-        if len(next_states) > 1:
-            if handle is not None:
-                handle(f"---\nMULTIPLE CHOICES: `{next_states}`\n{text}")
-            state = None
-            break
+            # Skip text part before.
+            text_from += next_text_from
 
-        if len(next_states) == 0:
-            if handle is not None:
-                handle(f"---\nNON TERMINATED STATE: `{state}`\n{text}")
-            state = None
-            break
+        return state
 
-        # OK, go further.
-        new_state, next_text_from = next_states[0]
-        state = new_state
 
-        # Remove text part before.
-        text = text[next_text_from:]
+# Compiled matchers per tree.
+__MATCHERS = {}
 
-    return state
+
+def do_pattern_tree_matching(text, tree, handle=None):
+    """ Parsing LLM responses using the tree-based pattern matching.
+    """
+    matcher = __MATCHERS.get(id(tree), None)
+
+    # Trees are expected to be persistent, however we double-check the identity.
+    if matcher is None or matcher.tree is not tree:
+        matcher = PatternTreeMatcher(tree)
+        __MATCHERS[id(tree)] = matcher
+
+    return matcher.match(text, handle=handle)
+
+
+def pattern_tree_cache_clear():
+    """ Drops the compiled matchers (e.g. for the cold measurements).
+    """
+    __MATCHERS.clear()
@@ -1,3 +1,8 @@
+import hashlib
+
+from presets.issue87.schemas.rules import ManualParsersCompiled, rules_categories
+
+
 class BaseOntology(object):
 
     UNKN_VALUE = "?"
@@ -5,6 +10,13 @@ class BaseOntology(object):
     def __init__(self, ontology_dict):
         assert (isinstance(ontology_dict, dict))
         self.__ontology_dict = ontology_dict
+        self.__manual_compiled = None
+        self.__dicom_categories = {}
+
+    def __reduce__(self):
+        # Parsers are defined at the class level and contain lambdas,
+        # so we recreate instance instead of pickling its content (utilized in multiprocessing).
+        return self.__class__, ()
 
     @property
     def Name(self):
@@ -20,6 +32,35 @@ class BaseOntology(object):
         for k, v in self.__ontology_dict.items():
             yield k, v[parser_type]
 
+    def parsers_fingerprint(self, parser_type):
+        """ Digest of the parsers of the particular type, which changes once any of them is modified.
+        """
+        parsers = list(self.iter_ontology_parsers(parser_type=parser_type))
+        return hashlib.sha1(repr(parsers).encode("utf-8")).hexdigest()
+
+    def get_dicom_categories(self, parser_type):
+        """ DICOM categories required by the parsers of the particular type (`ALL_CATEGORIES` stands for any).
+            LLM parsers rely on the response text only, while manual parsers declare categories by their rules.
+        """
+        assert (isinstance(parser_type, str) and parser_type in ["llm", "manual"])
+
+        if parser_type not in self.__dicom_categories:
+            categories = frozenset()
+            if parser_type == "manual":
+                for _, parsing_methods in self.iter_ontology_parsers(parser_type=parser_type):
+                    for params in parsing_methods.values():
+                        categories |= rules_categories(params)
+            self.__dicom_categories[parser_type] = categories
+
+        return self.__dicom_categories[parser_type]
+
+    def get_manual_parsers_compiled(self):
+        """ Manual parsers of all the fields, compiled for the single-pass classification of the series.
+        """
+        if self.__manual_compiled is None:
+            self.__manual_compiled = ManualParsersCompiled(self.iter_ontology_parsers(parser_type="manual"))
+        return self.__manual_compiled
+
     def get_ontology_labels(self, key, keep_unknown=False):
         labels_ref = self.__ontology_dict[key].get("labels", None)
 
@@ -0,0 +1,104 @@
+from collections import Counter
+
+
+# Placeholder for the fields that are not presented in series.
+_MISSING = object()
+
+
+class FieldCondition(object):
+    """ Condition on the value of the series field.
+        optional: whether the field might be missed in series (otherwise KeyError is raised).
+    """
+
+    def __init__(self, field, value, optional=False):
+        self.field = field
+        self.value = value
+        self.optional = optional
+
+    def get(self, series):
+        return series.get(self.field, None) if self.optional else series[self.field]
+
+    def test(self, value):
+        raise Exception("NOT IMPLEMENTED.")
+
+    def __repr__(self):
+        return "{name}({field!r}, {value!r})".format(name=self.__class__.__name__, field=self.field, value=self.value)
+
+
+class Eq(FieldCondition):
+
+    def test(self, value):
+        return value == self.value
+
+
+class Ne(FieldCondition):
+
+    def test(self, value):
+        return value != self.value
+
+
+class SeriesFilter(object):
+    """ Declarative filter of the patient series by all the conditions (checked in the given order).
+        Filter is callable with the list of series, so it is compatible with the lambda-based mapping.
+    """
+
+    def __init__(self, *conditions):
+        assert (all(isinstance(c, FieldCondition) for c in conditions))
+        self.conditions = conditions
+
+    def test(self, series):
+        return all(c.test(c.get(series)) for c in self.conditions)
+
+    def __call__(self, p_series):
+        return [s for s in p_series if self.test(s)]
+
+    def __repr__(self):
+        return "SeriesFilter({})".format(", ".join(repr(c) for c in self.conditions))
+
+
+class SeriesMappingCompiled(object):
+    """ Single-pass counting of the patient series for all the filters of the mapping:
+        every series is reduced to the tuple of the values of the fields involved in filters,
+        and the filters are evaluated once per distinct tuple.
+    """
+
+    def __init__(self, mapping):
+        assert (isinstance(mapping, dict))
+        assert (all(isinstance(f, SeriesFilter) for f in mapping.values()))
+
+        self.__mapping = mapping
+        self.__fields = []
+        for series_filter in mapping.values():
+            for c in series_filter.conditions:
+                if c.field not in self.__fields:
+                    self.__fields.append(c.field)
+        self.__field_index = {f: i for i, f in enumerate(self.__fields)}
+        self.__matches = {}
+
+    def __key(self, series):
+        return tuple(series.get(f, _MISSING) for f in self.__fields)
+
+    def __test(self, series_filter, key):
+        for c in series_filter.conditions:
+            value = key[self.__field_index[c.field]]
+            if value is _MISSING:
+                if not c.optional:
+                    raise KeyError(c.field)
+                value = None
+            if not c.test(value):
+                return False
+        return True
+
+    def __matched(self, key):
+        if key not in self.__matches:
+            self.__matches[key] = [name for name, f in self.__mapping.items() if self.__test(f, key)]
+        return self.__matches[key]
+
+    def count(self, p_series):
+        """ Returns the amount of the series per every column of the mapping.
+        """
+        counts = dict.fromkeys(self.__mapping.keys(), 0)
+        for key, amount in Counter(self.__key(s) for s in p_series).items():
+            for name in self.__matched(key):
+                counts[name] += amount
+        return counts
@@ -0,0 +1,299 @@
+import hashlib
+from types import CodeType
+
+from presets.issue87.schemas.utils import manual_terms_set
+
+
+SERIES_DESCRIPTION = "Series-Description"
+# Marker of the rules that might access any of the categories.
+ALL_CATEGORIES = "*"
+
+
+class SeriesContext(object):
+    """ Normalized view onto the series data, which is computed once per series
+        and shared across all the rules of all the fields.
+    """
+
+    def __init__(self, line):
+        assert (isinstance(line, dict))
+        self.line = line
+        self.description = line.get(SERIES_DESCRIPTION, None)
+        self.description_lower = self.description.lower() if self.description is not None else None
+        self.__tokens = None
+        self.__substrings = {}
+        self.__nested = {}
+
+    @property
+    def tokens(self):
+        if self.__tokens is None:
+            # Memoized across the series with the same description.
+            self.__tokens = manual_terms_set(self.description_lower)
+        return self.__tokens
+
+    def has_substring(self, term):
+        """ Lowercased substring check, memoized across the rules of the series.
+        """
+        if term not in self.__substrings:
+            self.__substrings[term] = term in self.description_lower
+        return self.__substrings[term]
+
+    def nested_label(self, rules, compute_func):
+        key = id(rules)
+        if key not in self.__nested:
+            self.__nested[key] = compute_func(self)
+        return self.__nested[key]
+
+
+class Rule(object):
+    """ Declarative condition of the manual parsers.
+        Rule is callable with the series data, so it is compatible with `do_while_not_true`,
+        while `test` evaluates it against the shared `SeriesContext`.
+    """
+
+    # DICOM categories required by the rule.
+    categories = frozenset()
+
+    def __call__(self, line):
+        return self.test(SeriesContext(line))
+
+    def test(self, ctx):
+        raise Exception("NOT IMPLEMENTED.")
+
+    def _args(self):
+        return []
+
+    def __repr__(self):
+        return "{name}({args})".format(name=self.__class__.__name__, args=", ".join(repr(a) for a in self._args()))
+
+
+class Always(Rule):
+
+    def test(self, ctx):
+        return True
+
+
+class ModalityNotIn(Rule):
+    """ None of the modalities is mentioned in `Modality`.
+    """
+
+    categories = frozenset(["Modality"])
+
+    def __init__(self, *modalities):
+        self.modalities = modalities
+
+    def test(self, ctx):
+        return all(m not in ctx.line["Modality"] for m in self.modalities)
+
+    def _args(self):
+        return list(self.modalities)
+
+
+class DescriptionRule(Rule):
+    """ Rules that are applicable for the series with description.
+    """
+
+    categories = frozenset([SERIES_DESCRIPTION])
+
+    def __init__(self, term):
+        assert (isinstance(term, str))
+        self.term = term
+
+    def test(self, ctx):
+        return ctx.description is not None and self._test(ctx)
+
+    def _test(self, ctx):
+        raise Exception("NOT IMPLEMENTED.")
+
+    def _args(self):
+        return [self.term]
+
+
+class Term(DescriptionRule):
+    """ Term is among the tokens of the lowercased description (see `manual_terms_set`).
+    """
+
+    def _test(self, ctx):
+        return self.term in ctx.tokens
+
+
+class Substring(DescriptionRule):
+    """ Term is a substring of the lowercased description.
+    """
+
+    def _test(self, ctx):
+        return ctx.has_substring(self.term)
+
+
+class CaseSubstring(DescriptionRule):
+    """ Term is a substring of the original (case sensitive) description.
+    """
+
+    def _test(self, ctx):
+        return self.term in ctx.description
+
+
+class StartsWith(DescriptionRule):
+
+    def _test(self, ctx):
+        return ctx.description.startswith(self.term)
+
+
+class EndsWith(DescriptionRule):
+
+    def _test(self, ctx):
+        return ctx.description.endswith(self.term)
+
+
+class CompositeRule(Rule):
+
+    def __init__(self, *rules):
+        assert (all(isinstance(r, Rule) for r in rules))
+        self.rules = rules
+        self.categories = frozenset().union(*[r.categories for r in rules])
+
+    def _args(self):
+        return list(self.rules)
+
+
+class AllOf(CompositeRule):
+
+    def test(self, ctx):
+        return all(r.test(ctx) for r in self.rules)
+
+
+class AnyOf(CompositeRule):
+
+    def test(self, ctx):
+        return any(r.test(ctx) for r in self.rules)
+
+
+class Not(CompositeRule):
+
+    def __init__(self, rule):
+        super(Not, self).__init__(rule)
+
+    def test(self, ctx):
+        return not self.rules[0].test(ctx)
+
+
+class LabelIn(Rule):
+    """ Result of the nested `while_not_true` rules list is among the given labels.
+    """
+
+    def __init__(self, rules, labels):
+        assert (isinstance(rules, list))
+        assert (isinstance(labels, list))
+        self.rules = [(as_rule(f), r) for f, r in rules]
+        self.labels = labels
+        self.categories = rules_categories(self.rules)
+
+    def test(self, ctx):
+        return ctx.nested_label(self.rules, lambda c: while_not_true_compiled(c, self.rules)) in self.labels
+
+    def _args(self):
+        return [self.rules, self.labels]
+
+
+class Func(Rule):
+    """ Wrapper for the arbitrary callable conditions.
+        categories: categories accessed by the callable, all of them are assumed by default.
+    """
+
+    def __init__(self, func, categories=None):
+        assert (callable(func))
+        self.func = func
+        self.categories = frozenset(categories) if categories is not None else frozenset([ALL_CATEGORIES])
+
+    def test(self, ctx):
+        return self.func(ctx.line)
+
+    @staticmethod
+    def __code_digest(code, h):
+        h.update(code.co_code)
+        h.update(repr(code.co_names).encode("utf-8"))
+        for const in code.co_consts:
+            if isinstance(const, CodeType):
+                Func.__code_digest(const, h)
+            else:
+                h.update(repr(const).encode("utf-8"))
+        return h
+
+    def _args(self):
+        # Describing the callable by its code, so that the representation does not depend on the object address.
+        code = getattr(self.func, "__code__", None)
+        if code is None:
+            return [getattr(self.func, "__qualname__", type(self.func).__qualname__)]
+        return [f"{self.func.__qualname__}:{Func.__code_digest(code, hashlib.sha1()).hexdigest()[:12]}"]
+
+
+def as_rule(condition):
+    return condition if isinstance(condition, Rule) else Func(condition)
+
+
+def rules_categories(rules):
+    """ Categories of the series data required by the `while_not_true` rules list.
+    """
+    return frozenset().union(*[as_rule(f).categories for f, _ in rules])
+
+
+def while_not_true_compiled(ctx, rules):
+    for f, r in rules:
+        if f.test(ctx):
+            return r
+
+
+class ManualParsersCompiled(object):
+    """ Single-pass evaluation of the `while_not_true` manual parsers of all the ontology fields:
+        the series data is normalized and tokenized once per series and shared across the fields.
+    """
+
+    def __init__(self, parsers_it):
+        self.__fields = []
+        for field_name, parsing_methods in parsers_it:
+            for method_name, params in parsing_methods.items():
+                assert (method_name == "while_not_true")
+                self.__fields.append((field_name, [(as_rule(f), r) for f, r in params], params))
+
+    def iter_fields(self):
+        for field_name, _, _ in self.__fields:
+            yield field_name
+
+    def fingerprint(self):
+        """ Digest of the rules of all the fields, which changes once any of the rules is modified.
+        """
+        h = hashlib.sha1()
+        for field_name, rules, _ in self.__fields:
+            h.update(f"{field_name}:{rules!r}\n".encode("utf-8"))
+        return h.hexdigest()
+
+    def classify(self, line, handlers=None):
+        """ Returns the dictionary of the labels per field, None for the non-terminated fields.
+        """
+        assert (isinstance(handlers, dict) or handlers is None)
+
+        ctx = SeriesContext(line)
+
+        result = {}
+        for field_name, rules, params in self.__fields:
+            label = while_not_true_compiled(ctx, rules)
+            handle = handlers.get(field_name, None) if handlers is not None else None
+            if label is None and handle is not None:
+                handle(f"---\nNON TERMINATED STATE: \n{line}\n{params}")
+            result[field_name] = label
+
+        return result
+
+
+class ResponseContains(object):
+    """ Declarative condition of the LLM parsers: term is mentioned in the lowercased response.
+    """
+
+    def __init__(self, term):
+        assert (isinstance(term, str))
+        self.term = term
+
+    def __call__(self, text):
+        return self.term in text.lower()
+
+    def __repr__(self):
+        return f"ResponseContains({self.term!r})"
@@ -1,40 +1,67 @@
-def manual_terms_split(line, separators=None, clean_comma=True, clean_brackets=True):
-    # Several reports might be taken in brackets.
-    if clean_brackets:
-        if len(line) > 0 and line[0] == '(' and line[-1] == ')':
-            line = line[1:-1]
+import re
+from functools import lru_cache
 
-    separators = [' ', '_', '/'] if separators is None else separators
-    entries = []
 
-    # Assessing frequency of separator appearances.
-    template = ""
-    while len(line) > 0 and template is not None:
+# Bound of the memoized descriptions (descriptions are highly repetitive across patients).
+MANUAL_TERMS_CACHE_SIZE = 4096
 
-        template = None
-        min_ind = len(line) + 1
+DEFAULT_SEPARATORS = (' ', '_', '/')
 
-        for s in separators:
-            if s in line:
-                entry_ind = min(min_ind, line.index(s))
-                if entry_ind < min_ind:
-                    template = s
-                    min_ind = entry_ind
 
-        if template is None:
-            break
+@lru_cache(maxsize=None)
+def __separators_pattern(separators):
+    # Alternatives are tried in the given order at the leftmost position, which matches the original precedence.
+    return re.compile("|".join(re.escape(s) for s in separators))
 
-        entries.append(line[:min_ind])
-        line = line[min_ind + len(template):]
 
-    if len(line) > 0:
-        entries.append(line[:min_ind])
+@lru_cache(maxsize=MANUAL_TERMS_CACHE_SIZE)
+def __split(line, separators, clean_comma, clean_brackets):
+    # Several reports might be taken in brackets.
+    if clean_brackets:
+        if len(line) > 0 and line[0] == '(' and line[-1] == ')':
+            line = line[1:-1]
+
+    parts = __separators_pattern(separators).split(line) if len(separators) > 0 else [line]
 
     # clean empty entries.
-    entries = [e for e in entries if len(e) > 0]
+    entries = [e for e in parts if len(e) > 0]
 
     # optionally clean commas in the end.
     if clean_comma:
         entries = [e[:-1] if e[-1] == ',' else e for e in entries]
 
-    return entries
+    return tuple(entries)
+
+
+def manual_terms_split(line, separators=None, clean_comma=True, clean_brackets=True):
+    """ Splits the line into terms by the earliest separator within a single scan.
+        Results are memoized, hence the immutable tuple is returned.
+    """
+    separators = DEFAULT_SEPARATORS if separators is None else tuple(separators)
+    return __split(line, separators, clean_comma, clean_brackets)
+
+
+@lru_cache(maxsize=MANUAL_TERMS_CACHE_SIZE)
+def manual_terms_set(line):
+    """ Memoized set of the terms of the line (with the default splitting parameters).
+    """
+    return frozenset(manual_terms_split(line))
+
+
+def manual_terms_stats():
+    """ Hit rate statistics of the memoized splitting.
+    """
+    stats = {}
+    for name, func in [("split", __split), ("set", manual_terms_set)]:
+        info = func.cache_info()
+        calls = info.hits + info.misses
+        stats[name] = {"hits": info.hits, "misses": info.misses, "size": info.currsize, "maxsize": info.maxsize,
+                       "hit_rate": info.hits / calls if calls > 0 else 0.0}
+    return stats
+
+
+def manual_terms_cache_clear():
+    """ Drops the memoized splitting (e.g. for the cold measurements).
+    """
+    __split.cache_clear()
+    manual_terms_set.cache_clear()
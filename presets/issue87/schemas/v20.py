@@ -4,7 +4,9 @@ from presets.issue87.schemas.fields import CONTRAST_NO, CONTRAST_YES, \
     CONTRAST_TIMING_PRE, CONTRAST_TIMING_ARTERIAL, CONTRAST_TIMING_PORTAL, CONTRAST_TIMING_DELAYED, ECHO_GRADIENT, \
     ECHO_SPIN, PLANE_TYPE_AXIAL, PLANE_TYPE_SAGITTAL, PLANE_TYPE_CORONAL, WEIGHTING_T1, WEIGHTING_T2, FS_YES, \
     PHASE_IN, PHASE_OUT
-from presets.issue87.schemas.utils import manual_terms_split
+from presets.issue87.schemas.mapping import Eq, Ne, SeriesFilter
+from presets.issue87.schemas.rules import Always, AllOf, AnyOf, CaseSubstring, EndsWith, LabelIn, ModalityNotIn, \
+    Not, ResponseContains, Substring, Term, StartsWith
 
 
 class OntologyV20(BaseOntology):
@@ -31,59 +33,54 @@ class OntologyV20(BaseOntology):
     def _create_dwi_manual(label):
         return [
             # DWI is only supported for MR images.
-            (lambda line: "MR" not in line["Modality"], BaseOntology.UNKN_VALUE),
+            (ModalityNotIn("MR"), BaseOntology.UNKN_VALUE),
             # Filtering rules.
-            (lambda line: "Series-Description" in line and "dwi" in manual_terms_split(line["Series-Description"].lower()), label),
-            (lambda line: "Series-Description" in line and "b50" in manual_terms_split(line["Series-Description"].lower()) and
-                                                           "adc" not in line["Series-Description"].lower(), label),
-            (lambda line: "Series-Description" in line and "edwi" in manual_terms_split(line["Series-Description"].lower()), label),
-            (lambda line: "Series-Description" in line and "diffusion" in line["Series-Description"].lower() and
-                                                           "apparent" not in line["Series-Description"].lower() and
-                                                           "coefficient" not in line["Series-Description"].lower(), label),
+            (Term("dwi"), label),
+            (AllOf(Term("b50"), Not(Substring("adc"))), label),
+            (Term("edwi"), label),
+            (AllOf(Substring("diffusion"), Not(Substring("apparent")), Not(Substring("coefficient"))), label),
         ]
 
     @staticmethod
     def _create_adc_manual(label):
         # DWI is only supported for MR images.
         return [
-            (lambda line: "MR" not in line["Modality"], BaseOntology.UNKN_VALUE),
+            (ModalityNotIn("MR"), BaseOntology.UNKN_VALUE),
             # Filtering rules.
-            (lambda line: "Series-Description" in line and "adc" in manual_terms_split(line["Series-Description"].lower()), label),
-            (lambda line: "Series-Description" in line and line["Series-Description"].endswith('ADC'), label),
-            (lambda line: "Series-Description" in line and "apparent" in line["Series-Description"].lower() and 
-                                                           "diffusion" in line["Series-Description"].lower() and
-                                                           "coefficient" in line["Series-Description"].lower(), label),
+            (Term("adc"), label),
+            (EndsWith("ADC"), label),
+            (AllOf(Substring("apparent"), Substring("diffusion"), Substring("coefficient")), label),
         ]
 
     @staticmethod
     def _contrast_timing_manual():
         return [
             # Contrast agent is supported for any modality.
-            (lambda line: "MR" not in line["Modality"] and "CT" not in line["Modality"], BaseOntology.UNKN_VALUE),
+            (ModalityNotIn("MR", "CT"), BaseOntology.UNKN_VALUE),
             # Timing stage.
-            (lambda line: "Series-Description" in line and "pre" in manual_terms_split(line["Series-Description"].lower()), CONTRAST_TIMING_PRE),
-            (lambda line: "Series-Description" in line and "arterial" in manual_terms_split(line["Series-Description"].lower()), CONTRAST_TIMING_ARTERIAL),
-            (lambda line: "Series-Description" in line and "art" in manual_terms_split(line["Series-Description"].lower()), CONTRAST_TIMING_ARTERIAL),
-            (lambda line: "Series-Description" in line and "late art." in line["Series-Description"].lower(), CONTRAST_TIMING_ARTERIAL),
+            (Term("pre"), CONTRAST_TIMING_PRE),
+            (Term("arterial"), CONTRAST_TIMING_ARTERIAL),
+            (Term("art"), CONTRAST_TIMING_ARTERIAL),
+            (Substring("late art."), CONTRAST_TIMING_ARTERIAL),
             # Portal stage.
-            (lambda line: "Series-Description" in line and "portal" in manual_terms_split(line["Series-Description"].lower()), CONTRAST_TIMING_PORTAL),
+            (Term("portal"), CONTRAST_TIMING_PORTAL),
             # In several cases there might be misspellings.
             # Usually varies in between: 60-120 sec.
-            (lambda line: "Series-Description" in line and "porotal" in manual_terms_split(line["Series-Description"].lower()), CONTRAST_TIMING_PORTAL),
-            (lambda line: "Series-Description" in line and "venous" in manual_terms_split(line["Series-Description"].lower()), CONTRAST_TIMING_PORTAL),
-            (lambda line: "Series-Description" in line and "p.venous" in manual_terms_split(line["Series-Description"].lower()), CONTRAST_TIMING_PORTAL),
+            (Term("porotal"), CONTRAST_TIMING_PORTAL),
+            (Term("venous"), CONTRAST_TIMING_PORTAL),
+            (Term("p.venous"), CONTRAST_TIMING_PORTAL),
             # Delayed stage. (might not be contrast there).
             # Usually: 3-5 minutes. Might be even more.
-            # (lambda line: "Series-Description" in line and "3min" in manual_terms_split(line["Series-Description"].lower()), CONTRAST_TIMING_DELAYED),
-            # (lambda line: "Series-Description" in line and "3 min" in line["Series-Description"].lower(), CONTRAST_TIMING_DELAYED),
-            # (lambda line: "Series-Description" in line and "5min" in manual_terms_split(line["Series-Description"].lower()), CONTRAST_TIMING_DELAYED),
-            # (lambda line: "Series-Description" in line and "5 min" in line["Series-Description"].lower(), CONTRAST_TIMING_DELAYED),
-            (lambda line: "Series-Description" in line and "10 min" in manual_terms_split(line["Series-Description"].lower()), CONTRAST_TIMING_DELAYED),
-            (lambda line: "Series-Description" in line and "15 min" in line["Series-Description"].lower(), CONTRAST_TIMING_DELAYED),
-            (lambda line: "Series-Description" in line and "20min" in manual_terms_split(line["Series-Description"].lower()), CONTRAST_TIMING_DELAYED),
-            (lambda line: "Series-Description" in line and "20 min" in line["Series-Description"].lower(), CONTRAST_TIMING_DELAYED),
-            (lambda line: "Series-Description" in line and "delay" in line["Series-Description"].lower(), CONTRAST_TIMING_DELAYED),
-            (lambda _: True, BaseOntology.UNKN_VALUE)
+            # (Term("3min"), CONTRAST_TIMING_DELAYED),
+            # (Substring("3 min"), CONTRAST_TIMING_DELAYED),
+            # (Term("5min"), CONTRAST_TIMING_DELAYED),
+            # (Substring("5 min"), CONTRAST_TIMING_DELAYED),
+            (Term("10 min"), CONTRAST_TIMING_DELAYED),
+            (Substring("15 min"), CONTRAST_TIMING_DELAYED),
+            (Term("20min"), CONTRAST_TIMING_DELAYED),
+            (Substring("20 min"), CONTRAST_TIMING_DELAYED),
+            (Substring("delay"), CONTRAST_TIMING_DELAYED),
+            (Always(), BaseOntology.UNKN_VALUE)
         ]
 
     @staticmethod
@@ -96,15 +93,15 @@ class OntologyV20(BaseOntology):
             # Parsing response from LLM.
             "llm": {
                 "while_not_true": [
-                    (lambda text: "yes" in text.lower(), DWI_YES),
-                    (lambda text: "no" in text.lower(), DWI_NO),
+                    (ResponseContains("yes"), DWI_YES),
+                    (ResponseContains("no"), DWI_NO),
                 ]
             },
 
             # Parsing response manually.
             "manual": {
                 "while_not_true": _create_dwi_manual(label=DWI_YES) +
-                                  [(lambda _: True, DWI_NO)]
+                                  [(Always(), DWI_NO)]
             },
             "labels": [DWI_YES, DWI_NO, BaseOntology.UNKN_VALUE]
         },
@@ -113,14 +110,14 @@ class OntologyV20(BaseOntology):
             # Parsing response from LLM.
             "llm": {
                 "while_not_true": [
-                    (lambda text: "yes" in text.lower(), ADC_YES),
-                    (lambda text: "no" in text.lower(), ADC_NO),
+                    (ResponseContains("yes"), ADC_YES),
+                    (ResponseContains("no"), ADC_NO),
                 ]
             },
             # Parsing response manually.
             "manual": {
                 "while_not_true": _create_adc_manual(label=ADC_YES) +
-                                  [(lambda _: True, ADC_NO)]
+                                  [(Always(), ADC_NO)]
             },
             "labels": [ADC_YES, ADC_NO, BaseOntology.UNKN_VALUE]
         },
@@ -129,22 +126,22 @@ class OntologyV20(BaseOntology):
             # Parsing response from LLM.
             "llm": {
                 "while_not_true": [
-                    (lambda text: "yes" in text.lower(), CONTRAST_YES),
-                    (lambda text: "no" in text.lower(), CONTRAST_NO),
+                    (ResponseContains("yes"), CONTRAST_YES),
+                    (ResponseContains("no"), CONTRAST_NO),
                 ]
             },
             "manual": {
                 "while_not_true": [
                     # Contrast agent is supported for any modality.
-                    (lambda line: "MR" not in line["Modality"] and "CT" not in line["Modality"], BaseOntology.UNKN_VALUE),
+                    (ModalityNotIn("MR", "CT"), BaseOntology.UNKN_VALUE),
                     # Rely on Series Description field.
-                    (lambda line: "Series-Description" in line and "non-contrast" in line["Series-Description"].lower(), CONTRAST_NO),
-                    (lambda line: "Series-Description" in line and "non contrast" in line["Series-Description"].lower(), CONTRAST_NO),
-                    (lambda line: "Series-Description" in line and "no contrast" in line["Series-Description"].lower(), CONTRAST_NO),
-                    (lambda line: "Series-Description" in line and "contrast routine" in line["Series-Description"].lower(), CONTRAST_YES),
+                    (Substring("non-contrast"), CONTRAST_NO),
+                    (Substring("non contrast"), CONTRAST_NO),
+                    (Substring("no contrast"), CONTRAST_NO),
+                    (Substring("contrast routine"), CONTRAST_YES),
                     # mentioning that contrast agent is presented.
-                    (lambda line: OntologyV20.get_contrast_timing_manual(line) in [CONTRAST_TIMING_PORTAL, CONTRAST_TIMING_ARTERIAL], CONTRAST_YES),
-                    (lambda _: True, BaseOntology.UNKN_VALUE)
+                    (LabelIn(_contrast_timing_manual(), [CONTRAST_TIMING_PORTAL, CONTRAST_TIMING_ARTERIAL]), CONTRAST_YES),
+                    (Always(), BaseOntology.UNKN_VALUE)
                 ]
             },
             "manual_meta": {
@@ -152,7 +149,7 @@ class OntologyV20(BaseOntology):
                     (lambda line: "Contrast-Agent" in line and line["Contrast-Agent"].lower() == "yes", CONTRAST_YES),
                     (lambda line: "Contrast-Agent" in line and line["Contrast-Agent"].lower() == "applied", CONTRAST_YES),
                     (lambda line: "Contrast-Agent" in line and line["Contrast-Agent"].lower() != "none" and len(line["Contrast-Agent"]) > 0, CONTRAST_YES),
-                    (lambda _: True, BaseOntology.UNKN_VALUE)
+                    (Always(), BaseOntology.UNKN_VALUE)
                 ]
             },
             "labels": [CONTRAST_YES, CONTRAST_NO, BaseOntology.UNKN_VALUE]
@@ -198,20 +195,20 @@ class OntologyV20(BaseOntology):
             "manual": {
                 "while_not_true": [
                     # DWI is only supported for MR images.
-                    (lambda line: "MR" not in line["Modality"], BaseOntology.UNKN_VALUE),
+                    (ModalityNotIn("MR"), BaseOntology.UNKN_VALUE),
                     # Fast Gre common entry.
-                    (lambda line: "Series-Description" in line and "ssfse" in manual_terms_split(line["Series-Description"].lower()), ECHO_SPIN),
-                    (lambda line: "Series-Description" in line and "frfse" in manual_terms_split(line["Series-Description"].lower()), ECHO_SPIN),
-                    (lambda line: "Series-Description" in line and "fse" in manual_terms_split(line["Series-Description"].lower()), ECHO_SPIN),
-                    (lambda line: "Series-Description" in line and "fgre" in manual_terms_split(line["Series-Description"].lower()), ECHO_GRADIENT),
+                    (Term("ssfse"), ECHO_SPIN),
+                    (Term("frfse"), ECHO_SPIN),
+                    (Term("fse"), ECHO_SPIN),
+                    (Term("fgre"), ECHO_GRADIENT),
                     # Three-dimensional T1-weighted GRADIENT RECALL ECHO (3D T1W GRE) volumetric interpolated breath-hold examination (VIBE).
-                    (lambda line: "Series-Description" in line and "vibe" in manual_terms_split(line["Series-Description"].lower()), ECHO_GRADIENT),
+                    (Term("vibe"), ECHO_GRADIENT),
                     # HASTE T2 weighted image (T2WI) half-Fourier acquired single turbo spin-echo (HASTE)
-                    (lambda line: "Series-Description" in line and "haste" in manual_terms_split(line["Series-Description"].lower()), ECHO_SPIN),
+                    (Term("haste"), ECHO_SPIN),
                     # BLADE: uses a Turbo Spin Echo(TSE) sequence to reduce motion artifacts
-                    (lambda line: "Series-Description" in line and "blade" in manual_terms_split(line["Series-Description"].lower()), ECHO_SPIN),
+                    (Term("blade"), ECHO_SPIN),
                     # Anything else means we don't know.
-                    (lambda _: True, BaseOntology.UNKN_VALUE)
+                    (Always(), BaseOntology.UNKN_VALUE)
                 ]
             },
             "labels": [ECHO_SPIN, ECHO_GRADIENT, BaseOntology.UNKN_VALUE]
@@ -234,16 +231,16 @@ class OntologyV20(BaseOntology):
             "manual": {
                 "while_not_true": [
                     # Contrast agent is supported for any modality.
-                    (lambda line: "MR" not in line["Modality"] and "CT" not in line["Modality"], BaseOntology.UNKN_VALUE),
+                    (ModalityNotIn("MR", "CT"), BaseOntology.UNKN_VALUE),
                     # Seeking for the related value.
-                    (lambda line: "Series-Description" in line and "axial" in manual_terms_split(line["Series-Description"].lower()), PLANE_TYPE_AXIAL),
-                    (lambda line: "Series-Description" in line and "ax" in manual_terms_split(line["Series-Description"].lower()), PLANE_TYPE_AXIAL),
-                    (lambda line: "Series-Description" in line and "sagittal" in manual_terms_split(line["Series-Description"].lower()), PLANE_TYPE_SAGITTAL),
-                    (lambda line: "Series-Description" in line and "sag" in manual_terms_split(line["Series-Description"].lower()), PLANE_TYPE_SAGITTAL),
-                    (lambda line: "Series-Description" in line and "cor" in manual_terms_split(line["Series-Description"].lower()), PLANE_TYPE_CORONAL),
-                    (lambda line: "Series-Description" in line and "coronal" in manual_terms_split(line["Series-Description"].lower()), PLANE_TYPE_CORONAL),
+                    (Term("axial"), PLANE_TYPE_AXIAL),
+                    (Term("ax"), PLANE_TYPE_AXIAL),
+                    (Term("sagittal"), PLANE_TYPE_SAGITTAL),
+                    (Term("sag"), PLANE_TYPE_SAGITTAL),
+                    (Term("cor"), PLANE_TYPE_CORONAL),
+                    (Term("coronal"), PLANE_TYPE_CORONAL),
                     # Anything else means we don't know.
-                    (lambda _: True, BaseOntology.UNKN_VALUE)
+                    (Always(), BaseOntology.UNKN_VALUE)
                 ]
             },
             # Utilized for evaluation purposes.
@@ -265,21 +262,21 @@ class OntologyV20(BaseOntology):
             "manual": {
                 "while_not_true": [
                     # DWI is only supported for MR images.
-                    (lambda line: "MR" not in line["Modality"], BaseOntology.UNKN_VALUE),
+                    (ModalityNotIn("MR"), BaseOntology.UNKN_VALUE),
                     # Direct mention of the related weighting.
-                    (lambda line: "Series-Description" in line and "t1" in manual_terms_split(line["Series-Description"].lower()), WEIGHTING_T1),
-                    (lambda line: "Series-Description" in line and "t-1" in manual_terms_split(line["Series-Description"].lower()), WEIGHTING_T1),
-                    (lambda line: "Series-Description" in line and "t2" in manual_terms_split(line["Series-Description"].lower()), WEIGHTING_T2),
-                    (lambda line: "Series-Description" in line and "t-2" in manual_terms_split(line["Series-Description"].lower()), WEIGHTING_T2),
-                    (lambda line: "Series-Description" in line and "post-t2" in manual_terms_split(line["Series-Description"].lower()), WEIGHTING_T2),
+                    (Term("t1"), WEIGHTING_T1),
+                    (Term("t-1"), WEIGHTING_T1),
+                    (Term("t2"), WEIGHTING_T2),
+                    (Term("t-2"), WEIGHTING_T2),
+                    (Term("post-t2"), WEIGHTING_T2),
                     # Indirect. VIBE: Three-dimensional T1-weighted gradient recall echo (3D T1W GRE) volumetric interpolated breath-hold examination (VIBE).
                     # According to the related paper: https://pmc.ncbi.nlm.nih.gov/articles/PMC6209485/
-                    (lambda line: "Series-Description" in line and "vibe" in manual_terms_split(line["Series-Description"].lower()), WEIGHTING_T1),
+                    (Term("vibe"), WEIGHTING_T1),
                     # Indirect. HASTE: T2 weighted image (T2WI) half-Fourier acquired single turbo spin-echo (HASTE).
                     # According to the related paper: https://pubmed.ncbi.nlm.nih.gov/8835965/
-                    (lambda line: "Series-Description" in line and "haste" in manual_terms_split(line["Series-Description"].lower()), WEIGHTING_T2),
+                    (Term("haste"), WEIGHTING_T2),
                     # Anything else means we don't know.
-                    (lambda _: True, BaseOntology.UNKN_VALUE)
+                    (Always(), BaseOntology.UNKN_VALUE)
                 ]
             },
             # Utilized for evaluation purposes.
@@ -289,29 +286,29 @@ class OntologyV20(BaseOntology):
         "is_fs": {
             "llm": {
                 "while_not_true": [
-                    (lambda text: "yes" in text.lower(), FS_YES),
+                    (ResponseContains("yes"), FS_YES),
                     # NOTE: we use UNKN_VALUE because it is not a part of the evaluation, but at the same time we
                     # don't want count it as an error of non-recognized value.
-                    (lambda text: "no" in text.lower(), BaseOntology.UNKN_VALUE),
+                    (ResponseContains("no"), BaseOntology.UNKN_VALUE),
                 ]
             },
             "manual": {
                 "while_not_true": [
                     # DWI is only supported for MR images.
-                    (lambda line: "MR" not in line["Modality"], BaseOntology.UNKN_VALUE),
+                    (ModalityNotIn("MR"), BaseOntology.UNKN_VALUE),
                     # https://radiopaedia.org/articles/fat-suppressed-imaging
-                    (lambda line: "Series-Description" in line and "SPAIR" in line["Series-Description"], FS_YES),
+                    (CaseSubstring("SPAIR"), FS_YES),
                     # Fat suppression is commonly used in magnetic resonance imaging (MRI) imaging to suppress the signal from adipose tissue or detect adipose tissue
-                    (lambda line: "Series-Description" in line and "SPIR" in line["Series-Description"], FS_YES),
-                    (lambda line: "Series-Description" in line and "STIR" in line["Series-Description"], FS_YES),
+                    (CaseSubstring("SPIR"), FS_YES),
+                    (CaseSubstring("STIR"), FS_YES),
                     # FS mentions inside or by the beginning or at the end of the line.
-                    (lambda line: "Series-Description" in line and " FS " in line["Series-Description"] or line["Series-Description"].startswith("FS ") or line["Series-Description"].endswith(" FS"), FS_YES),
-                    (lambda line: "Series-Description" in line and " fs " in line["Series-Description"] or line["Series-Description"].startswith("fs ") or line["Series-Description"].endswith(" fs"), FS_YES),
+                    (AnyOf(CaseSubstring(" FS "), StartsWith("FS "), EndsWith(" FS")), FS_YES),
+                    (AnyOf(CaseSubstring(" fs "), StartsWith("fs "), EndsWith(" fs")), FS_YES),
                     # The Fat-Sat technique is the most widely used method for fat suppression.
                     # https://mriquestions.com/fat-sat-pulses.html#/
-                    (lambda line: "Series-Description" in line and "fatsat" in line["Series-Description"].lower(), FS_YES),
-                    (lambda line: "Series-Description" in line and "fat sat" in line["Series-Description"].lower(), FS_YES),
-                    (lambda _: True, BaseOntology.UNKN_VALUE)
+                    (Substring("fatsat"), FS_YES),
+                    (Substring("fat sat"), FS_YES),
+                    (Always(), BaseOntology.UNKN_VALUE)
                 ]
             },
             # Utilized for evaluation purposes.,
@@ -338,17 +335,13 @@ class OntologyV20(BaseOntology):
             "manual": {
                 "while_not_true": [
                     # DWI is only supported for MR images.
-                    (lambda line: "MR" not in line["Modality"], BaseOntology.UNKN_VALUE),
+                    (ModalityNotIn("MR"), BaseOntology.UNKN_VALUE),
                     # Value selection.
-                    (lambda line: "Series-Description" in line and "inphase" in manual_terms_split(line["Series-Description"].lower()), PHASE_IN),
-                    (lambda line: "Series-Description" in line and
-                                  "in" in manual_terms_split(line["Series-Description"].lower()) and
-                                  "phase" in manual_terms_split(line["Series-Description"].lower()), PHASE_IN),
-                    (lambda line: "Series-Description" in line and "outphase" in manual_terms_split(line["Series-Description"].lower()), PHASE_OUT),
-                    (lambda line: "Series-Description" in line and
-                                  "out" in manual_terms_split(line["Series-Description"].lower()) and
-                                  "phase" in manual_terms_split(line["Series-Description"].lower()), PHASE_OUT),
-                    (lambda _: True, BaseOntology.UNKN_VALUE)
+                    (Term("inphase"), PHASE_IN),
+                    (AllOf(Term("in"), Term("phase")), PHASE_IN),
+                    (Term("outphase"), PHASE_OUT),
+                    (AllOf(Term("out"), Term("phase")), PHASE_OUT),
+                    (Always(), BaseOntology.UNKN_VALUE)
                 ]
             },
             # Utilized for evaluation purposes.
@@ -361,50 +354,58 @@ class OntologyV20(BaseOntology):
         return {
             # Phased
             "axial-phased-in":
-                lambda p_series: [s for s in p_series if s["plane_type"] == PLANE_TYPE_AXIAL and s["phase_type"] == PHASE_IN],
+                SeriesFilter(Eq("plane_type", PLANE_TYPE_AXIAL), Eq("phase_type", PHASE_IN)),
             "axial-phased-out":
-                lambda p_series: [s for s in p_series if s["plane_type"] == PLANE_TYPE_AXIAL and s["phase_type"] == PHASE_OUT],
+                SeriesFilter(Eq("plane_type", PLANE_TYPE_AXIAL), Eq("phase_type", PHASE_OUT)),
             "axial-phased-in-out":
-                lambda p_series: [s for s in p_series if s["plane_type"] == PLANE_TYPE_AXIAL and s["phase_type"] == 'in-out'],
+                SeriesFilter(Eq("plane_type", PLANE_TYPE_AXIAL), Eq("phase_type", 'in-out')),
             "axial-phased-none":
-                lambda p_series: [s for s in p_series if s["plane_type"] == PLANE_TYPE_AXIAL and s["phase_type"] == '.'],
+                SeriesFilter(Eq("plane_type", PLANE_TYPE_AXIAL), Eq("phase_type", '.')),
             # Timing
             'axial-time-pre':
-                lambda p_series: [s for s in p_series if s["plane_type"] == PLANE_TYPE_AXIAL and s["contrast_time"] == CONTRAST_TIMING_PRE],
+                SeriesFilter(Eq("plane_type", PLANE_TYPE_AXIAL), Eq("contrast_time", CONTRAST_TIMING_PRE)),
             'axial-time-portal':
-                lambda p_series: [s for s in p_series if s["plane_type"] == PLANE_TYPE_AXIAL and s["contrast_time"] == CONTRAST_TIMING_PORTAL],
+                SeriesFilter(Eq("plane_type", PLANE_TYPE_AXIAL), Eq("contrast_time", CONTRAST_TIMING_PORTAL)),
             'axial-time-del':
-                lambda p_series: [s for s in p_series if s["plane_type"] == PLANE_TYPE_AXIAL and s["contrast_time"] == CONTRAST_TIMING_DELAYED],
+                SeriesFilter(Eq("plane_type", PLANE_TYPE_AXIAL), Eq("contrast_time", CONTRAST_TIMING_DELAYED)),
             'axial-time-none':
-                lambda p_series: [s for s in p_series if s["plane_type"] == PLANE_TYPE_AXIAL and s["contrast_time"] == CONTRAST_NO],
+                SeriesFilter(Eq("plane_type", PLANE_TYPE_AXIAL), Eq("contrast_time", CONTRAST_NO)),
             # Weighting
             "axial-adc":
-                lambda p_series: [s for s in p_series if s["weight_is_adc"] == self.ADC_YES and s["plane_type"] == PLANE_TYPE_AXIAL],
+                SeriesFilter(Eq("weight_is_adc", self.ADC_YES), Eq("plane_type", PLANE_TYPE_AXIAL)),
             "axial-dwi":
-                lambda p_series: [s for s in p_series if s["weight_is_dwi"] == self.DWI_YES and s["plane_type"] == PLANE_TYPE_AXIAL],
+                SeriesFilter(Eq("weight_is_dwi", self.DWI_YES), Eq("plane_type", PLANE_TYPE_AXIAL)),
             # T1
             "t1-cont-fs":
-                lambda p_series: [s for s in p_series if s["weight_t"] == WEIGHTING_T1 and s.get("is_fs", None) == FS_YES and s["is_contrast_agent"] == CONTRAST_YES and s["plane_type"] == PLANE_TYPE_AXIAL],
+                SeriesFilter(Eq("weight_t", WEIGHTING_T1), Eq("is_fs", FS_YES, optional=True),
+                             Eq("is_contrast_agent", CONTRAST_YES), Eq("plane_type", PLANE_TYPE_AXIAL)),
             "t1-cont":
-                lambda p_series: [s for s in p_series if s["weight_t"] == WEIGHTING_T1 and s.get("is_fs", None) != FS_YES and s["is_contrast_agent"] == CONTRAST_YES and s["plane_type"] == PLANE_TYPE_AXIAL],
+                SeriesFilter(Eq("weight_t", WEIGHTING_T1), Ne("is_fs", FS_YES, optional=True),
+                             Eq("is_contrast_agent", CONTRAST_YES), Eq("plane_type", PLANE_TYPE_AXIAL)),
             "t1-fs":
-                lambda p_series: [s for s in p_series if s["weight_t"] == WEIGHTING_T1 and s.get("is_fs", None) == FS_YES and s["is_contrast_agent"] == CONTRAST_NO and s["plane_type"] == PLANE_TYPE_AXIAL],
+                SeriesFilter(Eq("weight_t", WEIGHTING_T1), Eq("is_fs", FS_YES, optional=True),
+                             Eq("is_contrast_agent", CONTRAST_NO), Eq("plane_type", PLANE_TYPE_AXIAL)),
             "t1":
-                lambda p_series: [s for s in p_series if s["weight_t"] == WEIGHTING_T1 and s["is_contrast_agent"] == CONTRAST_NO and s["plane_type"] == PLANE_TYPE_AXIAL],
+                SeriesFilter(Eq("weight_t", WEIGHTING_T1), Eq("is_contrast_agent", CONTRAST_NO),
+                             Eq("plane_type", PLANE_TYPE_AXIAL)),
             # T2
             "t2-cont-fs":
-                lambda p_series: [s for s in p_series if s["weight_t"] == WEIGHTING_T2 and s.get("is_fs", None) == FS_YES and s["is_contrast_agent"] == CONTRAST_YES and s["plane_type"] == PLANE_TYPE_AXIAL],
+                SeriesFilter(Eq("weight_t", WEIGHTING_T2), Eq("is_fs", FS_YES, optional=True),
+                             Eq("is_contrast_agent", CONTRAST_YES), Eq("plane_type", PLANE_TYPE_AXIAL)),
             "t2-cont":
-                lambda p_series: [s for s in p_series if s["weight_t"] == WEIGHTING_T2 and s.get("is_fs", None) != FS_YES and s["is_contrast_agent"] == CONTRAST_YES and s["plane_type"] == PLANE_TYPE_AXIAL],
+                SeriesFilter(Eq("weight_t", WEIGHTING_T2), Ne("is_fs", FS_YES, optional=True),
+                             Eq("is_contrast_agent", CONTRAST_YES), Eq("plane_type", PLANE_TYPE_AXIAL)),
             "t2-fs":
-                lambda p_series: [s for s in p_series if s["weight_t"] == WEIGHTING_T2 and s.get("is_fs", None) == FS_YES and s["is_contrast_agent"] == CONTRAST_NO and s["plane_type"] == PLANE_TYPE_AXIAL],
+                SeriesFilter(Eq("weight_t", WEIGHTING_T2), Eq("is_fs", FS_YES, optional=True),
+                             Eq("is_contrast_agent", CONTRAST_NO), Eq("plane_type", PLANE_TYPE_AXIAL)),
             "t2":
-                lambda p_series: [s for s in p_series if s["weight_t"] == WEIGHTING_T2 and s["is_contrast_agent"] == CONTRAST_NO and s["plane_type"] == PLANE_TYPE_AXIAL],
+                SeriesFilter(Eq("weight_t", WEIGHTING_T2), Eq("is_contrast_agent", CONTRAST_NO),
+                             Eq("plane_type", PLANE_TYPE_AXIAL)),
             # Other
             'coronal':
-                lambda p_series: [s for s in p_series if s["plane_type"] == PLANE_TYPE_CORONAL],
+                SeriesFilter(Eq("plane_type", PLANE_TYPE_CORONAL)),
             'sagittal':
-                lambda p_series: [s for s in p_series if s["plane_type"] == PLANE_TYPE_SAGITTAL],
+                SeriesFilter(Eq("plane_type", PLANE_TYPE_SAGITTAL)),
         }
 
     def ontology_mapping_header(self):
@@ -1,4 +1,6 @@
 from presets.issue87.schemas.base import BaseOntology
+from presets.issue87.schemas.mapping import Eq, Ne, SeriesFilter
+from presets.issue87.schemas.rules import Always
 from presets.issue87.schemas.fields import PLANE_TYPE_AXIAL, CONTRAST_TIMING_PRE, \
     CONTRAST_TIMING_PORTAL, CONTRAST_TIMING_DELAYED, CONTRAST_NO, WEIGHTING_T1, CONTRAST_YES, FS_YES, WEIGHTING_T2, \
     PLANE_TYPE_CORONAL, PLANE_TYPE_SAGITTAL, CONTRAST_TIMING_ARTERIAL
@@ -35,7 +37,7 @@ class OntologyV21(BaseOntology):
                     OntologyV20._ONTOLOGY_PARSERS["weight_t"]["manual"]["while_not_true"][:-1] +
                     OntologyV20._create_dwi_manual(label=WEIGHTING_DWI) +
                     OntologyV20._create_adc_manual(label=WEIGHTING_ADC) +
-                    [(lambda _: True, BaseOntology.UNKN_VALUE)]
+                    [(Always(), BaseOntology.UNKN_VALUE)]
             },
             # Utilized for evaluation purposes.
             "labels": OntologyV20._ONTOLOGY_PARSERS["weight_t"]["labels"][:-1] +
@@ -58,7 +60,7 @@ class OntologyV21(BaseOntology):
             "manual": {
                 "while_not_true":
                     OntologyV20._ONTOLOGY_PARSERS["contrast_time"]["manual"]["while_not_true"][:-1] +
-                    [(lambda _: True, BaseOntology.UNKN_VALUE)]
+                    [(Always(), BaseOntology.UNKN_VALUE)]
             },
             "labels": OntologyV20._ONTOLOGY_PARSERS["contrast_time"]["labels"][:-1] +
                       [BaseOntology.UNKN_VALUE]
@@ -74,82 +76,60 @@ class OntologyV21(BaseOntology):
         return {
             # Weighting
             "axial-adc":
-                lambda p_series: [s for s in p_series if
-                                  s["weight_t"] == self.WEIGHTING_ADC and s["plane_type"] == PLANE_TYPE_AXIAL],
+                SeriesFilter(Eq("weight_t", self.WEIGHTING_ADC), Eq("plane_type", PLANE_TYPE_AXIAL)),
             "axial-dwi":
-                lambda p_series: [s for s in p_series if
-                                  s["weight_t"] == self.WEIGHTING_DWI and s["plane_type"] == PLANE_TYPE_AXIAL],
+                SeriesFilter(Eq("weight_t", self.WEIGHTING_DWI), Eq("plane_type", PLANE_TYPE_AXIAL)),
             # T1
             "axial-t1-fs-cont-del":
-                lambda p_series: [s for s in p_series if
-                                  s["plane_type"] == PLANE_TYPE_AXIAL and
-                                  s["weight_t"] == WEIGHTING_T1 and s.get("is_fs", None) == FS_YES and
-                                  s["is_contrast_agent"] == CONTRAST_TIMING_PORTAL and
-                                  s["contrast_time"] == CONTRAST_TIMING_DELAYED],
+                SeriesFilter(Eq("plane_type", PLANE_TYPE_AXIAL), Eq("weight_t", WEIGHTING_T1),
+                             Eq("is_fs", FS_YES, optional=True), Eq("is_contrast_agent", CONTRAST_TIMING_PORTAL),
+                             Eq("contrast_time", CONTRAST_TIMING_DELAYED)),
             "axial-t1-fs-cont-port":
-                lambda p_series: [s for s in p_series if
-                                  s["plane_type"] == PLANE_TYPE_AXIAL and
-                                  s["weight_t"] == WEIGHTING_T1 and s.get("is_fs", None) == FS_YES and
-                                  s["is_contrast_agent"] == CONTRAST_TIMING_PORTAL and
-                                  s["contrast_time"] == CONTRAST_TIMING_PRE],
+                SeriesFilter(Eq("plane_type", PLANE_TYPE_AXIAL), Eq("weight_t", WEIGHTING_T1),
+                             Eq("is_fs", FS_YES, optional=True), Eq("is_contrast_agent", CONTRAST_TIMING_PORTAL),
+                             Eq("contrast_time", CONTRAST_TIMING_PRE)),
             "axial-t1-fs-cont-art":
-                lambda p_series: [s for s in p_series if
-                                  s["plane_type"] == PLANE_TYPE_AXIAL and
-                                  s["weight_t"] == WEIGHTING_T1 and s.get("is_fs", None) == FS_YES and
-                                  s["is_contrast_agent"] == CONTRAST_TIMING_ARTERIAL and
-                                  s["contrast_time"] == CONTRAST_TIMING_PRE],
+                SeriesFilter(Eq("plane_type", PLANE_TYPE_AXIAL), Eq("weight_t", WEIGHTING_T1),
+                             Eq("is_fs", FS_YES, optional=True), Eq("is_contrast_agent", CONTRAST_TIMING_ARTERIAL),
+                             Eq("contrast_time", CONTRAST_TIMING_PRE)),
             "axial-t1-fs-cont-pre":
-                lambda p_series: [s for s in p_series if
-                                  s["plane_type"] == PLANE_TYPE_AXIAL and
-                                  s["weight_t"] == WEIGHTING_T1 and s.get("is_fs", None) == FS_YES and
-                                  s["is_contrast_agent"] == CONTRAST_YES and
-                                  s["contrast_time"] == CONTRAST_TIMING_PRE],
+                SeriesFilter(Eq("plane_type", PLANE_TYPE_AXIAL), Eq("weight_t", WEIGHTING_T1),
+                             Eq("is_fs", FS_YES, optional=True), Eq("is_contrast_agent", CONTRAST_YES),
+                             Eq("contrast_time", CONTRAST_TIMING_PRE)),
             "axial-t1-fs":
-                lambda p_series: [s for s in p_series if
-                                  s["weight_t"] == WEIGHTING_T1 and s.get("is_fs", None) == FS_YES and
-                                  s["is_contrast_agent"] == CONTRAST_NO and s["plane_type"] == PLANE_TYPE_AXIAL],
+                SeriesFilter(Eq("weight_t", WEIGHTING_T1), Eq("is_fs", FS_YES, optional=True),
+                             Eq("is_contrast_agent", CONTRAST_NO), Eq("plane_type", PLANE_TYPE_AXIAL)),
             "axial-t1":
-                lambda p_series: [s for s in p_series if
-                                  s["weight_t"] == WEIGHTING_T1 and s.get("is_fs", None) != FS_YES and
-                                  s["is_contrast_agent"] == CONTRAST_NO and s["plane_type"] == PLANE_TYPE_AXIAL],
+                SeriesFilter(Eq("weight_t", WEIGHTING_T1), Ne("is_fs", FS_YES, optional=True),
+                             Eq("is_contrast_agent", CONTRAST_NO), Eq("plane_type", PLANE_TYPE_AXIAL)),
             # T2
             "axial-t2-fs-cont-del":
-                lambda p_series: [s for s in p_series if
-                                  s["plane_type"] == PLANE_TYPE_AXIAL and
-                                  s["weight_t"] == WEIGHTING_T2 and s.get("is_fs", None) == FS_YES and
-                                  s["is_contrast_agent"] == CONTRAST_TIMING_PORTAL and
-                                  s["contrast_time"] == CONTRAST_TIMING_DELAYED],
+                SeriesFilter(Eq("plane_type", PLANE_TYPE_AXIAL), Eq("weight_t", WEIGHTING_T2),
+                             Eq("is_fs", FS_YES, optional=True), Eq("is_contrast_agent", CONTRAST_TIMING_PORTAL),
+                             Eq("contrast_time", CONTRAST_TIMING_DELAYED)),
             "axial-t2-fs-cont-port":
-                lambda p_series: [s for s in p_series if
-                                  s["plane_type"] == PLANE_TYPE_AXIAL and
-                                  s["weight_t"] == WEIGHTING_T2 and s.get("is_fs", None) == FS_YES and
-                                  s["is_contrast_agent"] == CONTRAST_TIMING_PORTAL and
-                                  s["contrast_time"] == CONTRAST_TIMING_PRE],
+                SeriesFilter(Eq("plane_type", PLANE_TYPE_AXIAL), Eq("weight_t", WEIGHTING_T2),
+                             Eq("is_fs", FS_YES, optional=True), Eq("is_contrast_agent", CONTRAST_TIMING_PORTAL),
+                             Eq("contrast_time", CONTRAST_TIMING_PRE)),
             "axial-t2-fs-cont-art":
-                lambda p_series: [s for s in p_series if
-                                  s["plane_type"] == PLANE_TYPE_AXIAL and
-                                  s["weight_t"] == WEIGHTING_T2 and s.get("is_fs", None) == FS_YES and
-                                  s["is_contrast_agent"] == CONTRAST_TIMING_ARTERIAL and
-                                  s["contrast_time"] == CONTRAST_TIMING_PRE],
+                SeriesFilter(Eq("plane_type", PLANE_TYPE_AXIAL), Eq("weight_t", WEIGHTING_T2),
+                             Eq("is_fs", FS_YES, optional=True), Eq("is_contrast_agent", CONTRAST_TIMING_ARTERIAL),
+                             Eq("contrast_time", CONTRAST_TIMING_PRE)),
             "axial-t2-fs-cont-pre":
-                lambda p_series: [s for s in p_series if
-                                  s["plane_type"] == PLANE_TYPE_AXIAL and
-                                  s["weight_t"] == WEIGHTING_T2 and s.get("is_fs", None) == FS_YES and
-                                  s["is_contrast_agent"] == CONTRAST_YES and
-                                  s["contrast_time"] == CONTRAST_TIMING_PRE],
+                SeriesFilter(Eq("plane_type", PLANE_TYPE_AXIAL), Eq("weight_t", WEIGHTING_T2),
+                             Eq("is_fs", FS_YES, optional=True), Eq("is_contrast_agent", CONTRAST_YES),
+                             Eq("contrast_time", CONTRAST_TIMING_PRE)),
             "axial-t2-fs":
-                lambda p_series: [s for s in p_series if
-                                  s["weight_t"] == WEIGHTING_T2 and s.get("is_fs", None) == FS_YES and
-                                  s["is_contrast_agent"] == CONTRAST_NO and s["plane_type"] == PLANE_TYPE_AXIAL],
+                SeriesFilter(Eq("weight_t", WEIGHTING_T2), Eq("is_fs", FS_YES, optional=True),
+                             Eq("is_contrast_agent", CONTRAST_NO), Eq("plane_type", PLANE_TYPE_AXIAL)),
             "axial-t2":
-                lambda p_series: [s for s in p_series if
-                                  s["weight_t"] == WEIGHTING_T2 and s.get("is_fs", None) != FS_YES and
-                                  s["is_contrast_agent"] == CONTRAST_NO and s["plane_type"] == PLANE_TYPE_AXIAL],
+                SeriesFilter(Eq("weight_t", WEIGHTING_T2), Ne("is_fs", FS_YES, optional=True),
+                             Eq("is_contrast_agent", CONTRAST_NO), Eq("plane_type", PLANE_TYPE_AXIAL)),
             # Timing
             'coronal':
-                lambda p_series: [s for s in p_series if s["plane_type"] == PLANE_TYPE_CORONAL],
+                SeriesFilter(Eq("plane_type", PLANE_TYPE_CORONAL)),
             'sagittal':
-                lambda p_series: [s for s in p_series if s["plane_type"] == PLANE_TYPE_SAGITTAL]
+                SeriesFilter(Eq("plane_type", PLANE_TYPE_SAGITTAL))
         }
 
     def ontology_mapping_header(self):
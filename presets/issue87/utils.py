@@ -1,13 +1,20 @@
+import os
 from collections import OrderedDict
 from os.path import join
 
 from mmi_kit.series.utils import iter_handled_filepath_series
 from mmi_kit.service_os import OsService
 
+from core.service_instrumentation import InstrumentationService
+from core.service_prefetch import PrefetchService
+from core.utils import Lazy, LazyDict
+from presets.dicom_cache import DicomSeriesCache
 from presets.dicom_filters import DicomFilters
+from presets.dicom_index import DicomSeriesIndex
+from presets.dicom_sampling import SeriesSampling
 from presets.issue87.schemas.v20 import OntologyV20
 from presets.issue87.schemas.v21 import OntologyV21
-from utils import DATA_DIR, LOCAL_TCIA_NARRATIVES_COLLECTION
+from utils import DATA_DIR, CACHE_DIR, LOCAL_TCIA_NARRATIVES_COLLECTION
 from utils_content import LIVER_DATASETS
 from utils_dicom_handlers import DICOM_META2CAT_DICT
 
@@ -20,38 +27,157 @@ def __cast_multi_variant(mv):
     return list(mv)
 
 
-def iter_dicom_data(series_dir):
+# Type casting of the categories of the DICOM data.
+DICOM_cat_cast = {
+    "Sequence-Name": lambda v: str(v),
+    "Sequence-Variant": lambda v: __cast_multi_variant(v),
+}
+
+
+def iter_dicom_data(series_dir, sampling=SeriesSampling.ALL, sampling_n=3, handle=None, latency=None,
+                    filepaths=None):
+    """ Iterating categorized data of the DICOM files of the series.
+        sampling: one of the `SeriesSampling.MODES`, allows visiting only representative slices.
+        handle: optional logger, when provided the visited slices are checked to be consistent,
+                i.e. share the same values of the series-level categories (see `DICOM_series_params`).
+        latency: optional delay (in seconds) injected before reading every file.
+        filepaths: optional already listed files of the series.
+    """
+    filepaths = OsService.iter_dir_filepaths(series_dir) if filepaths is None else filepaths
+    categories = set(DICOM_default_params) | set(DICOM_relevant_params)
+    series_categories = set(DICOM_series_params)
+
+    def __scan(fp):
+        with InstrumentationService.stage("dicom:scan", items=1):
+            data = DicomFilters.filter_categorized(
+                filepath=fp,
+                categories=categories,
+                categories_map=DICOM_META2CAT_DICT,
+                cat_cast=DICOM_cat_cast,
+                header_only=True,
+                suppress_wa=True)
+        if InstrumentationService.enabled:
+            # NOTE: size of the scanned files, while only the header part is actually read.
+            InstrumentationService.add("dicom:scan", nbytes=os.path.getsize(fp))
+        return data
+
     sr_it = iter_handled_filepath_series(
         series_func=lambda: [
-            ("", OsService.iter_dir_filepaths(series_dir))
+            ("", SeriesSampling.select(filepaths, mode=sampling, n=sampling_n))
         ],
         handlers=[
             # for common categories.
-            lambda fp: DicomFilters.filter_categorized(
-                filepath=fp,
-                categories=set(DICOM_default_params) | set(DICOM_relevant_params),
-                categories_map=DICOM_META2CAT_DICT,
-                cat_cast={
-                    "Sequence-Name": lambda v: str(v),
-                    "Sequence-Variant": lambda v: __cast_multi_variant(v),
-                },
-                suppress_wa=True),
+            PrefetchService.with_latency(__scan, latency),
+            lambda fp: fp,
         ])
 
+    populated = set()
+    reference = None
+
     # Handled data.
     for _, handled_data in sr_it:
-        yield handled_data[0]
+        data, filepath = handled_data
+
+        if handle is not None:
+            reference = data if reference is None else reference
+            for cat in sorted(set(data) & set(reference) & series_categories):
+                if data[cat] != reference[cat]:
+                    handle(f"---\nINCONSISTENT SLICE: `{filepath}`\n{cat}: `{data[cat]}` != `{reference[cat]}`")
+
+        yield data
+
+        populated |= set(data)
+        if sampling == SeriesSampling.COMPLETE and series_categories <= populated:
+            break
+
+
+def merge_dicom_data(series_dir, **kwargs):
+    """ Merging the categorized data of all the (sampled) DICOM files of the series.
+    """
+    dicom_params = {}
+    for data in iter_dicom_data(series_dir, **kwargs):
+        dicom_params.update(data)
+    return dicom_params
+
+
+def get_dicom_data(series_dir, use_cache=True, sampling=None, sampling_n=None, latency=None, filepaths=None):
+    """ Provides merged categorized DICOM data of the series, optionally backed by the persistent cache.
+        filepaths: optional already listed files of the series (see `list_series_filepaths`).
+    """
+    sampling = DICOM_SAMPLING if sampling is None else sampling
+    sampling_n = DICOM_SAMPLING_N if sampling_n is None else sampling_n
+    compute_func = lambda s_dir: merge_dicom_data(s_dir, sampling=sampling, sampling_n=sampling_n, latency=latency,
+                                                  filepaths=filepaths)
+
+    with InstrumentationService.stage("dicom:data", items=1):
+        if not use_cache:
+            return compute_func(series_dir)
+        return DICOM_CACHE.get(series_dir, compute_func=compute_func, variant=(sampling, sampling_n),
+                               filepaths=filepaths)
+
+
+def get_line_series_dir(line):
+    return join(DICOM_ROOTS[line["Collection"]], line["File Location"])
+
+
+def is_line_indexed(line):
+    return "Series UID" in line and DICOM_INDEX.get(line["Series UID"]) is not None
+
+
+def get_line_dicom_data(line, use_index=True, latency=None, filepaths=None):
+    """ DICOM data of the series of the collection line,
+        which is looked up by Series UID in the index (see `DICOM_INDEX`) and read from the series files otherwise.
+        filepaths: optional already listed files of the series.
+    """
+    if use_index and "Series UID" in line:
+        with InstrumentationService.stage("dicom:index", items=1):
+            entry = DICOM_INDEX.get(line["Series UID"])
+        if entry is not None:
+            return entry["data"]
+    return get_dicom_data(get_line_series_dir(line), latency=latency, filepaths=filepaths)
+
+
+def list_series_filepaths(series_dir):
+    return list(OsService.iter_dir_filepaths(series_dir))
+
+
+def get_series_bytes(filepaths):
+    """ Size of the series files to be read (upper bound, since only the headers are actually read).
+    """
+    filepaths = SeriesSampling.select(filepaths, mode=DICOM_SAMPLING, n=DICOM_SAMPLING_N)
+    return sum(os.path.getsize(fp) for fp in filepaths)
+
+
+def iter_prefetched_dicom(lines_it, ahead=8, workers=None, max_bytes=None, latency=None):
+    """ Yields (line, DICOM data) pairs in order of the lines, while the DICOM data of the next `ahead` lines
+        is listed and read in background threads, with at most `max_bytes` of series files in flight.
+        Every series directory is listed once, the listing is shared by sizing and reading (incl. cache validation).
+        latency: optional delay (in seconds) injected before every directory listing and file read.
+    """
+
+    def __list(line):
+        # Indexed series are not read, so there is nothing to list.
+        return line, (None if is_line_indexed(line) else list_series_filepaths(get_line_series_dir(line)))
+
+    return PrefetchService.iter_prefetched(
+        items_it=lines_it,
+        prepare_func=PrefetchService.with_latency(__list, latency),
+        fetch_func=lambda listed: get_line_dicom_data(listed[0], latency=latency, filepaths=listed[1]),
+        ahead=ahead,
+        workers=DICOM_PREFETCH_WORKERS if workers is None else workers,
+        max_bytes=DICOM_PREFETCH_MAX_BYTES if max_bytes is None else max_bytes,
+        size_func=lambda listed: 0 if listed[1] is None else get_series_bytes(listed[1]))
 
 
 ISSUE_87_DIR = join(DATA_DIR)
 
 
-# Predefined set for roots of the collections.
-DICOM_ROOTS = {
-    "CPTAC-CCRCC": LIVER_DATASETS['tcia-ccrcc']["src"]["series_func"](),
-    "CPTAC-CCRCC-rkt": LIVER_DATASETS['tcia-ccrcc-rkt']["src"]["series_func"](),
-    "TCGA-LIHC": LIVER_DATASETS['tcga-lihc']["src"]["series_func"](),
-}
+# Predefined set for roots of the collections (resolved on the first access).
+DICOM_ROOTS = LazyDict({
+    "CPTAC-CCRCC": Lazy(LIVER_DATASETS['tcia-ccrcc']["src"]["series_func"]),
+    "CPTAC-CCRCC-rkt": Lazy(LIVER_DATASETS['tcia-ccrcc-rkt']["src"]["series_func"]),
+    "TCGA-LIHC": Lazy(LIVER_DATASETS['tcga-lihc']["src"]["series_func"]),
+})
 
 
 def create_input_for_model(csv_filename):
@@ -169,6 +295,33 @@ DICOM_default_params = ["Modality", "Patient_ID", "ID-Series", "Patient_Age", "P
 DICOM_relevant_params = ["Image-param_Repetition-Time", "Image-param_Echo-Time", "Contrast-Agent",
                          "Image-param_FlipAngle", "Sequence-Name", "Sequence-Variant", "Protocol-Name",
                          "Series-Description", "Photometric-Interpretation", "Echo-Numbers", "Modality"]
+# Parameters which are expected to be the same for all the slices of the series.
+# NOTE: per-slice parameters (e.g. echo numbers and times) and the optional ones (e.g. contrast agent, weight)
+# are not considered, since waiting for the latter makes the `complete` sampling read the whole series.
+DICOM_series_params = ["Modality", "Patient_ID", "ID-Series", "Series-Description", "Protocol-Name",
+                       "Sequence-Name", "Sequence-Variant"]
+
+# Slices of the series to be considered for the DICOM data (see `SeriesSampling.MODES`).
+# NOTE: data of the later slices overrides the former ones, so `all` keeps the data of the last slice per category.
+DICOM_SAMPLING = SeriesSampling.ALL
+# Amount of slices for the `even` sampling.
+DICOM_SAMPLING_N = 3
+
+# Persistent cache of the merged DICOM data per series.
+# NOTE: the version has to be updated once the categories, their casting or reading in `iter_dicom_data` change.
+DICOM_CACHE = DicomSeriesCache(
+    cache_dir=join(CACHE_DIR, "dicom-series"),
+    version=["v2", sorted(set(DICOM_default_params) | set(DICOM_relevant_params)), sorted(DICOM_series_params)])
+
+
+# Index of the merged DICOM data of the series by Series UID (see `issue87_1_dicom_index.py`).
+DICOM_INDEX = DicomSeriesIndex(
+    filepath=join(CACHE_DIR, "dicom-index.sqlite"),
+    version=[DICOM_CACHE.version, DICOM_SAMPLING, DICOM_SAMPLING_N])
+
+# Prefetching of the DICOM data (see `iter_prefetched_dicom`).
+DICOM_PREFETCH_WORKERS = 4
+DICOM_PREFETCH_MAX_BYTES = 256 * 1024 * 1024
 
 
 FIELD_LOG_HANDLERS = {
@@ -0,0 +1,395 @@
+""" Reference implementations that preceded the optimized ones, kept for the equivalence tests.
+    The code follows the original one, except for the shortcuts of the repeated expressions (see `_terms`, `_desc`).
+"""
+from presets.issue87.llm_matching_while import do_while_not_true
+from presets.issue87.schemas.base import BaseOntology
+from presets.issue87.schemas.fields import CONTRAST_NO, CONTRAST_YES, \
+    CONTRAST_TIMING_PRE, CONTRAST_TIMING_ARTERIAL, CONTRAST_TIMING_PORTAL, CONTRAST_TIMING_DELAYED, ECHO_GRADIENT, \
+    ECHO_SPIN, PLANE_TYPE_AXIAL, PLANE_TYPE_SAGITTAL, PLANE_TYPE_CORONAL, WEIGHTING_T1, WEIGHTING_T2, FS_YES, \
+    PHASE_IN, PHASE_OUT
+
+UNKN = BaseOntology.UNKN_VALUE
+
+
+def manual_terms_split(line, separators=None, clean_comma=True, clean_brackets=True):
+    # Several reports might be taken in brackets.
+    if clean_brackets:
+        if len(line) > 0 and line[0] == '(' and line[-1] == ')':
+            line = line[1:-1]
+
+    separators = [' ', '_', '/'] if separators is None else separators
+    entries = []
+
+    # Assessing frequency of separator appearances.
+    template = ""
+    while len(line) > 0 and template is not None:
+
+        template = None
+        min_ind = len(line) + 1
+
+        for s in separators:
+            if s in line:
+                entry_ind = min(min_ind, line.index(s))
+                if entry_ind < min_ind:
+                    template = s
+                    min_ind = entry_ind
+
+        if template is None:
+            break
+
+        entries.append(line[:min_ind])
+        line = line[min_ind + len(template):]
+
+    if len(line) > 0:
+        entries.append(line[:min_ind])
+
+    # clean empty entries.
+    entries = [e for e in entries if len(e) > 0]
+
+    # optionally clean commas in the end.
+    if clean_comma:
+        entries = [e[:-1] if e[-1] == ',' else e for e in entries]
+
+    return entries
+
+
+def _terms(line):
+    return manual_terms_split(line["Series-Description"].lower())
+
+
+def _desc(line):
+    return line["Series-Description"].lower()
+
+
+def seek_pattern(text, ordered_patterns, return_mode=None):
+    assert (isinstance(ordered_patterns, list))
+
+    assert (return_mode in ["ind_aft", None])
+    f = None
+    for p in ordered_patterns:
+        if p in text:
+            f = p
+            break
+
+    if return_mode is None:
+        return f is not None
+    elif return_mode == "ind_aft":
+        return text.index(f) + len(f) if f is not None else -1
+
+
+def do_pattern_tree_matching(text, tree, handle=None):
+    """ Parsing LLM responses using the tree-based pattern matching.
+    """
+
+    # Setup initial state.
+    state = "__init__"
+
+    while state in tree:
+
+        next_states = []
+
+        # Extracting parameters.
+        params = tree[state]
+        handler_type = params[0]
+        states = params[1:]
+
+        assert isinstance(handler_type, str), "The handler type is unknown!"
+
+        if handler_type == "if-else":
+            assert (len(states) == 2)
+            if_true_patterns, if_true_state = states[0]
+            ind_aft = seek_pattern(text, if_true_patterns, return_mode="ind_aft")
+            next_states = [(if_true_state, ind_aft) if ind_aft >= 0 else (states[-1], 0)]
+
+        elif handler_type == "choice":
+            for patterns_list, new_state in states:
+
+                if patterns_list is None and len(next_states) == 0:
+                    # This is the exceptional case when we can't find anything else.
+                    ind_aft = 0
+                else:
+                    ind_aft = seek_pattern(text, patterns_list if patterns_list is not None else [],
+                                           return_mode="ind_aft")
+
+                if not ind_aft >= 0:
+                    continue
+                # Result is presented.
+                next_states.append((new_state, ind_aft))
+        else:
+            raise Exception(f"Handler type is not supported: `{handler_type}`")
+
+        if len(next_states) > 1:
+            if handle is not None:
+                handle(f"---\nMULTIPLE CHOICES: `{next_states}`\n{text}")
+            state = None
+            break
+
+        if len(next_states) == 0:
+            if handle is not None:
+                handle(f"---\nNON TERMINATED STATE: `{state}`\n{text}")
+            state = None
+            break
+
+        # OK, go further.
+        new_state, next_text_from = next_states[0]
+        state = new_state
+
+        # Remove text part before.
+        text = text[next_text_from:]
+
+    return state
+
+
+###############
+# Manual rules.
+###############
+
+DWI_YES = "+"
+DWI_NO = "."
+ADC_YES = "+"
+ADC_NO = "."
+
+
+def _create_dwi_manual(label):
+    return [
+        (lambda line: "MR" not in line["Modality"], UNKN),
+        (lambda line: "Series-Description" in line and "dwi" in _terms(line), label),
+        (lambda line: "Series-Description" in line and "b50" in _terms(line) and "adc" not in _desc(line), label),
+        (lambda line: "Series-Description" in line and "edwi" in _terms(line), label),
+        (lambda line: "Series-Description" in line and "diffusion" in _desc(line) and
+                      "apparent" not in _desc(line) and "coefficient" not in _desc(line), label),
+    ]
+
+
+def _create_adc_manual(label):
+    return [
+        (lambda line: "MR" not in line["Modality"], UNKN),
+        (lambda line: "Series-Description" in line and "adc" in _terms(line), label),
+        (lambda line: "Series-Description" in line and line["Series-Description"].endswith('ADC'), label),
+        (lambda line: "Series-Description" in line and "apparent" in _desc(line) and
+                      "diffusion" in _desc(line) and "coefficient" in _desc(line), label),
+    ]
+
+
+def _contrast_timing_manual():
+    return [
+        (lambda line: "MR" not in line["Modality"] and "CT" not in line["Modality"], UNKN),
+        (lambda line: "Series-Description" in line and "pre" in _terms(line), CONTRAST_TIMING_PRE),
+        (lambda line: "Series-Description" in line and "arterial" in _terms(line), CONTRAST_TIMING_ARTERIAL),
+        (lambda line: "Series-Description" in line and "art" in _terms(line), CONTRAST_TIMING_ARTERIAL),
+        (lambda line: "Series-Description" in line and "late art." in _desc(line), CONTRAST_TIMING_ARTERIAL),
+        (lambda line: "Series-Description" in line and "portal" in _terms(line), CONTRAST_TIMING_PORTAL),
+        (lambda line: "Series-Description" in line and "porotal" in _terms(line), CONTRAST_TIMING_PORTAL),
+        (lambda line: "Series-Description" in line and "venous" in _terms(line), CONTRAST_TIMING_PORTAL),
+        (lambda line: "Series-Description" in line and "p.venous" in _terms(line), CONTRAST_TIMING_PORTAL),
+        (lambda line: "Series-Description" in line and "10 min" in _terms(line), CONTRAST_TIMING_DELAYED),
+        (lambda line: "Series-Description" in line and "15 min" in _desc(line), CONTRAST_TIMING_DELAYED),
+        (lambda line: "Series-Description" in line and "20min" in _terms(line), CONTRAST_TIMING_DELAYED),
+        (lambda line: "Series-Description" in line and "20 min" in _desc(line), CONTRAST_TIMING_DELAYED),
+        (lambda line: "Series-Description" in line and "delay" in _desc(line), CONTRAST_TIMING_DELAYED),
+        (lambda _: True, UNKN)
+    ]
+
+
+def _get_contrast_timing_manual(line):
+    return do_while_not_true(line, params=_contrast_timing_manual())
+
+
+MANUAL_V20 = {
+    "weight_is_dwi": _create_dwi_manual(label=DWI_YES) + [(lambda _: True, DWI_NO)],
+    "weight_is_adc": _create_adc_manual(label=ADC_YES) + [(lambda _: True, ADC_NO)],
+    "is_contrast_agent": [
+        (lambda line: "MR" not in line["Modality"] and "CT" not in line["Modality"], UNKN),
+        (lambda line: "Series-Description" in line and "non-contrast" in _desc(line), CONTRAST_NO),
+        (lambda line: "Series-Description" in line and "non contrast" in _desc(line), CONTRAST_NO),
+        (lambda line: "Series-Description" in line and "no contrast" in _desc(line), CONTRAST_NO),
+        (lambda line: "Series-Description" in line and "contrast routine" in _desc(line), CONTRAST_YES),
+        (lambda line: _get_contrast_timing_manual(line) in [CONTRAST_TIMING_PORTAL, CONTRAST_TIMING_ARTERIAL],
+         CONTRAST_YES),
+        (lambda _: True, UNKN)
+    ],
+    "contrast_time": _contrast_timing_manual(),
+    "aquisition_echo": [
+        (lambda line: "MR" not in line["Modality"], UNKN),
+        (lambda line: "Series-Description" in line and "ssfse" in _terms(line), ECHO_SPIN),
+        (lambda line: "Series-Description" in line and "frfse" in _terms(line), ECHO_SPIN),
+        (lambda line: "Series-Description" in line and "fse" in _terms(line), ECHO_SPIN),
+        (lambda line: "Series-Description" in line and "fgre" in _terms(line), ECHO_GRADIENT),
+        (lambda line: "Series-Description" in line and "vibe" in _terms(line), ECHO_GRADIENT),
+        (lambda line: "Series-Description" in line and "haste" in _terms(line), ECHO_SPIN),
+        (lambda line: "Series-Description" in line and "blade" in _terms(line), ECHO_SPIN),
+        (lambda _: True, UNKN)
+    ],
+    "plane_type": [
+        (lambda line: "MR" not in line["Modality"] and "CT" not in line["Modality"], UNKN),
+        (lambda line: "Series-Description" in line and "axial" in _terms(line), PLANE_TYPE_AXIAL),
+        (lambda line: "Series-Description" in line and "ax" in _terms(line), PLANE_TYPE_AXIAL),
+        (lambda line: "Series-Description" in line and "sagittal" in _terms(line), PLANE_TYPE_SAGITTAL),
+        (lambda line: "Series-Description" in line and "sag" in _terms(line), PLANE_TYPE_SAGITTAL),
+        (lambda line: "Series-Description" in line and "cor" in _terms(line), PLANE_TYPE_CORONAL),
+        (lambda line: "Series-Description" in line and "coronal" in _terms(line), PLANE_TYPE_CORONAL),
+        (lambda _: True, UNKN)
+    ],
+    "weight_t": [
+        (lambda line: "MR" not in line["Modality"], UNKN),
+        (lambda line: "Series-Description" in line and "t1" in _terms(line), WEIGHTING_T1),
+        (lambda line: "Series-Description" in line and "t-1" in _terms(line), WEIGHTING_T1),
+        (lambda line: "Series-Description" in line and "t2" in _terms(line), WEIGHTING_T2),
+        (lambda line: "Series-Description" in line and "t-2" in _terms(line), WEIGHTING_T2),
+        (lambda line: "Series-Description" in line and "post-t2" in _terms(line), WEIGHTING_T2),
+        (lambda line: "Series-Description" in line and "vibe" in _terms(line), WEIGHTING_T1),
+        (lambda line: "Series-Description" in line and "haste" in _terms(line), WEIGHTING_T2),
+        (lambda _: True, UNKN)
+    ],
+    "is_fs": [
+        (lambda line: "MR" not in line["Modality"], UNKN),
+        (lambda line: "Series-Description" in line and "SPAIR" in line["Series-Description"], FS_YES),
+        (lambda line: "Series-Description" in line and "SPIR" in line["Series-Description"], FS_YES),
+        (lambda line: "Series-Description" in line and "STIR" in line["Series-Description"], FS_YES),
+        # NOTE: operator precedence results in KeyError for the series without description.
+        (lambda line: "Series-Description" in line and " FS " in line["Series-Description"] or
+                      line["Series-Description"].startswith("FS ") or
+                      line["Series-Description"].endswith(" FS"), FS_YES),
+        (lambda line: "Series-Description" in line and " fs " in line["Series-Description"] or
+                      line["Series-Description"].startswith("fs ") or
+                      line["Series-Description"].endswith(" fs"), FS_YES),
+        (lambda line: "Series-Description" in line and "fatsat" in _desc(line), FS_YES),
+        (lambda line: "Series-Description" in line and "fat sat" in _desc(line), FS_YES),
+        (lambda _: True, UNKN)
+    ],
+    "phase_type": [
+        (lambda line: "MR" not in line["Modality"], UNKN),
+        (lambda line: "Series-Description" in line and "inphase" in _terms(line), PHASE_IN),
+        (lambda line: "Series-Description" in line and "in" in _terms(line) and "phase" in _terms(line), PHASE_IN),
+        (lambda line: "Series-Description" in line and "outphase" in _terms(line), PHASE_OUT),
+        (lambda line: "Series-Description" in line and "out" in _terms(line) and "phase" in _terms(line), PHASE_OUT),
+        (lambda _: True, UNKN)
+    ],
+}
+
+MANUAL_V21 = {
+    "weight_t": MANUAL_V20["weight_t"][:-1] +
+                _create_dwi_manual(label="DWI") +
+                _create_adc_manual(label="ADC") +
+                [(lambda _: True, UNKN)],
+    "contrast_time": MANUAL_V20["contrast_time"][:-1] + [(lambda _: True, UNKN)],
+    "is_contrast_agent": MANUAL_V20["is_contrast_agent"],
+    "is_fs": MANUAL_V20["is_fs"],
+    "aquisition_echo": MANUAL_V20["aquisition_echo"],
+    "plane_type": MANUAL_V20["plane_type"],
+    "phase_type": MANUAL_V20["phase_type"],
+}
+
+
+#################
+# Series mapping.
+#################
+
+SERIES_MAPPING_V20 = {
+    # Phased
+    "axial-phased-in":
+        lambda p_series: [s for s in p_series if s["plane_type"] == PLANE_TYPE_AXIAL and s["phase_type"] == PHASE_IN],
+    "axial-phased-out":
+        lambda p_series: [s for s in p_series if s["plane_type"] == PLANE_TYPE_AXIAL and s["phase_type"] == PHASE_OUT],
+    "axial-phased-in-out":
+        lambda p_series: [s for s in p_series if s["plane_type"] == PLANE_TYPE_AXIAL and s["phase_type"] == 'in-out'],
+    "axial-phased-none":
+        lambda p_series: [s for s in p_series if s["plane_type"] == PLANE_TYPE_AXIAL and s["phase_type"] == '.'],
+    # Timing
+    'axial-time-pre':
+        lambda p_series: [s for s in p_series if s["plane_type"] == PLANE_TYPE_AXIAL and
+                          s["contrast_time"] == CONTRAST_TIMING_PRE],
+    'axial-time-portal':
+        lambda p_series: [s for s in p_series if s["plane_type"] == PLANE_TYPE_AXIAL and
+                          s["contrast_time"] == CONTRAST_TIMING_PORTAL],
+    'axial-time-del':
+        lambda p_series: [s for s in p_series if s["plane_type"] == PLANE_TYPE_AXIAL and
+                          s["contrast_time"] == CONTRAST_TIMING_DELAYED],
+    'axial-time-none':
+        lambda p_series: [s for s in p_series if s["plane_type"] == PLANE_TYPE_AXIAL and
+                          s["contrast_time"] == CONTRAST_NO],
+    # Weighting
+    "axial-adc":
+        lambda p_series: [s for s in p_series if s["weight_is_adc"] == ADC_YES and s["plane_type"] == PLANE_TYPE_AXIAL],
+    "axial-dwi":
+        lambda p_series: [s for s in p_series if s["weight_is_dwi"] == DWI_YES and s["plane_type"] == PLANE_TYPE_AXIAL],
+    # T1
+    "t1-cont-fs":
+        lambda p_series: [s for s in p_series if s["weight_t"] == WEIGHTING_T1 and s.get("is_fs", None) == FS_YES and
+                          s["is_contrast_agent"] == CONTRAST_YES and s["plane_type"] == PLANE_TYPE_AXIAL],
+    "t1-cont":
+        lambda p_series: [s for s in p_series if s["weight_t"] == WEIGHTING_T1 and s.get("is_fs", None) != FS_YES and
+                          s["is_contrast_agent"] == CONTRAST_YES and s["plane_type"] == PLANE_TYPE_AXIAL],
+    "t1-fs":
+        lambda p_series: [s for s in p_series if s["weight_t"] == WEIGHTING_T1 and s.get("is_fs", None) == FS_YES and
+                          s["is_contrast_agent"] == CONTRAST_NO and s["plane_type"] == PLANE_TYPE_AXIAL],
+    "t1":
+        lambda p_series: [s for s in p_series if s["weight_t"] == WEIGHTING_T1 and
+                          s["is_contrast_agent"] == CONTRAST_NO and s["plane_type"] == PLANE_TYPE_AXIAL],
+    # T2
+    "t2-cont-fs":
+        lambda p_series: [s for s in p_series if s["weight_t"] == WEIGHTING_T2 and s.get("is_fs", None) == FS_YES and
+                          s["is_contrast_agent"] == CONTRAST_YES and s["plane_type"] == PLANE_TYPE_AXIAL],
+    "t2-cont":
+        lambda p_series: [s for s in p_series if s["weight_t"] == WEIGHTING_T2 and s.get("is_fs", None) != FS_YES and
+                          s["is_contrast_agent"] == CONTRAST_YES and s["plane_type"] == PLANE_TYPE_AXIAL],
+    "t2-fs":
+        lambda p_series: [s for s in p_series if s["weight_t"] == WEIGHTING_T2 and s.get("is_fs", None) == FS_YES and
+                          s["is_contrast_agent"] == CONTRAST_NO and s["plane_type"] == PLANE_TYPE_AXIAL],
+    "t2":
+        lambda p_series: [s for s in p_series if s["weight_t"] == WEIGHTING_T2 and
+                          s["is_contrast_agent"] == CONTRAST_NO and s["plane_type"] == PLANE_TYPE_AXIAL],
+    # Other
+    'coronal':
+        lambda p_series: [s for s in p_series if s["plane_type"] == PLANE_TYPE_CORONAL],
+    'sagittal':
+        lambda p_series: [s for s in p_series if s["plane_type"] == PLANE_TYPE_SAGITTAL],
+}
+
+
+def _axial_t_fs_contrast(weighting, contrast, timing):
+    return lambda p_series: [s for s in p_series if
+                             s["plane_type"] == PLANE_TYPE_AXIAL and
+                             s["weight_t"] == weighting and s.get("is_fs", None) == FS_YES and
+                             s["is_contrast_agent"] == contrast and
+                             s["contrast_time"] == timing]
+
+
+SERIES_MAPPING_V21 = {
+    # Weighting
+    "axial-adc":
+        lambda p_series: [s for s in p_series if s["weight_t"] == "ADC" and s["plane_type"] == PLANE_TYPE_AXIAL],
+    "axial-dwi":
+        lambda p_series: [s for s in p_series if s["weight_t"] == "DWI" and s["plane_type"] == PLANE_TYPE_AXIAL],
+    # T1
+    "axial-t1-fs-cont-del": _axial_t_fs_contrast(WEIGHTING_T1, CONTRAST_TIMING_PORTAL, CONTRAST_TIMING_DELAYED),
+    "axial-t1-fs-cont-port": _axial_t_fs_contrast(WEIGHTING_T1, CONTRAST_TIMING_PORTAL, CONTRAST_TIMING_PRE),
+    "axial-t1-fs-cont-art": _axial_t_fs_contrast(WEIGHTING_T1, CONTRAST_TIMING_ARTERIAL, CONTRAST_TIMING_PRE),
+    "axial-t1-fs-cont-pre": _axial_t_fs_contrast(WEIGHTING_T1, CONTRAST_YES, CONTRAST_TIMING_PRE),
+    "axial-t1-fs":
+        lambda p_series: [s for s in p_series if
+                          s["weight_t"] == WEIGHTING_T1 and s.get("is_fs", None) == FS_YES and
+                          s["is_contrast_agent"] == CONTRAST_NO and s["plane_type"] == PLANE_TYPE_AXIAL],
+    "axial-t1":
+        lambda p_series: [s for s in p_series if
+                          s["weight_t"] == WEIGHTING_T1 and s.get("is_fs", None) != FS_YES and
+                          s["is_contrast_agent"] == CONTRAST_NO and s["plane_type"] == PLANE_TYPE_AXIAL],
+    # T2
+    "axial-t2-fs-cont-del": _axial_t_fs_contrast(WEIGHTING_T2, CONTRAST_TIMING_PORTAL, CONTRAST_TIMING_DELAYED),
+    "axial-t2-fs-cont-port": _axial_t_fs_contrast(WEIGHTING_T2, CONTRAST_TIMING_PORTAL, CONTRAST_TIMING_PRE),
+    "axial-t2-fs-cont-art": _axial_t_fs_contrast(WEIGHTING_T2, CONTRAST_TIMING_ARTERIAL, CONTRAST_TIMING_PRE),
+    "axial-t2-fs-cont-pre": _axial_t_fs_contrast(WEIGHTING_T2, CONTRAST_YES, CONTRAST_TIMING_PRE),
+    "axial-t2-fs":
+        lambda p_series: [s for s in p_series if
+                          s["weight_t"] == WEIGHTING_T2 and s.get("is_fs", None) == FS_YES and
+                          s["is_contrast_agent"] == CONTRAST_NO and s["plane_type"] == PLANE_TYPE_AXIAL],
+    "axial-t2":
+        lambda p_series: [s for s in p_series if
+                          s["weight_t"] == WEIGHTING_T2 and s.get("is_fs", None) != FS_YES and
+                          s["is_contrast_agent"] == CONTRAST_NO and s["plane_type"] == PLANE_TYPE_AXIAL],
+    # Timing
+    'coronal':
+        lambda p_series: [s for s in p_series if s["plane_type"] == PLANE_TYPE_CORONAL],
+    'sagittal':
+        lambda p_series: [s for s in p_series if s["plane_type"] == PLANE_TYPE_SAGITTAL]
+}
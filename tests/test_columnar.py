@@ -0,0 +1,58 @@
+from pydicom.multival import MultiValue
+from pydicom.valuerep import DSfloat
+
+from core.service_columnar import ColumnarWriter, ColumnarReader, ColumnarService
+
+
+ROWS = [
+    {"id": 0, "value": True, "label": "a"},
+    {"id": 1, "value": 1},
+    {"id": 2, "value": 1.0, "label": None},
+    {"id": 3, "value": "1", "label": "b"},
+    {"id": 4, "value": False},
+    {"id": 5, "value": 0, "label": "a"},
+    {"id": 6, "value": 0.0},
+    {"id": 7, "value": None, "label": "b"},
+    {"id": 8, "value": DSfloat("1.5"), "extra": "ignored"},
+    {"id": 9, "value": MultiValue(str, ["SK", "SP"])},
+    {"id": 10},
+]
+
+
+def expected_value(v):
+    # Non-primitive values are kept as strings, subclasses of the primitive types as the primitive ones.
+    return float(v) if isinstance(v, DSfloat) else (str(v) if isinstance(v, MultiValue) else v)
+
+
+def write(target_dir, rows, row_group_size):
+    with ColumnarWriter(target_dir=target_dir, columns=["id", "value", "label", "missing"],
+                        row_group_size=row_group_size) as writer:
+        assert list(writer.tee(iter(rows))) == rows
+
+
+def test_round_trip(tmp_path):
+    target_dir = ColumnarService.target_dir(str(tmp_path / "output.csv"))
+    # Multiple row groups, the last one is incomplete.
+    write(target_dir, ROWS, row_group_size=4)
+
+    reader = ColumnarReader(target_dir)
+    assert reader.rows == len(ROWS)
+    assert reader.columns() == ["id", "value", "label", "missing"]
+
+    for column in reader.columns():
+        actual = reader.values(column).tolist()
+        expected = [expected_value(row.get(column, None)) for row in ROWS]
+        assert actual == expected, column
+        # Types are kept, so that True, 1 and 1.0 are not mixed up.
+        assert [type(v) for v in actual] == [type(v) for v in expected], column
+
+    # Absent values and None are different codes.
+    assert reader.codes("label")[1] != reader.codes("label")[2]
+    assert (reader.codes("missing") == -1).all()
+
+
+def test_round_trip_empty(tmp_path):
+    write(str(tmp_path), [], row_group_size=4)
+    reader = ColumnarReader(str(tmp_path))
+    assert reader.rows == 0
+    assert reader.values("value").tolist() == []
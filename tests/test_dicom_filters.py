@@ -0,0 +1,32 @@
+import os
+from os.path import join
+
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import SyntheticService
+from presets.dicom_filters import DicomFilters
+from presets.issue87.utils import DICOM_default_params, DICOM_relevant_params, DICOM_cat_cast
+from utils_dicom_handlers import DICOM_META2CAT_DICT
+
+CATEGORIES = set(DICOM_default_params) | set(DICOM_relevant_params)
+
+
+@pytest.fixture(scope="module")
+def filepaths(tmp_path_factory):
+    root = str(tmp_path_factory.mktemp("dicom"))
+    series_dirs = SyntheticService.dicom_series(root, series=8, slices=4, rng=np.random.default_rng(0))
+    return [join(d, f) for d in series_dirs for f in sorted(os.listdir(d))]
+
+
+@pytest.mark.parametrize("cat_cast", [None, DICOM_cat_cast])
+def test_header_only_matches_full_read(filepaths, cat_cast):
+    kwargs = {"cat_cast": cat_cast} if cat_cast is not None else {}
+    for filepath in filepaths:
+        header = DicomFilters.filter_categorized(filepath=filepath, categories=CATEGORIES,
+                                                 categories_map=DICOM_META2CAT_DICT, header_only=True, **kwargs)
+        full = DicomFilters.filter_categorized(filepath=filepath, categories=CATEGORIES,
+                                               categories_map=DICOM_META2CAT_DICT, header_only=False, **kwargs)
+        assert header == full, filepath
+        # Values are of the same types (e.g. MultiValue and DSfloat are kept as they are).
+        assert {k: type(v) for k, v in header.items()} == {k: type(v) for k, v in full.items()}, filepath
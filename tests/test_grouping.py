@@ -0,0 +1,81 @@
+import os
+import random
+import tempfile
+
+import pytest
+
+from core.service_grouping import GroupingService
+
+
+def reference_groups(items, col_id):
+    """ Groups in order of the first appearance of their keys, items keep their order within the group.
+    """
+    groups = {}
+    for item in items:
+        groups.setdefault(item[col_id], []).append(item)
+    return list(groups.values())
+
+
+def random_items(rnd, n, keys):
+    return [{"key": rnd.choice(keys), "i": i} for i in range(n)]
+
+
+@pytest.mark.parametrize("buffer_size", [1, 3, 10, 1000])
+def test_external_matches_reference(tmp_path, buffer_size):
+    rnd = random.Random(buffer_size)
+    for n in [0, 1, 25, 200]:
+        items = random_items(rnd, n, keys=[f"p{k}" for k in range(rnd.randint(1, 15))])
+        groups = list(GroupingService.iter_external(iter(items), col_id="key", buffer_size=buffer_size,
+                                                    tmp_dir=str(tmp_path)))
+        assert groups == reference_groups(items, col_id="key")
+
+
+def test_external_spills_runs_and_cleans_up(tmp_path, monkeypatch):
+    runs = []
+    mkstemp = tempfile.mkstemp
+
+    def recording_mkstemp(*args, **kwargs):
+        fd, filepath = mkstemp(*args, **kwargs)
+        runs.append(filepath)
+        return fd, filepath
+
+    monkeypatch.setattr(tempfile, "mkstemp", recording_mkstemp)
+
+    items = random_items(random.Random(0), 50, keys=["a", "b", "c", "d"])
+    groups = list(GroupingService.iter_external(iter(items), col_id="key", buffer_size=8, tmp_dir=str(tmp_path)))
+
+    assert groups == reference_groups(items, col_id="key")
+    # Buffer is smaller than the input, so the runs are spilled into the temporary directory and removed then.
+    assert len(runs) == 50 // 8
+    assert not any(os.path.exists(r) for r in runs)
+    assert os.listdir(tmp_path) == []
+
+
+def test_clustered_matches_reference():
+    rnd = random.Random(0)
+    for _ in range(50):
+        items = []
+        for k in range(rnd.randint(0, 10)):
+            items.extend({"key": f"p{k}", "i": len(items)} for _ in range(rnd.randint(1, 5)))
+        assert list(GroupingService.iter_clustered(iter(items), col_id="key")) == reference_groups(items, "key")
+
+
+def test_clustered_raises_on_reappeared_key():
+    items = [{"key": k} for k in ["a", "a", "b", "a"]]
+    groups_it = GroupingService.iter_clustered(iter(items), col_id="key")
+    assert next(groups_it) == [{"key": "a"}, {"key": "a"}]
+    with pytest.raises(Exception, match="not clustered"):
+        list(groups_it)
+
+
+@pytest.mark.parametrize("keys, expected", [
+    ([], True),
+    (["a"], True),
+    (["a", "a", "b", "b", "c"], True),
+    (["a", "b", "a"], False),
+    (["a", "a", "b", "c", "c", "b"], False),
+    ([None, None, "a"], True),
+    (["a", None, "a"], False),
+])
+def test_is_clustered(keys, expected):
+    assert GroupingService.is_clustered(iter(keys)) == expected
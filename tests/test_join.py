@@ -0,0 +1,75 @@
+import random
+
+import pytest
+
+from core.utils import iter_join_by_key
+
+
+def reference_join(left, right, key, build):
+    """ Nested loops join: the streamed (probe) side determines the order, matches keep the order of the build side.
+    """
+    pairs = []
+    if build == "left":
+        for r in right:
+            pairs.extend((l, r) for l in left if l[key] == r[key])
+    else:
+        for l in left:
+            pairs.extend((l, r) for r in right if l[key] == r[key])
+    return pairs
+
+
+def random_side(rnd, side, n, keys):
+    return [{"uid": rnd.choice(keys), side: i} for i in range(n)]
+
+
+@pytest.mark.parametrize("build", ["left", "right"])
+def test_join_matches_reference(build):
+    rnd = random.Random(build)
+    for _ in range(200):
+        keys = [f"k{i}" for i in range(rnd.randint(1, 8))]
+        # Duplicate keys on both sides result in all their combinations.
+        left = random_side(rnd, "left", rnd.randint(0, 12), keys)
+        right = random_side(rnd, "right", rnd.randint(0, 12), keys)
+
+        unmatched = {}
+        pairs = list(iter_join_by_key(iter(left), iter(right), key="uid", build=build, unmatched=unmatched))
+
+        assert pairs == reference_join(left, right, key="uid", build=build)
+        # Unmatched keys are reported per entry for both sides.
+        assert sorted(unmatched["left"]) == sorted(l["uid"] for l in left if l["uid"] not in {r["uid"] for r in right})
+        assert sorted(unmatched["right"]) == sorted(r["uid"] for r in right if r["uid"] not in {l["uid"] for l in left})
+
+
+def test_join_unmatched_order():
+    left = [{"uid": u} for u in ["a", "x", "b", "y", "x"]]
+    right = [{"uid": u} for u in ["z", "b", "a", "w"]]
+    unmatched = {}
+    pairs = list(iter_join_by_key(left, right, key="uid", build="left", unmatched=unmatched))
+    assert pairs == [({"uid": "b"}, {"uid": "b"}), ({"uid": "a"}, {"uid": "a"})]
+    # Streamed side in its order, build side grouped by key in order of the first appearance.
+    assert unmatched == {"right": ["z", "w"], "left": ["x", "x", "y"]}
+
+
+@pytest.mark.parametrize("left_n, right_n, sized, expected_order", [
+    # The smaller sized side is indexed, the other one determines the order.
+    (2, 5, True, "right"),
+    (5, 2, True, "left"),
+    (3, 3, True, "right"),
+    # The left side is indexed for the unsized sequences.
+    (5, 2, False, "right"),
+])
+def test_join_build_side(left_n, right_n, sized, expected_order):
+    left = [{"uid": i % 2, "left": i} for i in range(left_n)]
+    right = [{"uid": i % 2, "right": i} for i in range(right_n)]
+    pairs = list(iter_join_by_key(left if sized else iter(left), right if sized else iter(right), key="uid"))
+    streamed = [p[0]["left"] for p in pairs] if expected_order == "left" else [p[1]["right"] for p in pairs]
+    assert streamed == sorted(streamed)
+    assert pairs == reference_join(left, right, key="uid", build="right" if expected_order == "left" else "left")
+
+
+def test_join_unmatched_is_reported_once_exhausted():
+    unmatched = {}
+    pairs_it = iter_join_by_key([{"uid": 1}], [{"uid": 2}], key="uid", unmatched=unmatched)
+    assert unmatched == {}
+    assert list(pairs_it) == []
+    assert unmatched == {"right": [2], "left": [1]}
@@ -0,0 +1,61 @@
+import random
+
+import pytest
+
+from presets.issue87.llm_matching_batch import batch_parse_llm_responses
+from presets.issue87.llm_matching_tree import do_pattern_tree_matching
+from presets.issue87.llm_matching_while import do_while_not_true
+from presets.issue87.schemas.v20 import OntologyV20
+from presets.issue87.schemas.v21 import OntologyV21
+
+import legacy
+
+FRAGMENTS = ["t1", "**t1**", "t2", "*", "dwi", "adc", "in-phase", "out-of-phase", "represents both", "represent",
+             "both", "axial", "transverse", "coronal", "sagittal", "spin echo", "spin-echo", "gradient", "arterial",
+             "portal", "delayed", "pre-contrast", "not applicable", "not-applicable", " ", "x", "phase", "in", "-",
+             "spin", "yes", "no", "\n", "\x00"]
+
+# Overlapping patterns and nested states.
+SYNTHETIC_TREE = {
+    "__init__": ["if-else", (["ab", "b"], "after"), "choose"],
+    "after": ["choice", (["a"], "A"), (["ba", "c"], "C"), (None, "?")],
+    "choose": ["choice", (["aa"], "AA"), (["a", "ca"], "A1"), (None, "?")],
+}
+
+
+def iter_trees():
+    for ontology in [OntologyV20(), OntologyV21()]:
+        for field_name, parsing_methods in ontology.iter_ontology_parsers(parser_type="llm"):
+            if "pattern_tree" in parsing_methods:
+                yield f"{ontology.Name}:{field_name}", parsing_methods["pattern_tree"], FRAGMENTS
+    yield "synthetic", SYNTHETIC_TREE, ["a", "b", "c", "ab", "ba", " "]
+
+
+@pytest.mark.parametrize("name, tree, fragments", list(iter_trees()))
+def test_pattern_tree_matching_matches_legacy(name, tree, fragments):
+    rnd = random.Random(name)
+    for _ in range(3000):
+        text = "".join(rnd.choice(fragments) for _ in range(rnd.randint(0, 15)))
+        expected_log, actual_log = [], []
+        expected = legacy.do_pattern_tree_matching(text, tree, handle=expected_log.append)
+        assert do_pattern_tree_matching(text, tree, handle=actual_log.append) == expected, text
+        assert actual_log == expected_log, text
+        # Matching without the log stops at the multiple choices.
+        assert do_pattern_tree_matching(text, tree) == expected, text
+
+
+@pytest.mark.parametrize("ontology", [OntologyV20(), OntologyV21()])
+def test_batch_parsing_matches_per_line(ontology):
+    rnd = random.Random(ontology.Name)
+    fields = [field_name for field_name, _ in ontology.iter_ontology_parsers(parser_type="llm")]
+    lines = [{f: "".join(rnd.choice(FRAGMENTS) for _ in range(rnd.randint(0, 15))) for f in fields}
+             for _ in range(2000)]
+
+    batch = batch_parse_llm_responses(lines, ontology)
+
+    parsers = {"pattern_tree": do_pattern_tree_matching, "while_not_true": do_while_not_true}
+    for field_name, parsing_methods in ontology.iter_ontology_parsers(parser_type="llm"):
+        for method_name, params in parsing_methods.items():
+            expected = [parsers[method_name](line[field_name].lower(), params) for line in lines]
+            expected = [ontology.UNKN_VALUE if label is None else label for label in expected]
+            assert batch[field_name].tolist() == expected, field_name
@@ -0,0 +1,63 @@
+import csv
+from os.path import join, dirname
+
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import SyntheticService
+from presets.issue87.llm_matching_while import do_while_not_true
+from presets.issue87.schemas.v20 import OntologyV20
+from presets.issue87.schemas.v21 import OntologyV21
+
+import legacy
+
+COLLECTION = join(dirname(__file__), "..", "datasets", "tcia_series_narratives", "collection.csv")
+
+MODALITIES = ["MR", "CT", "PT", "MR\\CT"]
+
+EDGE_DESCRIPTIONS = ["", "FS", "fs", "ax FS", "FS ax", "t1 fs ", "(AX T1 FS)", "T1,", "in phase", "out-phase",
+                     "late art. 15 min", "Apparent Diffusion Coefficient", "eDWI b50", "b50 ADC", "T2 SPAIR",
+                     "20min delay", "10 min", "p.venous", "post-t2", "Contrast routine", "NON-CONTRAST ax"]
+
+
+def iter_descriptions():
+    with open(COLLECTION) as f:
+        for row in csv.DictReader(f):
+            yield row["Series Description"]
+    yield from SyntheticService.series_descriptions(2000, rng=np.random.default_rng(0))
+    yield from EDGE_DESCRIPTIONS
+
+
+def legacy_classify(manual, line):
+    result = {}
+    for field_name, params in manual.items():
+        try:
+            result[field_name] = do_while_not_true(line, params)
+        except KeyError:
+            result[field_name] = KeyError
+    return result
+
+
+@pytest.mark.parametrize("ontology, manual", [(OntologyV20(), legacy.MANUAL_V20), (OntologyV21(), legacy.MANUAL_V21)])
+def test_compiled_rules_match_legacy(ontology, manual):
+    compiled = ontology.get_manual_parsers_compiled()
+    assert set(compiled.iter_fields()) == set(manual.keys())
+
+    descriptions = sorted(set(iter_descriptions()))
+    for modality in MODALITIES:
+        for description in descriptions:
+            line = {"Modality": modality, "Series-Description": description}
+            assert compiled.classify(line) == legacy_classify(manual, line), line
+
+
+@pytest.mark.parametrize("ontology, manual", [(OntologyV20(), legacy.MANUAL_V20), (OntologyV21(), legacy.MANUAL_V21)])
+def test_compiled_rules_without_description(ontology, manual):
+    compiled = ontology.get_manual_parsers_compiled()
+    for modality in MODALITIES:
+        line = {"Modality": modality}
+        expected = legacy_classify(manual, line)
+        if "MR" in modality:
+            # Operator precedence of the legacy `is_fs` rule resulted in KeyError, the compiled one gives unknown.
+            assert expected["is_fs"] is KeyError
+            expected["is_fs"] = ontology.UNKN_VALUE
+        assert compiled.classify(line) == expected, line
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+from sklearn.metrics import accuracy_score, confusion_matrix, f1_score, precision_recall_fscore_support
+
+from core.service_metrics import MetricsService
+
+LABELS = ["t1", "t2", "DWI", "ADC"]
+# Labels outside of the evaluated ones: unknown value and the unexpected ones.
+EXTRA = ["?", "in-out"]
+
+
+def random_labels(rng, n, values, p=None):
+    return [values[i] for i in rng.choice(len(values), size=n, p=p)]
+
+
+@pytest.mark.parametrize("seed, n", [(0, 1), (1, 10), (2, 500), (3, 5000)])
+def test_confusion_metrics_match_sklearn(seed, n):
+    rng = np.random.default_rng(seed)
+    # Skewed distributions, so that some of the labels are absent.
+    y_true = random_labels(rng, n, LABELS + EXTRA, p=[0.5, 0.3, 0.1, 0.0, 0.05, 0.05])
+    y_pred = random_labels(rng, n, LABELS + EXTRA, p=[0.4, 0.2, 0.2, 0.0, 0.15, 0.05])
+
+    confusion = MetricsService.confusion(true_list=y_true, predict_list=y_pred, classes_list=LABELS + ["?"])
+
+    assert confusion.total == n
+    assert np.array_equal(confusion.sub_matrix(LABELS), confusion_matrix(y_true, y_pred, labels=LABELS))
+    assert confusion.accuracy() == pytest.approx(accuracy_score(y_true, y_pred))
+    assert confusion.macro_f1(LABELS) == pytest.approx(
+        f1_score(y_true=y_true, y_pred=y_pred, average="macro", labels=LABELS, zero_division=0.0))
+
+    precision, recall, f1, _ = precision_recall_fscore_support(y_true, y_pred, labels=LABELS, zero_division=0.0)
+    for actual, expected in zip(confusion.per_class(LABELS), [precision, recall, f1]):
+        assert np.allclose(actual, expected)
+
+    assert confusion.predicted_rate("?") == pytest.approx(sum(1 for v in y_pred if v == "?") / n)
+
+
+def test_confusion_codes_match_confusion():
+    rng = np.random.default_rng(0)
+    true_classes = LABELS + ["?"]
+    # Predicted classes are in the other order and include the unexpected label.
+    predict_classes = ["t2", "?", "t1", "in-out", "DWI"]
+    true_codes = rng.integers(len(true_classes), size=1000)
+    predict_codes = rng.integers(len(predict_classes), size=1000)
+
+    actual = MetricsService.confusion_codes(true_codes=true_codes, true_classes=true_classes,
+                                            predict_codes=predict_codes, predict_classes=predict_classes)
+    expected = MetricsService.confusion(true_list=[true_classes[c] for c in true_codes],
+                                        predict_list=[predict_classes[c] for c in predict_codes],
+                                        classes_list=true_classes)
+
+    assert actual.classes == expected.classes
+    assert np.array_equal(actual.matrix, expected.matrix)
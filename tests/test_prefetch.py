@@ -0,0 +1,60 @@
+from os.path import join
+
+import numpy as np
+import pytest
+
+import core.service_prefetch as service_prefetch
+import presets.issue87.utils as utils
+from benchmarks.synthetic import SyntheticService
+from presets.dicom_cache import DicomSeriesCache
+from presets.dicom_index import DicomSeriesIndex
+
+COLLECTION = "SYNTHETIC"
+
+
+class RecordingBudget(service_prefetch.ByteBudget):
+
+    peak = 0
+
+    def acquire(self, order, nbytes):
+        granted = super(RecordingBudget, self).acquire(order, nbytes)
+        RecordingBudget.peak = max(RecordingBudget.peak, self.in_use)
+        return granted
+
+
+@pytest.fixture
+def lines(tmp_path, monkeypatch):
+    root = join(tmp_path, "collection")
+    series_dirs = SyntheticService.dicom_series(root, series=12, slices=3, rng=np.random.default_rng(0))
+    monkeypatch.setattr(utils, "DICOM_ROOTS", {COLLECTION: root})
+    monkeypatch.setattr(utils, "DICOM_CACHE", DicomSeriesCache(join(tmp_path, "cache-prefetch")))
+    # Index does not exist, so all the series are read from the files.
+    monkeypatch.setattr(utils, "DICOM_INDEX", DicomSeriesIndex(join(tmp_path, "missing", "index.sqlite")))
+    return [{"Collection": COLLECTION, "File Location": f"series-{i}", "Series UID": f"uid-{i}"}
+            for i in range(len(series_dirs))]
+
+
+def test_prefetched_dicom_matches_sequential(tmp_path, monkeypatch, lines):
+    sizes = [utils.get_series_bytes(utils.list_series_filepaths(utils.get_line_series_dir(line))) for line in lines]
+    max_bytes = 2 * max(sizes)
+
+    RecordingBudget.peak = 0
+    monkeypatch.setattr(service_prefetch, "ByteBudget", RecordingBudget)
+    prefetched = list(utils.iter_prefetched_dicom(iter(lines), ahead=4, workers=4, max_bytes=max_bytes,
+                                                  latency=0.01))
+
+    # Sequential results are computed from scratch, i.e. not from the cache populated by the prefetching.
+    monkeypatch.setattr(utils, "DICOM_CACHE", DicomSeriesCache(join(tmp_path, "cache-sequential")))
+    expected = [utils.get_line_dicom_data(line) for line in lines]
+
+    assert all(len(data) > 0 for data in expected)
+    assert [line for line, _ in prefetched] == lines
+    assert [data for _, data in prefetched] == expected
+    assert 0 < RecordingBudget.peak <= max_bytes
+
+
+def test_prefetched_dicom_closed_early(lines):
+    it = utils.iter_prefetched_dicom(iter(lines), ahead=4, workers=2, latency=0.01)
+    line, _ = next(it)
+    it.close()
+    assert line == lines[0]
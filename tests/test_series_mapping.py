@@ -0,0 +1,41 @@
+import random
+
+import pytest
+
+from presets.issue87.schemas.mapping import SeriesMappingCompiled
+from presets.issue87.schemas.v20 import OntologyV20
+from presets.issue87.schemas.v21 import OntologyV21
+
+import legacy
+
+EXTRA_VALUES = ["?", ".", "in-out"]
+
+
+def random_series(rnd, ontology):
+    series = {}
+    for field_name in ontology.iter_ontology_keys():
+        values = (ontology.get_ontology_labels(key=field_name) or []) + EXTRA_VALUES
+        series[field_name] = rnd.choice(values)
+    # Optional field.
+    if rnd.random() < 0.3:
+        del series["is_fs"]
+    return series
+
+
+@pytest.mark.parametrize("ontology, mapping", [(OntologyV20(), legacy.SERIES_MAPPING_V20),
+                                               (OntologyV21(), legacy.SERIES_MAPPING_V21)])
+def test_compiled_mapping_matches_legacy(ontology, mapping):
+    compiled = SeriesMappingCompiled(ontology.ontology_series_mapping())
+    rnd = random.Random(ontology.Name)
+    for _ in range(4000):
+        p_series = [random_series(rnd, ontology) for _ in range(rnd.randint(0, 12))]
+        assert compiled.count(p_series) == {col: len(h(p_series)) for col, h in mapping.items()}
+
+
+@pytest.mark.parametrize("ontology", [OntologyV20(), OntologyV21()])
+def test_compiled_mapping_missing_field(ontology):
+    compiled = SeriesMappingCompiled(ontology.ontology_series_mapping())
+    series = random_series(random.Random(0), ontology)
+    del series["plane_type"]
+    with pytest.raises(KeyError):
+        compiled.count([series])
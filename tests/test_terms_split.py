@@ -0,0 +1,43 @@
+import random
+
+import pytest
+
+from presets.issue87.schemas.utils import manual_terms_split, manual_terms_set
+
+import legacy
+from test_manual_rules import iter_descriptions
+
+ALPHABET = ["a", "b", "T1", "fs", " ", "_", "/", ",", "(", ")", "-", ".", "  ", "__"]
+
+
+def random_line(rnd):
+    return "".join(rnd.choice(ALPHABET) for _ in range(rnd.randint(0, 12)))
+
+
+@pytest.mark.parametrize("separators", [None, [' '], ['_', ' '], ['__', '_'], ['_', '__'], ['a', 'ab'], []])
+@pytest.mark.parametrize("clean_comma, clean_brackets", [(True, True), (False, True), (True, False)])
+def test_split_matches_legacy(separators, clean_comma, clean_brackets):
+    rnd = random.Random(f"{separators}-{clean_comma}-{clean_brackets}")
+    for _ in range(3000):
+        line = random_line(rnd)
+        expected = legacy.manual_terms_split(line, separators=separators, clean_comma=clean_comma,
+                                             clean_brackets=clean_brackets)
+        actual = manual_terms_split(line, separators=separators, clean_comma=clean_comma,
+                                    clean_brackets=clean_brackets)
+        assert list(actual) == expected, line
+
+
+@pytest.mark.parametrize("separators", [None, ['_', ' ']])
+def test_split_descriptions_match_legacy(separators):
+    for line in iter_descriptions():
+        assert list(manual_terms_split(line, separators=separators)) == \
+               legacy.manual_terms_split(line, separators=separators), line
+
+
+def test_terms_set_matches_legacy():
+    rnd = random.Random(0)
+    for _ in range(3000):
+        line = random_line(rnd)
+        # Repeated calls are served from the cache.
+        for _ in range(2):
+            assert manual_terms_set(line) == frozenset(legacy.manual_terms_split(line)), line
@@ -1,54 +1,64 @@
 from collections import OrderedDict
 from os.path import join, dirname
 
+from core.utils import Lazy, LazyDict
 from presets.file_iterators_dicom import CPTAC_CCRCC_Service, TCGA_LIHC_Service
-from utils import DATASETS_DIR
+from utils import DATASETS_DIR, CACHE_DIR
 
 
 tcia_ccrcc_root = join(DATASETS_DIR, "tcia-ccrcc")
 tcia_ccrcc_rkt_root = join(DATASETS_DIR, "tcia-ccrcc-rkt")
 tcga_lihc = join(DATASETS_DIR, "TCGA-LIHC")
 
+# Persisted locations of the found metadata files, so that datasets are not walked on every run.
+ROOTS_INDEX_FILEPATH = join(CACHE_DIR, "dataset-roots.json")
+
 
 # This dictionary represent a common collection of
 # all datasets utilized in studies.
+# NOTE: Metadata is searched lazily on the first access, so that missing datasets do not affect the import.
 LIVER_DATASETS = OrderedDict({
-    "tcga-lihc": {
+    "tcga-lihc": LazyDict({
         "src": {
             "default": tcga_lihc,
             "series_func": lambda: dirname(LIVER_DATASETS["tcga-lihc"]["meta"]["default"]),
         },
-        "meta": {
-            "default": TCGA_LIHC_Service.metadata_search(tcga_lihc),
+        "meta": LazyDict({
+            "default": Lazy(lambda: TCGA_LIHC_Service.metadata_search(
+                tcga_lihc, index_filepath=ROOTS_INDEX_FILEPATH)),
             # This classification has been manually added to the resource content and is not a part of the original CPTAC-CCRCC collection.
-            "classification-auto": CPTAC_CCRCC_Service.metadata_search(tcga_lihc, template="series-classification"),
-        },
-    },
+            "classification-auto": Lazy(lambda: CPTAC_CCRCC_Service.metadata_search(
+                tcga_lihc, template="series-classification", index_filepath=ROOTS_INDEX_FILEPATH)),
+        }),
+    }),
     # Page: https://www.cancerimagingarchive.net/collection/cptac-ccrcc/
     # https://www.cancerimagingarchive.net/wp-content/uploads/TCIA-CPTAC-CCRCC_v11_20230818.tcia
-    "tcia-ccrcc": {
+    "tcia-ccrcc": LazyDict({
         "src": {
             # The default root where collection has been downloaded.
             "default": tcia_ccrcc_root,
             # The root for the all series, i.e. where everything has been unpacked.
             "series_func": lambda: dirname(LIVER_DATASETS["tcia-ccrcc"]["meta"]["default"]),
         },
-        "meta": {
-            "default": CPTAC_CCRCC_Service.metadata_search(tcia_ccrcc_root),
+        "meta": LazyDict({
+            "default": Lazy(lambda: CPTAC_CCRCC_Service.metadata_search(
+                tcia_ccrcc_root, index_filepath=ROOTS_INDEX_FILEPATH)),
             # This classification has been manually added to the resource content and is not a part of the original CPTAC-CCRCC collection.
-            "classification-auto": CPTAC_CCRCC_Service.metadata_search(tcia_ccrcc_root, template="series-classification"),
-        },
-    },
+            "classification-auto": Lazy(lambda: CPTAC_CCRCC_Service.metadata_search(
+                tcia_ccrcc_root, template="series-classification", index_filepath=ROOTS_INDEX_FILEPATH)),
+        }),
+    }),
     # Page: https://www.cancerimagingarchive.net/collection/cptac-ccrcc/
     # Represent additional part of the collection that describes 4 patients.
-    "tcia-ccrcc-rkt": {
+    "tcia-ccrcc-rkt": LazyDict({
         "src": {
             # The default root where collection has been downloaded.
             "default": tcia_ccrcc_rkt_root,
             # The root for the all series, i.e. where everything has been unpacked.
             "series_func": lambda: dirname(LIVER_DATASETS["tcia-ccrcc-rkt"]["meta"]),
         },
-        "meta": CPTAC_CCRCC_Service.metadata_search(dir_path=tcia_ccrcc_rkt_root),
-    },
+        "meta": Lazy(lambda: CPTAC_CCRCC_Service.metadata_search(
+            dir_path=tcia_ccrcc_rkt_root, index_filepath=ROOTS_INDEX_FILEPATH)),
+    }),
 })
 
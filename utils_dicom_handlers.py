@@ -48,4 +48,12 @@ DICOM_META2CAT_DICT = {
     "Echo Number(s)": "Echo-Numbers",
     "Gradient Echo Train Length": "Gradient-Echo-Train-Length",
     "Multiple Spin Echo": "Multiple-Spin-Echo"
-}
\ No newline at end of file
+}
+
+# Columns of the collection manifest (see `LOCAL_TCIA_NARRATIVES_COLLECTION`) that provide the same categories.
+MANIFEST2CAT_DICT = {
+    "Subject ID": "Patient_ID",
+    "Series UID": "ID-Series",
+    "Modality": "Modality",
+    "Series Description": "Series-Description",
+}